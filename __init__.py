@@ -0,0 +1,44 @@
+"""
+Intent not identified flow
+
+Importing the package is cheap and has no side effects: crewAI, the agents
+and their tools load on first use of the names below, and logging is only
+configured by the entry points (configure_logging).
+"""
+import importlib
+
+# Public name -> module it lives in, imported on first attribute access
+_LAZY_EXPORTS = {
+    "IntentNotIdentifiedFlow": "intent_not_identified_flow.main",
+    "IntentState": "intent_not_identified_flow.main",
+    "async_batch_kickoff": "intent_not_identified_flow.main",
+    "IntentCrew": "intent_not_identified_flow.crews.intent_crew.intent_crew",
+    "get_shared_intent_crew": "intent_not_identified_flow.crews.intent_crew.intent_crew",
+    "EmailContent": "intent_not_identified_flow.models.email",
+}
+
+__all__ = ["configure_logging", *_LAZY_EXPORTS]
+
+
+def configure_logging(level: int = None):
+    """
+    Konfigurácia loggingu pre produkčné prostredie - called by entry points, never on import
+
+    Installs the structured, queue-based pipeline configured by the INTENT_LOG_* environment
+    variables (services/structured_logging.py); level overrides INTENT_LOG_LEVEL.
+    """
+    from intent_not_identified_flow.services.structured_logging import setup_logging
+    return setup_logging(level=level)
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
@@ -0,0 +1,137 @@
+"""
+Micro-batching of analyze_intent: throughput against latency per window
+
+Feeds the same synthetic emails to the flow (replaying LLM backend, see
+load_test) at --rate emails per second, once per --windows value. Window 0
+is the baseline with one analyze_intent call per email. Every other window
+micro-batches the calls that arrive within it, up to --batch-size emails
+per call (services/micro_batching.py). Replayed answers take --latency plus
+--output-rate for every generated token, so a batch answer takes longer
+than a single one, as with a real model. With --rpm the calls go through the
+client-side scheduler at that request limit, which is where fewer calls
+raise throughput.
+
+Reports per window: throughput and end-to-end latency per email, the
+analyze_intent latency (including the time spent in the window), the
+analyze_intent LLM calls with their input and output tokens, the mean batch
+size, and how many emails were answered individually after all.
+
+Run: python -m intent_not_identified_flow.benchmarks.batching_bench -n 200 --rate 50 --windows 0 0.05 0.1 0.2
+"""
+import os
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from intent_not_identified_flow.benchmarks.load_test import synthetic_emails
+from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+from intent_not_identified_flow.main import IntentNotIdentifiedFlow
+from intent_not_identified_flow.services.batch_runner import BatchRunner
+from intent_not_identified_flow.services.instrumentation import HistogramSink, Instrumentation
+from intent_not_identified_flow.services.llm_backend import build_llm
+from intent_not_identified_flow.services.llm_scheduler import LLMScheduler
+from intent_not_identified_flow.services.micro_batching import BatchPolicy
+
+TASK = "analyze_intent"
+
+
+async def arrivals(args):
+    """The synthetic emails, spaced by exponential inter-arrival times (all at once without --rate)"""
+    rng = random.Random(args.seed)
+    for email in synthetic_emails(args.emails, args.seed):
+        yield email
+        if args.rate:
+            await asyncio.sleep(rng.expovariate(args.rate))
+
+
+async def run_window(args, window: float) -> dict:
+    instrumentation = Instrumentation([HistogramSink()])
+    scheduler = LLMScheduler(args.rpm) if args.rpm else None
+    crew = IntentCrew(
+        llm_factory=lambda model: build_llm(model, mode="replay", fixtures=args.fixtures, latency=args.latency,
+                                            miss_policy=args.miss_policy, seed=args.seed, scheduler=scheduler,
+                                            output_rate=args.output_rate),
+        instrumentation=instrumentation,
+        batching=BatchPolicy(window=window, max_size=args.batch_size) if window else None,
+    )
+    runner = BatchRunner(lambda: IntentNotIdentifiedFlow(intent_crew=crew), concurrency=args.concurrency)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        await runner.run(arrivals(args))
+
+    stages = {summary.stage: summary for summary in instrumentation.histogram().summary()}
+    analysis, batch = stages.get(TASK), stages.get(f"{TASK}.batch")
+    stats = crew.batching_stats().get(TASK)
+    # Emails whose analysis came out of a batch made no call of their own
+    from_batches = stats.batched - stats.fallbacks if stats else 0
+    runs = runner.stats
+    return {
+        "window": window,
+        "emails": runs.total,
+        "failed": runs.failed,
+        "throughput": runs.throughput,
+        "latency_p50": runs.latency_p50,
+        "latency_p95": runs.latency_p95,
+        "analysis_p50": analysis.wall_p50 if analysis else 0.0,
+        "analysis_p95": analysis.wall_p95 if analysis else 0.0,
+        "calls": (analysis.count if analysis else 0) - from_batches + (stats.batches if stats else 0),
+        "prompt_tokens": sum(s.prompt_tokens for s in (analysis, batch) if s),
+        "completion_tokens": sum(s.completion_tokens for s in (analysis, batch) if s),
+        "mean_batch": stats.mean_size if stats else 0.0,
+        "mean_wait": stats.mean_wait if stats else 0.0,
+        "individual": (analysis.count if analysis else 0) - from_batches,
+    }
+
+
+async def run(args) -> list:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=3 * args.concurrency))
+    return [await run_window(args, window) for window in args.windows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyze_intent micro-batching benchmark")
+    parser.add_argument("-n", "--emails", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0, help="Emails arriving per second (0: all at once)")
+    parser.add_argument("--concurrency", type=int, default=200, help="Flows in flight")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 0.025, 0.05, 0.1, 0.2],
+                        help="Batch windows in seconds, 0 for no batching")
+    parser.add_argument("--batch-size", type=int, default=8, help="Most emails per batch call")
+    parser.add_argument("--fixtures", default="llm_fixtures.jsonl", help="Fixture store (JSONL)")
+    parser.add_argument("--latency", default="fixed:0.3", help="Synthetic latency per call before generation")
+    parser.add_argument("--output-rate", type=float, default=80.0, help="Generated tokens per second")
+    parser.add_argument("--miss-policy", choices=["task", "synthetic", "error"], default="synthetic")
+    parser.add_argument("--rpm", type=float, help="Schedule LLM calls under this requests-per-minute limit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    rows = asyncio.run(run(args))
+
+    print(f"{args.emails} emails at {args.rate or 'unlimited'}/s, latency {args.latency} + "
+          f"{args.output_rate:.0f} tokens/s, batches of at most {args.batch_size}"
+          + (f", {args.rpm:.0f} requests/min" if args.rpm else ""))
+    print(f"{'window s':>8} {'emails/s':>8} {'p50 s':>7} {'p95 s':>7} {'analyze p50':>11} {'p95':>7} "
+          f"{'calls':>6} {'in tok':>8} {'out tok':>8} {'batch':>6} {'wait ms':>8} {'single':>6}")
+    for row in rows:
+        print(f"{row['window']:>8.3f} {row['throughput']:>8.2f} {row['latency_p50']:>7.3f} "
+              f"{row['latency_p95']:>7.3f} {row['analysis_p50']:>11.3f} {row['analysis_p95']:>7.3f} "
+              f"{row['calls']:>6} {row['prompt_tokens']:>8} {row['completion_tokens']:>8} "
+              f"{row['mean_batch']:>6.1f} {row['mean_wait'] * 1000:>8.1f} {row['individual']:>6}")
+    print("(analyze: analyze_intent per email including the batch window; calls, tokens: analyze_intent "
+          "only; single: emails analyzed by a call of their own)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
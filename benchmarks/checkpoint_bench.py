@@ -0,0 +1,115 @@
+"""
+Per-step cost of flow state checkpoints
+
+Replays the checkpoints a flow writes for one email (one after each of the
+eight steps of the can_prepare branch, with realistic LLM output sizes) for
+many messages, and reports per write
+
+- encode: serialization time and payload size of the binary encoding used
+  by CheckpointStore against plain JSON of the same values
+- write: SQLite update time in synchronous=NORMAL and FULL mode
+
+Run: python -m intent_not_identified_flow.benchmarks.checkpoint_bench --messages 500
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from intent_not_identified_flow.models.state import StageOutput
+from intent_not_identified_flow.services.batch_runner import percentile
+from intent_not_identified_flow.services.checkpoints import CheckpointStore, encode, to_plain
+
+STEPS = ["intent_not_identified", "text_analysis_general_info", "decision_prepare_info", "route_based_on_decision",
+         "api_knowledge_base_finding", "creating_answer_general_info", "drafting_summary_from_answer",
+         "switching_to_agent_with_materials"]
+WORDS = ("pricing implementation integration enterprise plan support onboarding security dashboard team "
+         "customer features trial weeks manager account data report").split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def step_snapshots(rng: random.Random):
+    """(step, return value, state fields) after every step of one flow run"""
+    state = {"analysis_results": None, "retrieved_info": None, "created_response": None,
+             "email_summary": None, "final_materials": None, "can_prepare_info": False}
+    results = {"route_based_on_decision": "can_prepare_info"}
+    for step in STEPS:
+        if step == "text_analysis_general_info":
+            analysis = {"can_prepare_general_answer": True, "identified_topics": ["pricing", "implementation"],
+                        "confidence_score": 0.85}
+            state["analysis_results"] = StageOutput.of(json.dumps(analysis), analysis)
+            state["can_prepare_info"] = True
+        elif step == "api_knowledge_base_finding":
+            state["retrieved_info"] = StageOutput.of(_text(rng, 450))
+        elif step == "creating_answer_general_info":
+            answer = {"summary": _text(rng, 40), "detailed_response": _text(rng, 350), "references": ["Pricing Plans"]}
+            state["created_response"] = StageOutput.of(json.dumps(answer), answer)
+        elif step == "drafting_summary_from_answer":
+            state["email_summary"] = StageOutput.of(_text(rng, 80))
+            results[step] = "summary_created"
+        elif step == "switching_to_agent_with_materials":
+            state["final_materials"] = StageOutput.of(_text(rng, 500))
+            results[step] = state["final_materials"]
+        yield step, results.get(step), dict(state)
+
+
+def _encode_json(value) -> bytes:
+    return json.dumps(to_plain(value), ensure_ascii=False).encode("utf-8")
+
+
+def measure(messages: int, synchronous: str, seed: int) -> dict:
+    rng = random.Random(seed)
+    encode_times, json_times, write_times, sizes, json_sizes = [], [], [], [], []
+    with tempfile.TemporaryDirectory() as directory:
+        store = CheckpointStore(os.path.join(directory, "checkpoints.db"), synchronous=synchronous)
+        for i in range(messages):
+            message_id, owner = f"<bench-{i}@example.com>", "bench"
+            store.claim(message_id, owner)
+            steps = {}
+            for step, result, state in step_snapshots(rng):
+                steps[step] = result
+                payload = {"steps": steps, "state": state}
+                started = time.perf_counter()
+                sizes.append(len(encode(payload)))
+                encode_times.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                json_sizes.append(len(_encode_json(payload)))
+                json_times.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                store.save(message_id, owner, steps, state, done=step == STEPS[-1])
+                write_times.append(time.perf_counter() - started)
+        store.close()
+    us = 1e6
+    return {
+        "synchronous": synchronous,
+        "encode_p50_us": percentile(encode_times, 50) * us,
+        "json_p50_us": percentile(json_times, 50) * us,
+        "bytes_avg": sum(sizes) / len(sizes),
+        "json_bytes_avg": sum(json_sizes) / len(json_sizes),
+        "save_p50_us": percentile(write_times, 50) * us,
+        "save_p99_us": percentile(write_times, 99) * us,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpoint overhead benchmark")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{args.messages} messages x {len(STEPS)} steps")
+    print(f"{'sync':<7} {'encode us':>10} {'json us':>8} {'bytes':>7} {'json bytes':>11} "
+          f"{'save p50 us':>12} {'save p99 us':>12}")
+    for synchronous in ("NORMAL", "FULL"):
+        r = measure(args.messages, synchronous, args.seed)
+        print(f"{synchronous:<7} {r['encode_p50_us']:>10.1f} {r['json_p50_us']:>8.1f} {r['bytes_avg']:>7.0f} "
+              f"{r['json_bytes_avg']:>11.0f} {r['save_p50_us']:>12.1f} {r['save_p99_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Flow profile: critical paths and timelines of many emails as an HTML report
+
+Runs synthetic emails through the flow (replaying LLM backend, see
+load_test) with the FlowProfiler attached (services/profiler.py), then
+writes its report (services/profile_report.py). The report shows the flow
+graph with per-node and per-edge latency, a flame graph of the critical
+path and a Gantt chart of the slowest emails. The summary printed at the
+end splits the critical path into routing, retrieval and generation.
+
+--jsonl also keeps the raw records. --from skips the run and aggregates
+records of earlier runs instead: files written by --jsonl, or the
+INTENT_METRICS_JSONL output of runs with INTENT_PROFILE set (anything that
+asks for detailed records).
+
+Run: python -m intent_not_identified_flow.benchmarks.flow_profile -n 100 --concurrency 10 --out flow_profile.html
+"""
+import os
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from intent_not_identified_flow.benchmarks.load_test import synthetic_emails
+from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+from intent_not_identified_flow.main import IntentNotIdentifiedFlow
+from intent_not_identified_flow.services.batch_runner import BatchRunner
+from intent_not_identified_flow.services.llm_backend import build_llm
+from intent_not_identified_flow.services.micro_batching import BatchPolicy
+from intent_not_identified_flow.services.profiler import FlowProfiler, format_summary, load_records
+
+
+async def arrivals(args):
+    """The synthetic emails, spaced by exponential inter-arrival times (all at once without --rate)"""
+    rng = random.Random(args.seed)
+    for email in synthetic_emails(args.emails, args.seed):
+        yield email
+        if args.rate:
+            await asyncio.sleep(rng.expovariate(args.rate))
+
+
+async def run(args, profiler: FlowProfiler) -> None:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=3 * args.concurrency))
+    crew = IntentCrew(
+        llm_factory=lambda model: build_llm(model, mode="replay", fixtures=args.fixtures, latency=args.latency,
+                                            miss_policy=args.miss_policy, seed=args.seed,
+                                            output_rate=args.output_rate),
+        batching=BatchPolicy(window=args.batch_window, max_size=args.batch_size) if args.batch_window else None,
+    )
+    runner = BatchRunner(lambda: IntentNotIdentifiedFlow(intent_crew=crew, parallel=args.parallel),
+                         concurrency=args.concurrency)
+    profiler.attach()
+    profiler.start()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            await runner.run(arrivals(args))
+    finally:
+        await profiler.stop()
+        profiler.detach()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flow execution profile and critical path report")
+    parser.add_argument("-n", "--emails", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10, help="Flows in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="Emails arriving per second (0: all at once)")
+    parser.add_argument("--parallel", action="store_true", help="Run the flow in parallel mode")
+    parser.add_argument("--fixtures", default="llm_fixtures.jsonl", help="Fixture store (JSONL)")
+    parser.add_argument("--latency", default="lognormal:0.2:0.5", help="Synthetic latency per call")
+    parser.add_argument("--output-rate", type=float, help="Generated tokens per second on top of --latency")
+    parser.add_argument("--miss-policy", choices=["task", "synthetic", "error"], default="task")
+    parser.add_argument("--batch-window", type=float, metavar="SECONDS",
+                        help="Micro-batch analyze_intent calls arriving within this window")
+    parser.add_argument("--batch-size", type=int, default=8, help="Most emails per batch call")
+    parser.add_argument("--stall-threshold", type=float, default=0.05,
+                        help="Event loop wake-ups later than this many seconds count as stalls")
+    parser.add_argument("--slowest", type=int, default=20, help="Emails shown in the Gantt chart")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="flow_profile.html", help="HTML report")
+    parser.add_argument("--jsonl", help="Also write the profiled records to this file")
+    parser.add_argument("--from", dest="sources", nargs="+", metavar="JSONL",
+                        help="Aggregate the records of these files instead of running the flow")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    profiler = FlowProfiler(stall_threshold=args.stall_threshold)
+    if args.sources:
+        load_records(args.sources, profiler)
+    else:
+        asyncio.run(run(args, profiler))
+
+    print(format_summary(profiler.summary()))
+    if profiler.dropped:
+        print(f"({profiler.dropped} records of emails beyond the first {profiler.max_emails} dropped)")
+    profiler.write_report(args.out, flow=IntentNotIdentifiedFlow(), slowest=args.slowest)
+    print(f"Report written to {args.out}")
+    if args.jsonl:
+        profiler.write_jsonl(args.jsonl)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Import time and import side effects of the package entry points
+
+Imports each target module in a fresh interpreter under `python -X importtime`,
+parses the per-module report and prints the total, the heaviest top-level
+packages and the modules with the most self time. Each import must also be
+free of side effects: nothing written to stdout, no logging handlers
+installed.
+
+benchmarks/import_budget.json holds the budget per target: the modules it
+must not pull in (e.g. crewAI for the queue tools and the pool supervisor,
+the crew and its agents for main) and a maximum import time. With --check a
+target over its budget fails the run (exit code 1), so the benchmark guards
+against import-time regressions in CI; --update rewrites the time budgets
+from the current measurement with headroom.
+
+Run: python -m intent_not_identified_flow.benchmarks.import_time_bench --check
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BUDGET_PATH = os.path.join(os.path.dirname(__file__), "import_budget.json")
+
+# Separates what the import printed from the probe written after it
+_MARKER = "\0import-probe\0"
+
+_PROBE = (
+    "import logging, sys\n"
+    "import {module}\n"
+    "sys.stdout.write({marker!r} + str(len(logging.getLogger().handlers)))\n"
+)
+
+
+def measure(module: str) -> Tuple[List[Tuple[int, int, int, str]], str, int]:
+    """
+    Import module in a fresh interpreter
+
+    Returns:
+        Tuple of ([(self us, cumulative us, depth, name)], stdout of the import, logging handlers)
+    """
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    env.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    env.setdefault("OTEL_SDK_DISABLED", "true")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, marker=_MARKER)],
+        capture_output=True, text=True, env=env,
+    )
+    if process.returncode != 0 or _MARKER not in process.stdout:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr[-2000:]}")
+    printed, _, handlers = process.stdout.partition(_MARKER)
+    entries = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return entries, printed, int(handlers)
+
+
+def top_level_packages(entries) -> Dict[str, int]:
+    """Self time (us) per top-level package"""
+    packages = defaultdict(int)
+    for self_us, _, _, name in entries:
+        packages[name.partition(".")[0]] += self_us
+    return dict(packages)
+
+
+def check(module: str, budget: dict, total_ms: float, imported: set, printed: str, handlers: int) -> List[str]:
+    problems = []
+    for forbidden in budget.get("forbid", []):
+        pulled = sorted(name for name in imported if name == forbidden or name.startswith(forbidden + "."))
+        if pulled:
+            problems.append(f"imports {forbidden} ({len(pulled)} modules)")
+    if budget.get("max_ms") is not None and total_ms > budget["max_ms"]:
+        problems.append(f"{total_ms:.0f} ms over the budget of {budget['max_ms']:.0f} ms")
+    if printed.strip():
+        problems.append(f"prints on import: {printed.strip()[:80]!r}")
+    if handlers:
+        problems.append(f"installs {handlers} root logging handler(s) on import")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time benchmark")
+    parser.add_argument("modules", nargs="*", help="Modules to import (default: every target of the budget file)")
+    parser.add_argument("--budget", default=BUDGET_PATH, help="Budget file (JSON)")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module, the fastest one counts")
+    parser.add_argument("--top", type=int, default=8, help="Packages and modules listed per target")
+    parser.add_argument("--check", action="store_true", help="Exit with 1 when a target is over its budget")
+    parser.add_argument("--update", action="store_true", help="Rewrite the time budgets: measured time x headroom")
+    parser.add_argument("--headroom", type=float, default=2.0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    with open(args.budget, encoding="utf-8") as f:
+        budgets = json.load(f)
+    modules = args.modules or list(budgets)
+
+    rows, failures = [], 0
+    for module in modules:
+        runs = [measure(module) for _ in range(max(1, args.repeat))]
+        entries, printed, handlers = min(runs, key=lambda run: sum(entry[0] for entry in run[0]))
+        total_ms = sum(entry[0] for entry in entries) / 1000
+        imported = {entry[3] for entry in entries}
+        budget = budgets.get(module, {})
+        problems = check(module, budget, total_ms, imported, printed, handlers)
+        failures += bool(problems)
+
+        print(f"\n{module}: {total_ms:.0f} ms, {len(imported)} modules"
+              + (f" (budget {budget['max_ms']:.0f} ms)" if budget.get("max_ms") is not None else ""))
+        packages = sorted(top_level_packages(entries).items(), key=lambda item: -item[1])[:args.top]
+        print("  packages: " + ", ".join(f"{name} {us / 1000:.0f} ms" for name, us in packages))
+        print(f"  {'self ms':>8} {'cumul ms':>9}  module")
+        for self_us, cumulative_us, _, name in sorted(entries, key=lambda entry: -entry[0])[:args.top]:
+            print(f"  {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}  {name}")
+        for problem in problems:
+            print(f"  REGRESSION: {problem}")
+        rows.append({"module": module, "total_ms": total_ms, "modules": len(imported), "problems": problems})
+        if args.update:
+            budgets.setdefault(module, {})["max_ms"] = round(total_ms * args.headroom, -1)
+
+    if args.update:
+        with open(args.budget, "w", encoding="utf-8") as f:
+            json.dump(budgets, f, indent=2)
+            f.write("\n")
+        print(f"\nTime budgets written to {args.budget}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    if args.check and failures:
+        print(f"\n{failures} of {len(modules)} targets over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
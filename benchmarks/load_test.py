@@ -0,0 +1,247 @@
+"""
+Offline load test of IntentNotIdentifiedFlow
+
+Pushes N synthetic emails through the flow with a replaying LLM backend
+(recorded fixtures where available, synthetic responses otherwise) and a
+synthetic latency distribution, so runs are deterministic, free and need no
+network. Reports
+
+- throughput and end-to-end latency percentiles per email
+- event loop lag (how late a 10ms timer fires while the flows run)
+- per-stage p50/p95/p99 from the instrumentation layer
+- how replayed responses were served (exact fixture, task fallback, synthetic)
+- with --stream, how soon the first chunk of a draft (answer or summary)
+  reaches the consumer, i.e. the latency an agent desk would perceive
+- with --mock-rpm/--mock-tpm, how often the simulated provider throttled
+  calls, and with --rpm/--tpm the waits of the client-side LLM scheduler
+- with --routing, latency, tokens, cost and escalations per task and model
+  of the model cascade (config/model_routing.yaml or the given file)
+- with --prefix-cache, prompt prefix cache hits, input cost and time to
+  first token saved per task against a simulated provider cache
+- with --batch-window, how analyze_intent calls were micro-batched across
+  emails (batch sizes, time spent in the window, items run individually)
+
+Record fixtures from the real model first with --mode record (a few dozen
+emails are enough, replay falls back to recordings of the same task), then
+compare changes against a saved baseline with --json.
+
+Run: python -m intent_not_identified_flow.benchmarks.load_test -n 2000 --concurrency 100
+"""
+import os
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+
+from intent_not_identified_flow import configure_logging
+from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+from intent_not_identified_flow.crews.intent_crew.model_routing import DEFAULT_ROUTING_PATH, RoutingPolicy
+from intent_not_identified_flow.main import IntentNotIdentifiedFlow
+from intent_not_identified_flow.models.email import EmailContent
+from intent_not_identified_flow.services.batch_runner import BatchRunner, percentile
+from intent_not_identified_flow.services.instrumentation import EventLoopLagMonitor, get_instrumentation
+from intent_not_identified_flow.services.llm_backend import (
+    MockPrefixCache, MockRateLimits, build_llm, get_fixture_store,
+)
+from intent_not_identified_flow.services.llm_scheduler import LLMScheduler
+from intent_not_identified_flow.services.micro_batching import BatchPolicy
+from intent_not_identified_flow.services.prompt_cache import get_prefix_cache_tracker
+from intent_not_identified_flow.services.result_cache import ResultCache
+from intent_not_identified_flow.services.streaming import StreamEvent
+
+# Tasks whose output an agent desk renders as a draft
+DRAFT_TASKS = {"create_general_answer", "create_email_summary"}
+
+SUBJECTS = ["Question about your product", "Quick question", "Information request", "Hello",
+            "Inquiry", "Your services", "Pricing?", "Need some help", "Re: our call", "Interested"]
+REQUESTS = [
+    "I came across your company online and would like some general information about what you offer.",
+    "Could you tell me how much the Professional plan costs and what it includes?",
+    "We are evaluating vendors and I wonder whether your product integrates with Salesforce.",
+    "How long does implementation usually take for a company of around 200 people?",
+    "I was charged twice for my subscription last month and would like a refund.",
+    "Our dashboard has been down since this morning, can someone look at it urgently?",
+    "Do you have customers in the healthcare sector, and are you HIPAA compliant?",
+    "Is there a free trial, and can I cancel anytime?",
+]
+DETAILS = ["We are a small team.", "Our budget is limited this quarter.", "We currently use spreadsheets.",
+           "I'd appreciate a call next week.", "Please reply by email.", ""]
+
+
+def synthetic_emails(count: int, seed: int = 0) -> Iterator[EmailContent]:
+    """Deterministic stream of varied customer emails"""
+    rng = random.Random(seed)
+    for i in range(count):
+        name = rng.choice(["John", "Maria", "Peter", "Anna", "Luis", "Eva"])
+        body = "\n".join([
+            rng.choice(["Hello,", "Hi there,", "Dear team,", "Good morning,"]),
+            "",
+            rng.choice(REQUESTS),
+            rng.choice(DETAILS),
+            "",
+            f"Thanks,\n{name} (ticket {i})",
+        ])
+        yield EmailContent(subject=rng.choice(SUBJECTS), body=body, sender=f"{name.lower()}{i}@example.com")
+
+
+class FirstChunkTimer:
+    """Stream sink of one flow recording when the first draft chunk arrived"""
+
+    def __init__(self, samples: List[float]):
+        self.started = time.perf_counter()
+        self.samples = samples
+        self.seen = False
+
+    def __call__(self, event: StreamEvent) -> None:
+        if not self.seen and event.kind == "chunk" and event.task in DRAFT_TASKS:
+            self.seen = True
+            self.samples.append(time.perf_counter() - self.started)
+
+
+def _scheduler_summary(stats) -> dict:
+    return dict(stats.model_dump(), avg_wait=stats.avg_wait, prediction_error=stats.prediction_error)
+
+
+async def run(args) -> dict:
+    # crewAI runs every task in a worker thread; the default executor (at most 32
+    # threads) would otherwise cap the number of LLM calls in flight
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.threads))
+
+    rate_limits = MockRateLimits(args.mock_rpm, args.mock_tpm) if args.mock_rpm else None
+    scheduler = LLMScheduler(args.rpm, args.tpm) if args.rpm else None
+    routing = RoutingPolicy.load(args.routing) if args.routing else None
+    prefix_cache = MockPrefixCache(min_tokens=args.prefix_cache) if args.prefix_cache is not None else None
+    crew = IntentCrew(
+        result_cache=ResultCache() if args.cache else None,
+        llm_factory=lambda model: build_llm(model, mode=args.mode, fixtures=args.fixtures,
+                                            latency=args.latency, miss_policy=args.miss_policy,
+                                            seed=args.seed, rate_limits=rate_limits, scheduler=scheduler,
+                                            prefix_cache=prefix_cache, output_rate=args.output_rate),
+        routing=routing,
+        batching=BatchPolicy(window=args.batch_window, max_size=args.batch_size) if args.batch_window else None,
+    )
+    first_chunks: List[float] = []
+    runner = BatchRunner(
+        lambda: IntentNotIdentifiedFlow(intent_crew=crew, parallel=args.parallel,
+                                        stream_sink=FirstChunkTimer(first_chunks) if args.stream else None),
+        concurrency=args.concurrency,
+    )
+    monitor = EventLoopLagMonitor()
+    monitor.start()
+    try:
+        with contextlib.ExitStack() as stack:
+            if not args.verbose:
+                # The flow and crewAI print progress for every step
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            await runner.run(synthetic_emails(args.emails, args.seed))
+    finally:
+        await monitor.stop()
+
+    return {
+        "config": vars(args),
+        "stats": runner.stats.model_dump(),
+        "event_loop_lag": monitor.stats(),
+        "first_draft_chunk": {"p50": percentile(first_chunks, 50), "p95": percentile(first_chunks, 95),
+                              "p99": percentile(first_chunks, 99)} if args.stream else None,
+        "replay": get_fixture_store(args.fixtures).replay_stats(),
+        "provider_limits": rate_limits.stats() if rate_limits else None,
+        "scheduler": _scheduler_summary(scheduler.stats()) if scheduler else None,
+        "routing": [summary.model_dump() for summary in routing.summary()] if routing else None,
+        "routing_report": routing.report() if routing else None,
+        "prefix_cache": ([summary.model_dump() for summary in get_prefix_cache_tracker().summary()]
+                         if prefix_cache else None),
+        "prefix_cache_report": get_prefix_cache_tracker().report() if prefix_cache else None,
+        "batching": {task: dict(stats.model_dump(), mean_size=stats.mean_size, mean_wait=stats.mean_wait)
+                     for task, stats in crew.batching_stats().items()} or None,
+        "stages": [summary.model_dump() for summary in get_instrumentation().histogram().summary()],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the intent flow")
+    parser.add_argument("-n", "--emails", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50, help="Flows in flight")
+    parser.add_argument("--threads", type=int, default=None, help="Worker threads (default 3 per flow)")
+    parser.add_argument("--mode", choices=["replay", "record"], default="replay")
+    parser.add_argument("--fixtures", default="llm_fixtures.jsonl", help="Fixture store (JSONL)")
+    parser.add_argument("--latency", default="lognormal:0.2:0.5",
+                        help="Synthetic LLM latency per call, e.g. fixed:0.5, uniform:0.2:1, lognormal:1.5:0.4")
+    parser.add_argument("--miss-policy", choices=["task", "synthetic", "error"], default="task")
+    parser.add_argument("--parallel", action="store_true", help="Run the flow in parallel mode")
+    parser.add_argument("--cache", action="store_true", help="Enable the in-memory result cache")
+    parser.add_argument("--stream", action="store_true", help="Stream task output and time the first draft chunk")
+    parser.add_argument("--mock-rpm", type=float, help="Simulated provider limit, requests per minute (replay)")
+    parser.add_argument("--mock-tpm", type=float, help="Simulated provider limit, tokens per minute (replay)")
+    parser.add_argument("--rpm", type=float, help="Schedule LLM calls under this requests-per-minute limit")
+    parser.add_argument("--tpm", type=float, help="Schedule LLM calls under this tokens-per-minute limit")
+    parser.add_argument("--routing", nargs="?", const=DEFAULT_ROUTING_PATH,
+                        help="Run the per-task model cascade (default config/model_routing.yaml)")
+    parser.add_argument("--prefix-cache", type=int, nargs="?", const=1024, metavar="MIN_TOKENS",
+                        help="Simulate the provider's prompt prefix cache (replay), caching prefixes of at "
+                             "least MIN_TOKENS (default 1024)")
+    parser.add_argument("--batch-window", type=float, metavar="SECONDS",
+                        help="Micro-batch analyze_intent calls arriving within this window")
+    parser.add_argument("--batch-size", type=int, default=8, help="Most emails per batch call")
+    parser.add_argument("--output-rate", type=float,
+                        help="Generated tokens per second added to the replay latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep flow output and INFO logs")
+    args = parser.parse_args()
+    args.threads = args.threads or 3 * args.concurrency
+
+    configure_logging()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+
+    stats, lag = results["stats"], results["event_loop_lag"]
+    print(f"{stats['total']} emails ({stats['failed']} failed) in {stats['wall_time']:.1f}s: "
+          f"{stats['throughput']:.1f} emails/s")
+    print(f"Latency per email: p50 {stats['latency_p50']:.3f}s  p95 {stats['latency_p95']:.3f}s  "
+          f"p99 {stats['latency_p99']:.3f}s  max {stats['latency_max']:.3f}s")
+    print(f"Event loop lag: p50 {lag['p50'] * 1000:.2f}ms  p99 {lag['p99'] * 1000:.2f}ms  "
+          f"max {lag['max'] * 1000:.2f}ms")
+    if results["first_draft_chunk"]:
+        first = results["first_draft_chunk"]
+        print(f"First draft chunk: p50 {first['p50']:.3f}s  p95 {first['p95']:.3f}s  p99 {first['p99']:.3f}s")
+    print(f"LLM responses: {results['replay']}")
+    if results["provider_limits"]:
+        print(f"Provider: {results['provider_limits']}")
+    if results["scheduler"]:
+        scheduler = results["scheduler"]
+        waits = "  ".join(f"{task} {wait:.2f}s" for task, wait in scheduler["wait_p95_by_task"].items())
+        print(f"Scheduler: {scheduler['calls']} calls, {scheduler['throttled']} throttled, "
+              f"avg wait {scheduler['avg_wait']:.2f}s, rate {scheduler['rate_scale']:.0%}, "
+              f"token prediction error {scheduler['prediction_error']:+.1%}")
+        print(f"Scheduler wait p95: {waits}")
+    for task, batching in (results["batching"] or {}).items():
+        print(f"Batching {task}: {batching['requests']} calls, {batching['batches']} batches of "
+              f"{batching['mean_size']:.1f} ({batching['full_batches']} full, {batching['failed_batches']} failed), "
+              f"{batching['alone']} alone, {batching['fallbacks']} run individually, "
+              f"mean window wait {batching['mean_wait'] * 1000:.0f}ms")
+    if results["routing_report"]:
+        print()
+        print(results["routing_report"])
+    if results["prefix_cache_report"]:
+        print()
+        print(results["prefix_cache_report"])
+    print()
+    print(get_instrumentation().report())
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Logging overhead per email at different verbosity levels
+
+Runs the same synthetic emails through the flow (replaying LLM backend, see
+load_test) under each logging configuration, in --repeat interleaved rounds,
+and reports the median wall and CPU time per email, the CPU overhead over logging at WARNING only, how late the event loop
+ran (a blocking handler shows up here) and how many records were written,
+sampled out or dropped. Logs go to a temporary file, so formatting and I/O
+are real.
+
+Configurations: warning (the baseline), info, debug through the queue
+handler, debug sampled at --sample-rate, debug with a synchronous handler,
+and debug with crewAI's own console panels for every flow method and task
+(stdout to the same file), the closest to the former print-based output.
+
+Run: python -m intent_not_identified_flow.benchmarks.logging_bench -n 200 --concurrency 50
+"""
+import os
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import argparse
+import asyncio
+import contextlib
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from intent_not_identified_flow.benchmarks.load_test import synthetic_emails
+from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+from intent_not_identified_flow.main import IntentNotIdentifiedFlow
+from intent_not_identified_flow.services.batch_runner import BatchRunner
+from intent_not_identified_flow.services.instrumentation import EventLoopLagMonitor
+from intent_not_identified_flow.services.llm_backend import build_llm
+from intent_not_identified_flow.services.structured_logging import LogConfig, setup_logging
+
+
+def configurations(sample_rate: float):
+    return [
+        ("warning", LogConfig(level="WARNING")),
+        ("info", LogConfig(level="INFO")),
+        ("debug", LogConfig(level="DEBUG")),
+        (f"debug {sample_rate:.0%} sampled", LogConfig(level="DEBUG", sample_rate=sample_rate)),
+        ("debug json", LogConfig(level="DEBUG", format="json")),
+        ("debug synchronous", LogConfig(level="DEBUG", queue_size=0)),
+        ("debug + crew verbose", LogConfig(level="DEBUG", crew_verbose=True)),
+    ]
+
+
+async def run_batch(crew: IntentCrew, emails, concurrency: int) -> dict:
+    runner = BatchRunner(lambda: IntentNotIdentifiedFlow(intent_crew=crew), concurrency=concurrency)
+    monitor = EventLoopLagMonitor()
+    monitor.start()
+    cpu = time.process_time()
+    try:
+        await runner.run(emails)
+    finally:
+        await monitor.stop()
+    return {"stats": runner.stats, "cpu": time.process_time() - cpu, "lag": monitor.stats()}
+
+
+async def run(args) -> list:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=3 * args.concurrency))
+    crew = IntentCrew(llm_factory=lambda model: build_llm(model, mode="replay", fixtures=args.fixtures,
+                                                          latency=args.latency, miss_policy=args.miss_policy,
+                                                          seed=args.seed))
+    emails = list(synthetic_emails(args.emails, args.seed))
+    directory = tempfile.mkdtemp(prefix="intent-logging-")
+    rows = []
+    try:
+        # Warm-up: agents, fixtures and crewAI's lazy imports are not part of any configuration
+        setup_logging(LogConfig(level="WARNING", path=os.path.join(directory, "warmup.log")))
+        await run_batch(crew, emails, args.concurrency)
+
+        # Rounds interleave the configurations, so drift over the run (warm-up, other load)
+        # does not favour the later ones; the median round counts
+        samples = {name: [] for name, _ in configurations(args.sample_rate)}
+        for round_index in range(args.repeat):
+            for name, config in configurations(args.sample_rate):
+                path = os.path.join(directory, f"{round_index}-" + name.replace(" ", "_").replace("%", "") + ".log")
+                pipeline = setup_logging(config.model_copy(update={"path": path}))
+                crew.verbose = config.crew_verbose
+                with open(path, "a", encoding="utf-8") as stdout, contextlib.redirect_stdout(stdout):
+                    result = await run_batch(crew, emails, args.concurrency)
+                    flush = time.perf_counter()
+                    pipeline.stop()
+                    flush = time.perf_counter() - flush
+                stats, log = result["stats"], pipeline.stats()
+                samples[name].append({
+                    "emails": stats.total,
+                    "failed": stats.failed,
+                    "wall_per_email_ms": stats.wall_time / stats.total * 1000,
+                    "cpu_per_email_ms": result["cpu"] / stats.total * 1000,
+                    "lag_p99_ms": result["lag"]["p99"] * 1000,
+                    "flush_ms": flush * 1000,
+                    "records": log.emitted,
+                    "sampled_out": log.sampled_out,
+                    "dropped": log.dropped,
+                    "log_bytes": os.path.getsize(path),
+                })
+
+        baseline = None
+        for name, runs in samples.items():
+            row = {"config": name, "rounds": len(runs)}
+            for key in runs[0]:
+                row[key] = statistics.median(run[key] for run in runs)
+            baseline = row["cpu_per_email_ms"] if baseline is None else baseline
+            row["overhead_per_email_ms"] = row["cpu_per_email_ms"] - baseline
+            rows.append(row)
+    finally:
+        setup_logging(LogConfig(level="WARNING"))
+        shutil.rmtree(directory, ignore_errors=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead benchmark")
+    parser.add_argument("-n", "--emails", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="Flows in flight")
+    parser.add_argument("--fixtures", default="llm_fixtures.jsonl", help="Fixture store (JSONL)")
+    parser.add_argument("--latency", default="fixed:0.05", help="Synthetic LLM latency per call")
+    parser.add_argument("--miss-policy", choices=["task", "synthetic", "error"], default="task")
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="Share of emails logged below WARNING")
+    parser.add_argument("--repeat", type=int, default=3, help="Rounds over all configurations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+
+    print(f"{args.emails} emails, {args.concurrency} flows in flight, LLM latency {args.latency}")
+    print(f"{'configuration':<22} {'wall ms':>8} {'cpu ms':>7} {'overhead':>9} {'lag p99':>8} {'flush ms':>9} "
+          f"{'records':>8} {'sampled':>8} {'dropped':>8} {'KiB':>7}")
+    for row in rows:
+        print(f"{row['config']:<22} {row['wall_per_email_ms']:>8.1f} {row['cpu_per_email_ms']:>7.2f} "
+              f"{row['overhead_per_email_ms']:>+9.2f} {row['lag_p99_ms']:>8.1f} {row['flush_ms']:>9.1f} "
+              f"{row['records']:>8} {row['sampled_out']:>8} {row['dropped']:>8} {row['log_bytes'] / 1024:>7.0f}")
+    print(f"(per email, median of {args.repeat} rounds; overhead = CPU time over the warning configuration)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Coverage and accuracy of the pre-router against analyzer (LLM) labels
+
+The replay set is a JSONL file of emails labelled by the analyze_intent task:
+{"subject", "body", "sender", "can_prepare_general_answer"}. Create it with
+--label N, which runs the analyzer on N synthetic emails (the load test
+stream plus auto-replies, empty messages and one-line info requests) with the
+LLM selected by INTENT_LLM_MODE; use live mode or recorded fixtures, since
+synthetic replay answers are random. The set is split into a training part
+for the n-gram model and a held-out part, and for every threshold the report
+shows on the held-out emails
+
+- short-circuited: share of emails routed without the analyzer
+- accuracy: share of those routes that agree with the analyzer label
+
+for the rules alone and for rules followed by the n-gram model.
+
+Run: python -m intent_not_identified_flow.benchmarks.pre_router_bench --labels labels.jsonl --label 500
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Iterator, List
+
+from intent_not_identified_flow.benchmarks.load_test import synthetic_emails
+from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+from intent_not_identified_flow.models.email import EmailContent
+from intent_not_identified_flow.models.outputs import IntentAnalysis
+from intent_not_identified_flow.services.pre_router import NgramClassifier, PreRouter, RuleClassifier, email_text
+
+TRIVIAL = [
+    ("Automatic reply: Question", "I am out of the office until Monday with limited access to email."),
+    ("Out of Office", "Thank you for your message. I am currently away from the office."),
+    ("Re: Hello", ""),
+    ("Info", "Please send me more information."),
+    ("Brochure", "Could you share a brochure about your product?"),
+    ("Undeliverable: Your order", "Delivery Status Notification (Failure)"),
+]
+
+
+def replay_emails(count: int, seed: int = 0) -> Iterator[EmailContent]:
+    """Load test emails mixed with trivially classifiable ones"""
+    rng = random.Random(seed)
+    regular = synthetic_emails(count, seed)
+    for i in range(count):
+        if rng.random() < 0.3:
+            subject, body = rng.choice(TRIVIAL)
+            yield EmailContent(subject=subject, body=body, sender=f"auto{i}@example.com")
+        else:
+            yield next(regular)
+
+
+async def label(count: int, seed: int, path: str, concurrency: int = 20) -> None:
+    """Label emails with the analyzer and write the replay set"""
+    crew = IntentCrew()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(email: EmailContent):
+        async with semaphore:
+            _, analysis = await crew.execute_structured_task_async(
+                "analyze_intent", context={"email_content": email.dict()}, schema=IntentAnalysis
+            )
+        return email, analysis
+
+    results = await asyncio.gather(*(analyze(email) for email in replay_emails(count, seed)))
+    with open(path, "w", encoding="utf-8") as f:
+        for email, analysis in results:
+            if analysis is not None:
+                f.write(json.dumps({**email.dict(),
+                                    "can_prepare_general_answer": analysis.can_prepare_general_answer}) + "\n")
+
+
+def load_labels(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(router: PreRouter, rows: List[dict]) -> tuple:
+    """Short-circuit rate and accuracy of the short-circuited routes"""
+    correct = 0
+    for row in rows:
+        decision = router.route(EmailContent(subject=row["subject"], body=row["body"], sender=row["sender"]))
+        if decision is not None:
+            correct += decision.can_prepare_general_answer == row["can_prepare_general_answer"]
+    stats = router.stats()
+    return stats.short_circuit_rate, correct / stats.short_circuited if stats.short_circuited else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-router benchmark against analyzer labels")
+    parser.add_argument("--labels", default="pre_router_labels.jsonl", help="Replay set (JSONL)")
+    parser.add_argument("--label", type=int, metavar="N", help="First label N emails with the analyzer")
+    parser.add_argument("--train-fraction", type=float, default=0.7)
+    parser.add_argument("--thresholds", default="0.8,0.9,0.95")
+    parser.add_argument("--save-model", help="Save the trained n-gram model (.npz) for INTENT_PRE_ROUTER_MODEL")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.label:
+        asyncio.run(label(args.label, args.seed, args.labels))
+    rows = load_labels(args.labels)
+    random.Random(args.seed).shuffle(rows)
+    split = int(len(rows) * args.train_fraction)
+    train, held_out = rows[:split], rows[split:]
+    if not train or not held_out:
+        parser.error(f"Need more labelled emails to split, got {len(rows)}")
+
+    model = NgramClassifier().fit(
+        [email_text(EmailContent(**{k: row[k] for k in ("subject", "body", "sender")})) for row in train],
+        [row["can_prepare_general_answer"] for row in train],
+    )
+    if args.save_model:
+        model.save(args.save_model)
+
+    positives = sum(row["can_prepare_general_answer"] for row in held_out)
+    print(f"{len(train)} training and {len(held_out)} held-out emails "
+          f"({positives / len(held_out):.0%} labelled can_prepare)")
+    print(f"{'cascade':<14} {'threshold':>9} {'short-circuited':>16} {'accuracy':>9}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        for name, classifiers in (("rules", [RuleClassifier()]), ("rules+ngram", [RuleClassifier(), model])):
+            rate, accuracy = evaluate(PreRouter(classifiers, threshold=threshold), held_out)
+            print(f"{name:<14} {threshold:>9.2f} {rate:>16.1%} {accuracy:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
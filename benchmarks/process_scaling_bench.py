@@ -0,0 +1,84 @@
+"""
+Throughput scaling of the multi-process worker pool
+
+Runs the same synthetic emails through a ProcessPool with 1, 2, 4, ... worker
+processes (replaying LLM backend, see load_test) and reports throughput and
+speedup over a single process. With enough flows in flight per process the
+LLM wait overlaps fully and a single event loop becomes CPU-bound; more
+processes then scale throughput until the cores are used up.
+
+The replay configuration is passed to the worker processes through the
+environment, so every process starts from the same fixtures and latency model.
+--preload forks the processes from a forkserver with crewAI already imported
+(warm pool); compare the startup column with and without it.
+
+Run: python -m intent_not_identified_flow.benchmarks.process_scaling_bench -n 400 --concurrency 50
+"""
+import os
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import argparse
+import json
+import logging
+
+from intent_not_identified_flow.benchmarks.load_test import synthetic_emails
+from intent_not_identified_flow.services.process_pool import WARM_MODULES, FlowFactory, ProcessPool
+
+
+def process_counts(maximum: int):
+    count = 1
+    while count < maximum:
+        yield count
+        count *= 2
+    yield maximum
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker process scaling benchmark")
+    parser.add_argument("-n", "--emails", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50, help="Flows in flight per process")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--fixtures", default="llm_fixtures.jsonl", help="Fixture store (JSONL)")
+    parser.add_argument("--latency", default="lognormal:0.2:0.5", help="Synthetic LLM latency per call")
+    parser.add_argument("--miss-policy", choices=["task", "synthetic", "error"], default="task")
+    parser.add_argument("--preload", action="store_true", help="Fork the processes from a warm forkserver")
+    parser.add_argument("--parallel", action="store_true", help="Run the flow in parallel mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "INTENT_LLM_MODE": "replay",
+        "INTENT_LLM_FIXTURES": args.fixtures,
+        "INTENT_LLM_LATENCY": args.latency,
+        "INTENT_LLM_MISS_POLICY": args.miss_policy,
+        "INTENT_LLM_SEED": str(args.seed),
+    })
+    logging.getLogger().setLevel(logging.WARNING)
+    emails = list(synthetic_emails(args.emails, seed=args.seed))
+    flow_factory = FlowFactory(parallel=args.parallel)
+
+    print(f"{args.emails} emails, {args.concurrency} flows per process, {os.cpu_count()} CPUs "
+          f"(throughput excludes process startup)")
+    print(f"{'processes':>9} {'done':>6} {'failed':>6} {'wall s':>8} {'startup s':>10} {'emails/s':>9} {'speedup':>8} {'restarts':>9}")
+    rows, baseline = [], None
+    for processes in process_counts(args.max_processes):
+        pool = ProcessPool(flow_factory, processes=processes, concurrency=args.concurrency,
+                           preload=WARM_MODULES if args.preload else None)
+        pool.run(emails)
+        stats = pool.stats
+        baseline = baseline or stats.throughput
+        speedup = stats.throughput / baseline if baseline else 0.0
+        rows.append({**stats.model_dump(), "throughput": stats.throughput, "speedup": speedup})
+        print(f"{processes:>9} {stats.done:>6} {stats.failed:>6} {stats.wall_time:>8.1f} {stats.startup_time:>10.1f} "
+              f"{stats.throughput:>9.1f} {speedup:>7.2f}x {stats.restarts:>9}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
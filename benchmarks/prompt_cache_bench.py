@@ -0,0 +1,121 @@
+"""
+Prompt prefix caching: hit rates, input cost and time to first token
+
+Runs the same synthetic emails through the flow (replaying LLM backend, see
+load_test) against a simulated provider prefix cache (MockPrefixCache:
+Anthropic's pricing, 5 minute TTL, prefill skipped for cached tokens) with
+the task message
+
+- inline: as crewAI builds it, per-email inputs in the middle of the task
+  text, so only the agent's system prompt repeats across emails
+- split: cut at INPUT_MARKER into the static instructions (a cache
+  breakpoint) and the per-email inputs (services/prompt_cache.py)
+
+each with every --min-tokens, the shortest prefix the provider caches
+(Anthropic: 1024 tokens for Sonnet, 2048 for Haiku; 0 shows what the
+layout could reuse without that floor). Reports per configuration the
+share of calls and of prompt tokens served from the cache, the input cost
+against no caching, the time to first token (simulated prefill) and the
+end-to-end latency per email.
+
+Run: python -m intent_not_identified_flow.benchmarks.prompt_cache_bench -n 200 --min-tokens 0 1024
+"""
+import os
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from intent_not_identified_flow.benchmarks.load_test import synthetic_emails
+from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+from intent_not_identified_flow.main import IntentNotIdentifiedFlow
+from intent_not_identified_flow.services.batch_runner import BatchRunner
+from intent_not_identified_flow.services.llm_backend import MockPrefixCache, build_llm
+from intent_not_identified_flow.services.prompt_cache import PrefixCacheTracker, prefix_cached
+
+
+async def run_configuration(args, split: bool, min_tokens: int) -> dict:
+    cache = MockPrefixCache(min_tokens=min_tokens, prefill_rate=args.prefill_rate)
+    tracker = PrefixCacheTracker()
+    crew = IntentCrew(llm_factory=lambda model: prefix_cached(
+        build_llm(model, mode="replay", fixtures=args.fixtures, latency=args.latency,
+                  miss_policy=args.miss_policy, seed=args.seed, prefix_cache=cache, prompt_cache=False),
+        tracker, split=split,
+    ))
+    runner = BatchRunner(lambda: IntentNotIdentifiedFlow(intent_crew=crew), concurrency=args.concurrency)
+    await runner.run(synthetic_emails(args.emails, args.seed))
+
+    summaries = tracker.summary()
+    calls = sum(s.calls for s in summaries)
+    prompt_tokens = sum(s.prompt_tokens for s in summaries)
+    cached = sum(s.cached_tokens for s in summaries)
+    written = sum(s.cache_write_tokens for s in summaries)
+    stats = runner.stats
+    return {
+        "layout": "split" if split else "inline",
+        "min_tokens": min_tokens,
+        "emails": stats.total,
+        "failed": stats.failed,
+        "calls": calls,
+        "hit_rate": sum(s.hits for s in summaries) / calls if calls else 0.0,
+        "token_hit_rate": cached / prompt_tokens if prompt_tokens else 0.0,
+        "input_cost_ratio": (sum(s.input_cost_ratio * s.prompt_tokens for s in summaries) / prompt_tokens
+                             if prompt_tokens else 1.0),
+        "prefix_tokens": {s.task: s.prefix_tokens for s in summaries} if split else None,
+        "cache_write_tokens": written,
+        # Mean simulated prefill, i.e. the time to first token of a call
+        "ttft_ms": cache.prefill_time(prompt_tokens, cached) / calls * 1000 if calls else 0.0,
+        "latency_p50": stats.latency_p50,
+        "latency_p95": stats.latency_p95,
+    }
+
+
+async def run(args) -> list:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=3 * args.concurrency))
+    rows = []
+    for min_tokens in args.min_tokens:
+        for split in (False, True):
+            rows.append(await run_configuration(args, split, min_tokens))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt prefix caching benchmark")
+    parser.add_argument("-n", "--emails", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20, help="Flows in flight")
+    parser.add_argument("--fixtures", default="llm_fixtures.jsonl", help="Fixture store (JSONL)")
+    parser.add_argument("--latency", default="fixed:0.2", help="Synthetic generation latency per call")
+    parser.add_argument("--miss-policy", choices=["task", "synthetic", "error"], default="task")
+    parser.add_argument("--min-tokens", type=int, nargs="+", default=[0, 1024],
+                        help="Shortest prefix the simulated provider caches")
+    parser.add_argument("--prefill-rate", type=float, default=5000.0, help="Uncached prompt tokens per second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+
+    print(f"{args.emails} emails, {args.concurrency} flows in flight, generation latency {args.latency}, "
+          f"prefill {args.prefill_rate:.0f} tokens/s")
+    print(f"{'layout':<7} {'min tok':>7} {'calls':>6} {'hit %':>6} {'tok hit %':>9} {'in cost':>8} "
+          f"{'ttft ms':>8} {'p50 s':>7} {'p95 s':>7}")
+    for row in rows:
+        print(f"{row['layout']:<7} {row['min_tokens']:>7} {row['calls']:>6} {row['hit_rate']:>6.0%} "
+              f"{row['token_hit_rate']:>9.0%} {row['input_cost_ratio']:>8.2f} {row['ttft_ms']:>8.1f} "
+              f"{row['latency_p50']:>7.3f} {row['latency_p95']:>7.3f}")
+    split = next(row for row in rows if row["prefix_tokens"])
+    print("Static prefix (system prompt and task instructions), tokens: "
+          + "  ".join(f"{task} {tokens}" for task, tokens in split["prefix_tokens"].items()))
+    print("(in cost: input token cost against no caching, cache writes at 1.25x and reads at 0.1x)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
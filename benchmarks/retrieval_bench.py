@@ -0,0 +1,87 @@
+"""
+Recall and latency of lexical, dense and hybrid knowledge base retrieval
+
+Each synthetic document is a bag of words drawn from one of many topics.
+Every query targets one document: it keeps a few of the document's words
+verbatim and rewrites others into a different inflection ("integrate" ->
+"integrating"), the kind of vocabulary mismatch where BM25 loses recall and
+character n-gram embeddings still match. Dense vectors are written to a
+memory-mapped store (--dtype), as in production.
+
+Run: python -m intent_not_identified_flow.benchmarks.retrieval_bench --docs 20000
+"""
+import argparse
+import contextlib
+import io
+import random
+import shutil
+import tempfile
+import time
+
+from intent_not_identified_flow.services.batch_runner import percentile
+from intent_not_identified_flow.services.knowledge_api import KnowledgeAPI
+from intent_not_identified_flow.services.search_index import BM25Index, Document
+from intent_not_identified_flow.services.vector_store import build_store
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "fi", "gu", "be", "xo"]
+SUFFIXES = ["", "ing", "ed", "er", "ment", "ation"]
+
+
+def make_corpus(n_docs: int, n_topics: int, seed: int = 3):
+    rng = random.Random(seed)
+    stems = list({"".join(rng.choice(SYLLABLES) for _ in range(3)) for _ in range(n_topics * 40)})
+    topics = [rng.sample(stems, 30) for _ in range(n_topics)]
+    documents, queries = [], []
+    for i in range(n_docs):
+        words = rng.sample(rng.choice(topics), 12)
+        text = [w + rng.choice(SUFFIXES) for w in words]
+        documents.append(Document(id=str(i), title=" ".join(text[:3]), content=" ".join(text[3:])))
+        exact = rng.sample(text, 2)
+        rewritten = [w + rng.choice([s for s in SUFFIXES if s]) for w in rng.sample(words, 4)]
+        queries.append((i, " ".join(exact + rewritten)))
+    return documents, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20_000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    documents, queries = make_corpus(args.docs, args.topics)
+    queries = queries[:args.queries]
+    index_dir, store_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+    try:
+        BM25Index().build(documents).save(index_dir)
+        started = time.perf_counter()
+        build_store(documents, store_dir, dtype=args.dtype)
+        print(f"embedding store built in {time.perf_counter() - started:.1f}s for {len(documents)} documents")
+
+        print(f"{'mode':<8} {'recall@' + str(args.top_k):>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for mode in ("lexical", "dense", "hybrid"):
+            api = KnowledgeAPI(index_path=index_dir, vector_store_path=store_dir, mode=mode, top_k=args.top_k)
+            _quiet_search(api, "warm up")
+            found, latencies = 0, []
+            for target, query in queries:
+                started = time.perf_counter()
+                results = _quiet_search(api, query)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found += any(r["id"] == documents[target].id for r in results)
+            print(f"{mode:<8} {found / len(queries):>9.3f} {percentile(latencies, 50):>8.3f} "
+                  f"{percentile(latencies, 95):>8.3f} {percentile(latencies, 99):>8.3f}")
+    finally:
+        shutil.rmtree(index_dir)
+        shutil.rmtree(store_dir)
+
+
+def _quiet_search(api: KnowledgeAPI, query: str):
+    """KnowledgeAPI.search without its per-call print on the terminal"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return api.search(query)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of the BM25 knowledge base index
+
+Builds an index over a synthetic corpus with a Zipf-distributed vocabulary and
+reports build time, save/load time, index memory and query latency
+percentiles for short keyword queries.
+
+Run: python -m intent_not_identified_flow.benchmarks.search_bench --docs 100000
+"""
+import argparse
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from intent_not_identified_flow.services.batch_runner import percentile
+from intent_not_identified_flow.services.search_index import BM25Index, Document
+
+
+def synthetic_corpus(n_docs: int, vocabulary: int = 50_000, doc_length: int = 80, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    words = [f"term{i}" for i in range(vocabulary)]
+    ranks = np.minimum(rng.zipf(1.2, size=(n_docs, doc_length)), vocabulary) - 1
+    for i in range(n_docs):
+        tokens = [words[r] for r in ranks[i]]
+        yield Document(id=str(i), title=" ".join(tokens[:4]), content=" ".join(tokens[4:]))
+
+
+def synthetic_queries(n_queries: int, vocabulary: int = 50_000, seed: int = 2):
+    rng = np.random.default_rng(seed)
+    for _ in range(n_queries):
+        ranks = np.minimum(rng.zipf(1.3, size=rng.integers(2, 5)), vocabulary) - 1
+        yield " ".join(f"term{r}" for r in ranks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    documents = list(synthetic_corpus(args.docs))
+
+    started = time.perf_counter()
+    index = BM25Index().build(documents)
+    build_time = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    array_bytes = index.offsets.nbytes + index.doc_ids.nbytes + index.weights.nbytes
+
+    directory = tempfile.mkdtemp()
+    try:
+        started = time.perf_counter()
+        index.save(directory)
+        save_time = time.perf_counter() - started
+        started = time.perf_counter()
+        index = BM25Index.load(directory)
+        load_time = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory)
+
+    latencies = []
+    for query in synthetic_queries(args.queries):
+        started = time.perf_counter()
+        index.search(query, top_k=args.top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    print(f"documents:        {len(index)}")
+    print(f"terms:            {len(index.vocabulary)}")
+    print(f"postings:         {len(index.doc_ids)}")
+    print(f"build time:       {build_time:.2f}s (peak RSS incl. corpus {peak_rss:.0f} MiB)")
+    print(f"save / load:      {save_time:.2f}s / {load_time:.2f}s")
+    print(f"posting arrays:   {array_bytes / 2**20:.1f} MiB")
+    print(f"query latency ms: p50 {percentile(latencies, 50):.3f}  p95 {percentile(latencies, 95):.3f}  "
+          f"p99 {percentile(latencies, 99):.3f}  max {max(latencies):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Precision/recall benchmark of the analyze_intent semantic cache
+
+Generates a synthetic stream of emails from a fixed set of intents, each with
+several phrasings plus random greetings, names, sign-offs and filler, and
+replays it through a SemanticCache as production would: every email is looked
+up first and added after a miss. For each threshold it reports
+
+- precision: share of cache hits that returned an email with the same intent
+- recall: share of emails with an already-seen intent that got a correct hit
+- savings: share of emails that skipped the analyzer LLM call
+- lookup latency for brute-force and LSH search
+- neg: how many NEGATIVE_PAIRS got a hit, i.e. the second email of a pair
+  was answered with the analysis cached for the first (should be 0)
+
+Run: python -m intent_not_identified_flow.benchmarks.semantic_cache_bench
+"""
+import argparse
+import random
+import time
+
+from intent_not_identified_flow.services.semantic_cache import SemanticCache
+
+INTENTS = [
+    ["Could you send me some general information about your product?",
+     "I'd like to get general info about what your product does.",
+     "Please share an overview of your product and its features."],
+    ["How much does the Professional plan cost per month?",
+     "What is the monthly price of the Professional tier?",
+     "Can you tell me the pricing for the Professional plan?"],
+    ["How much does the Enterprise plan cost?",
+     "What is the pricing for the Enterprise tier?",
+     "Can you give me a quote for Enterprise pricing?"],
+    ["How long does implementation usually take?",
+     "What does your implementation process look like and how long is it?",
+     "How many weeks does onboarding and implementation take?"],
+    ["Do you integrate with Salesforce?",
+     "Is there an integration with Salesforce CRM?",
+     "Can your system connect to our Salesforce instance?"],
+    ["Please unsubscribe me from your newsletter.",
+     "Remove me from the mailing list please.",
+     "I no longer want to receive your newsletter, unsubscribe me."],
+    ["I am out of the office until Monday with limited access to email.",
+     "Out of office: I will be back next week and will reply then.",
+     "Automatic reply: I am currently away and will respond on my return."],
+    ["Is your solution used in healthcare organizations?",
+     "Do hospitals and healthcare providers use your product?",
+     "Do you have customers in the healthcare sector?"],
+    ["Do you offer a free trial?",
+     "Can I try the product for free before buying?",
+     "Is there a trial period available?"],
+    ["Our dashboard has been down since this morning, please help.",
+     "The dashboard is not loading for our whole team today.",
+     "We cannot access the dashboard at all, it keeps timing out."],
+    ["Can I get an invoice copy for last month?",
+     "Please resend the invoice for our last payment.",
+     "I need a copy of last month's invoice for accounting."],
+    ["Do you support GDPR compliance tracking?",
+     "Does the product help with GDPR compliance?",
+     "How do you handle GDPR compliance requirements?"],
+]
+GREETINGS = ["Hello,", "Hi,", "Hi there,", "Dear team,", "Good morning,", "Hey,", ""]
+SIGN_OFFS = ["Thanks,", "Best,", "Best regards,", "Kind regards,", "Cheers,", "Sincerely,", "Thank you,"]
+NAMES = ["John", "Maria", "Peter Novak", "Aiko", "Fatima", "Lukas", "Chen Wei", "Olivia Brown"]
+FILLERS = ["", "", "I found you online.", "A colleague recommended you.", "We are a small team of ten people."]
+# Same subject, same greeting and "Thanks for your reply." line, different requests: must never share a hit
+NEGATIVE_PAIRS = [
+    ("Re: your email",
+     "Hi,\nThanks for your reply.\nCould you send pricing for 50 seats?\nBest,\nAnna",
+     "Hello,\nThanks for your reply.\nPlease cancel my subscription and refund the last invoice.\nJohn"),
+]
+SUBJECTS = ["Question", "Quick question", "Info", "Hello", "Inquiry", "Re: your email", ""]
+
+
+def synthetic_emails(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        intent = rng.randrange(len(INTENTS))
+        lines = [rng.choice(GREETINGS), rng.choice(FILLERS), rng.choice(INTENTS[intent]), "",
+                 rng.choice(SIGN_OFFS), rng.choice(NAMES)]
+        yield intent, rng.choice(SUBJECTS), "\n".join(line for line in lines if line is not None)
+
+
+def evaluate(emails, threshold: float, use_ann: bool):
+    cache = SemanticCache(threshold=threshold, capacity=len(emails), use_ann=use_ann)
+    seen = set()
+    hits = correct = eligible = 0
+    started = time.perf_counter()
+    for intent, subject, body in emails:
+        if intent in seen:
+            eligible += 1
+        match = cache.lookup(subject, body)
+        if match is not None:
+            hits += 1
+            if int(match[0]) == intent:
+                correct += 1
+        else:
+            cache.add(subject, body, str(intent))
+        seen.add(intent)
+    elapsed = time.perf_counter() - started
+    return {
+        "precision": correct / hits if hits else 1.0,
+        "recall": correct / eligible if eligible else 0.0,
+        "savings": hits / len(emails),
+        "us_per_email": elapsed / len(emails) * 1e6,
+        "entries": cache.stats().entries,
+    }
+
+
+def negative_hits(threshold: float, use_ann: bool) -> int:
+    hits = 0
+    for subject, first, second in NEGATIVE_PAIRS:
+        cache = SemanticCache(threshold=threshold, capacity=2, use_ann=use_ann)
+        cache.add(subject, first, "first")
+        hits += cache.lookup(subject, second) is not None
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--thresholds", default="0.6,0.7,0.75,0.8,0.85,0.9,0.95")
+    args = parser.parse_args()
+
+    emails = list(synthetic_emails(args.emails))
+    print(f"{'mode':<6} {'threshold':>9} {'precision':>9} {'recall':>7} {'savings':>8} {'us/email':>9} {'entries':>8} {'neg':>4}")
+    for use_ann in (False, True):
+        for threshold in (float(t) for t in args.thresholds.split(",")):
+            r = evaluate(emails, threshold, use_ann)
+            print(f"{'lsh' if use_ann else 'exact':<6} {threshold:>9.2f} {r['precision']:>9.3f} {r['recall']:>7.3f} "
+                  f"{r['savings']:>8.3f} {r['us_per_email']:>9.1f} {r['entries']:>8} "
+                  f"{negative_hits(threshold, use_ann):>4}/{len(NEGATIVE_PAIRS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Per-flow memory and serialization cost of the flow state
+
+Builds --flows completed flow states (can_prepare branch, realistic LLM
+output sizes) and holds them all at once, as with that many flows in
+flight, in two representations:
+
+- legacy: the state before StageOutput - analysis and answer as dicts of the
+  raw text plus parsed fields, retrieval, summary and final materials as the
+  CrewOutput returned by the crew (with its task output: prompt, agent
+  conversation and token usage)
+- compact: IntentState with interned StageOutputs and the pre-rendered
+  EmailBlock
+
+and reports per flow: retained heap (tracemalloc) and resident size growth,
+state serialization (model_dump_json) and checkpoint encoding time and size,
+and the time to build the task contexts of the five LLM-calling steps
+(legacy: the email dict rendered and counted at every step, with the old
+pretty-printed accounting). Each representation is measured in a fresh
+process, so one does not inherit the other's freed memory.
+
+Run: python -m intent_not_identified_flow.benchmarks.state_memory_bench --flows 10000
+"""
+import os
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import argparse
+import gc
+import json
+import multiprocessing
+import random
+import re
+import time
+import tracemalloc
+from typing import Optional
+
+from crewai.crews.crew_output import CrewOutput
+from crewai.tasks.task_output import TaskOutput
+from crewai.types.usage_metrics import UsageMetrics
+from pydantic import BaseModel
+
+from intent_not_identified_flow.benchmarks.load_test import synthetic_emails
+from intent_not_identified_flow.crews.intent_crew.context_builder import ContextBuilder, count_tokens
+from intent_not_identified_flow.crews.intent_crew.intent_crew import TASK_AGENTS, IntentCrew
+from intent_not_identified_flow.main import IntentState
+from intent_not_identified_flow.models.email import EmailContent
+from intent_not_identified_flow.models.state import StageOutput
+from intent_not_identified_flow.services.checkpoints import encode
+
+WORDS = ("pricing implementation integration enterprise plan support onboarding security dashboard team "
+         "customer features trial weeks manager account data report").split()
+TASKS = ["analyze_intent", "retrieve_information", "create_general_answer", "create_email_summary",
+         "prepare_final_material"]
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+class LegacyIntentState(BaseModel):
+    """IntentState as it was before StageOutput"""
+    email: EmailContent = None
+    analysis_results: dict = None
+    retrieved_info: dict = None
+    created_response: dict = None
+    email_summary: str = ""
+    final_materials: dict = None
+    can_prepare_info: bool = False
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def stage_results(rng: random.Random) -> dict:
+    """Raw text (and parsed fields) of every task of one flow"""
+    analysis = {"can_prepare_general_answer": True, "identified_topics": ["pricing", "implementation"],
+                "confidence_score": 0.85}
+    answer = {"summary": _text(rng, 40), "detailed_response": _text(rng, 350), "references": ["Pricing Plans"]}
+    return {
+        "analyze_intent": (json.dumps(analysis), analysis),
+        "retrieve_information": (_text(rng, 450), None),
+        "create_general_answer": (json.dumps(answer), answer),
+        "create_email_summary": (_text(rng, 80), None),
+        "prepare_final_material": (_text(rng, 500), None),
+    }
+
+
+def _interpolate(template: str, inputs: dict) -> str:
+    return _PLACEHOLDER.sub(lambda m: inputs.get(m.group(1), m.group(0)), template)
+
+
+def _crew_output(crew: IntentCrew, task_name: str, raw: str, inputs: dict) -> CrewOutput:
+    """What the crew returned for a task: the prompt and agent conversation ride along"""
+    description, expected_output = (_interpolate(t, inputs) for t in crew.task_templates(task_name))
+    agent = TASK_AGENTS[task_name]
+    prompt = f"{description}\n\nThis is the expected criteria for your final answer: {expected_output}"
+    usage = UsageMetrics(total_tokens=count_tokens(prompt) + count_tokens(raw), prompt_tokens=count_tokens(prompt),
+                         completion_tokens=count_tokens(raw), successful_requests=1)
+    task_output = TaskOutput(
+        description=description, name=task_name, expected_output=expected_output, raw=raw, agent=agent,
+        messages=[{"role": "system", "content": f"You are {agent}. " + " ".join(WORDS * 6)},
+                  {"role": "user", "content": prompt},
+                  {"role": "assistant", "content": raw}],
+    )
+    return CrewOutput(raw=raw, tasks_output=[task_output], token_usage=usage)
+
+
+def _contexts(state, email_content) -> list:
+    """(task, context) of the five LLM-calling steps, as the flow builds them"""
+    return [
+        ("analyze_intent", {"email_content": email_content(state)}),
+        ("retrieve_information", {"email_content": email_content(state),
+                                  "analysis_results": state.analysis_results}),
+        ("create_general_answer", {"email_content": email_content(state),
+                                   "analysis_results": state.analysis_results,
+                                   "retrieved_info": state.retrieved_info}),
+        ("create_email_summary", {"email_content": email_content(state),
+                                  "created_response": state.created_response}),
+        ("prepare_final_material", {"email_content": email_content(state),
+                                    "analysis_results": state.analysis_results,
+                                    "retrieved_info": state.retrieved_info,
+                                    "created_response": state.created_response,
+                                    "email_summary": state.email_summary}),
+    ]
+
+
+def legacy_state(crew: IntentCrew, builder: ContextBuilder, email: EmailContent, results: dict) -> LegacyIntentState:
+    state = LegacyIntentState(email=email)
+    for task_name in TASKS:
+        # The prompt the task saw, from the state so far
+        context = dict(_contexts(state, lambda s: s.email.dict()))[task_name]
+        inputs, _ = builder.build(task_name, crew.task_templates(task_name), context)
+        raw, parsed = results[task_name]
+        if task_name == "analyze_intent":
+            state.analysis_results = {"raw": raw, **parsed}
+            state.can_prepare_info = True
+        elif task_name == "create_general_answer":
+            state.created_response = {"raw": raw, **parsed}
+        else:
+            output = _crew_output(crew, task_name, raw, inputs)
+            if task_name == "retrieve_information":
+                state.retrieved_info = output
+            elif task_name == "create_email_summary":
+                state.email_summary = output
+            else:
+                state.final_materials = output
+    return state
+
+
+def compact_state(email: EmailContent, results: dict) -> IntentState:
+    state = IntentState(email=email)
+    state.email_block  # rendered once, when the first task runs
+    state.analysis_results = StageOutput.of(*results["analyze_intent"])
+    state.can_prepare_info = True
+    state.retrieved_info = StageOutput.of(results["retrieve_information"][0])
+    state.created_response = StageOutput.of(*results["create_general_answer"])
+    state.email_summary = StageOutput.of(results["create_email_summary"][0])
+    state.final_materials = StageOutput.of(results["prepare_final_material"][0])
+    return state
+
+
+def _rss() -> Optional[int]:
+    """Current resident set size in bytes (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def measure(representation: str, flows: int, sample: int, seed: int) -> dict:
+    crew = IntentCrew()
+    legacy = representation == "legacy"
+    builder = ContextBuilder(measure_savings=legacy)
+
+    def build_states():
+        rng = random.Random(seed)
+        if legacy:
+            return [legacy_state(crew, builder, email, stage_results(rng)) for email in synthetic_emails(flows, seed)]
+        return [compact_state(email, stage_results(rng)) for email in synthetic_emails(flows, seed)]
+
+    # Resident size first, without tracemalloc's own bookkeeping in it; emails and texts
+    # are part of both representations, generated the same way
+    gc.collect()
+    rss_before = _rss()
+    states = build_states()
+    gc.collect()
+    rss_after = _rss()
+    del states
+    gc.collect()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    states = build_states()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    subset = states[:sample]
+    started = time.perf_counter()
+    dumps = [state.model_dump_json(warnings=False) for state in subset]
+    dump_time = time.perf_counter() - started
+    started = time.perf_counter()
+    blobs = [encode(dict(state)) for state in subset]
+    encode_time = time.perf_counter() - started
+
+    email_content = (lambda s: s.email.dict()) if legacy else (lambda s: s.email_block)
+    started = time.perf_counter()
+    for state in subset:
+        for task_name, context in _contexts(state, email_content):
+            builder.build(task_name, crew.task_templates(task_name), context)
+    context_time = time.perf_counter() - started
+
+    return {
+        "representation": representation,
+        "flows": flows,
+        "heap_per_flow_kib": (after - before) / flows / 1024,
+        "rss_per_flow_kib": (rss_after - rss_before) / flows / 1024 if rss_before is not None else None,
+        "dump_us": dump_time / len(subset) * 1e6,
+        "dump_bytes": sum(len(d) for d in dumps) / len(subset),
+        "encode_us": encode_time / len(subset) * 1e6,
+        "encode_bytes": sum(len(b) for b in blobs) / len(subset),
+        "contexts_us": context_time / len(subset) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flow state memory and serialization benchmark")
+    parser.add_argument("--flows", type=int, default=10000, help="Completed flow states held at once")
+    parser.add_argument("--sample", type=int, default=1000, help="States serialized and contexts built for timing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    sample = max(1, min(args.sample, args.flows))
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for representation in ("legacy", "compact"):
+        with context.Pool(1) as pool:
+            rows.append(pool.apply(measure, (representation, args.flows, sample, args.seed)))
+
+    print(f"{args.flows} flows in flight; serialization and contexts timed on {sample} of them")
+    print(f"{'state':<8} {'heap KiB':>9} {'RSS KiB':>8} {'dump us':>8} {'dump B':>8} "
+          f"{'encode us':>10} {'encode B':>9} {'contexts us':>12}")
+    for row in rows:
+        rss = f"{row['rss_per_flow_kib']:>8.1f}" if row["rss_per_flow_kib"] is not None else f"{'-':>8}"
+        print(f"{row['representation']:<8} {row['heap_per_flow_kib']:>9.1f} {rss} {row['dump_us']:>8.0f} "
+              f"{row['dump_bytes']:>8.0f} {row['encode_us']:>10.0f} {row['encode_bytes']:>9.0f} "
+              f"{row['contexts_us']:>12.0f}")
+    legacy, compact = rows
+    print(f"(per flow; compact holds {legacy['heap_per_flow_kib'] / compact['heap_per_flow_kib']:.1f}x less heap, "
+          f"contexts build {legacy['contexts_us'] / compact['contexts_us']:.1f}x faster)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Accuracy and speed of structured-output parsing on messy LLM answers
+
+Builds a fuzz corpus of analyze_intent answers: the JSON object wrapped in
+prose, code fences and "Final Answer:" prefixes, preceded by example objects,
+followed by explanations containing braces, with braces and quotes inside
+strings, Python-style literals, trailing commas, long reasoning text, and
+truncated objects that must be rejected. Hand-written cases seen in real
+outputs are included too. Every case is parsed by
+
+- legacy: the greedy r"\{.*\}" regex with json.loads used before
+- scanner: parse_structured with the IntentAnalysis schema
+
+and the report shows the share of correctly parsed cases and the mean time
+per parse. A streaming check also feeds every case to JsonObjectScanner in
+random chunks and compares the candidates with a one-shot scan.
+
+Run: python -m intent_not_identified_flow.benchmarks.structured_output_bench --cases 5000
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from intent_not_identified_flow.models.outputs import IntentAnalysis
+from intent_not_identified_flow.services.structured_output import (
+    JsonObjectScanner,
+    iter_json_candidates,
+    parse_structured,
+)
+
+_GREEDY = re.compile(r"\{.*\}", re.DOTALL)
+
+TOPICS = ["pricing", "product information", "implementation", "integrations {Salesforce}",
+          'the "Enterprise" plan', "support\\escalation", "security", "trial [free]"]
+
+CURATED = [
+    ('```json\n{"can_prepare_general_answer": true, "identified_topics": ["pricing"], "confidence_score": 0.9}\n```',
+     {"can_prepare_general_answer": True, "identified_topics": ["pricing"], "confidence_score": 0.9}),
+    ('Thought: The user asks about {product}.\nFinal Answer: {"can_prepare_general_answer": false, '
+     '"identified_topics": [], "confidence_score": 0.3}\nNote: the {topics} list is empty.',
+     {"can_prepare_general_answer": False, "identified_topics": [], "confidence_score": 0.3}),
+    ("{'can_prepare_general_answer': True, 'identified_topics': ['demo'], 'confidence_score': 0.7}",
+     {"can_prepare_general_answer": True, "identified_topics": ["demo"], "confidence_score": 0.7}),
+    ('{"can_prepare_general_answer": true, "identified_topics": ["a", "b",], "confidence_score": 0.8,}',
+     {"can_prepare_general_answer": True, "identified_topics": ["a", "b"], "confidence_score": 0.8}),
+    ('The format is {"can_prepare_general_answer": <bool>}. My answer: {"can_prepare_general_answer": true, '
+     '"identified_topics": ["x}"], "confidence_score": 1.0}',
+     {"can_prepare_general_answer": True, "identified_topics": ["x}"], "confidence_score": 1.0}),
+    ('{"can_prepare_general_answer": true, "identified_topics": ["pricing"], "confidence_', None),
+    ("I cannot determine the intent of this email.", None),
+]
+
+
+def _render(answer: dict, rng: random.Random) -> str:
+    style = rng.random()
+    if style < 0.15:
+        return repr(answer)  # Python dict literal: single quotes, True/False
+    text = json.dumps(answer, indent=rng.choice([None, 2, 4]))
+    if style < 0.3:
+        text = re.sub(r"(\]|\d|true|false)(\s*)\}$", r"\1,\2}", text)  # trailing comma
+    return text
+
+
+def fuzz_corpus(count: int, seed: int = 0):
+    """List of (messy output, expected dict or None)"""
+    rng = random.Random(seed)
+    cases = list(CURATED)
+    while len(cases) < count:
+        answer = {
+            "can_prepare_general_answer": rng.random() < 0.6,
+            "identified_topics": rng.sample(TOPICS, rng.randint(0, 3)),
+            "confidence_score": round(rng.random(), 2),
+        }
+        body = _render(answer, rng)
+        expected = answer
+        if rng.random() < 0.1:
+            body = body[:rng.randint(1, len(body) - 1)]  # truncated answer
+            expected = None
+        if rng.random() < 0.4:
+            body = f"```json\n{body}\n```"
+        parts = []
+        if rng.random() < 0.5:
+            parts.append("Thought: " + " ".join(rng.choice(["the user", "asks", "about", "{placeholder}",
+                                                              "pricing", "maybe", "a {", "demo"])
+                                                   for _ in range(rng.randint(5, 400))))
+        if rng.random() < 0.3:
+            parts.append('For example {"confidence_score": 0.5} would mean unsure.')
+        parts.append(("Final Answer: " if rng.random() < 0.5 else "") + body)
+        if rng.random() < 0.4:
+            parts.append("Note: topics are given as {topic} names, see {docs}.")
+        cases.append(("\n".join(parts), expected))
+    return cases
+
+
+def legacy_parse(text: str):
+    match = _GREEDY.search(text)
+    if not match:
+        return None
+    try:
+        value = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) and "can_prepare_general_answer" in value else None
+
+
+def scanner_parse(text: str):
+    parsed, _ = parse_structured(text, IntentAnalysis)
+    return parsed.model_dump() if parsed is not None else None
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    return {
+        "can_prepare_general_answer": value.get("can_prepare_general_answer"),
+        "identified_topics": value.get("identified_topics", []),
+        "confidence_score": value.get("confidence_score", 0.0),
+    }
+
+
+def _measure(parse, cases):
+    correct = 0
+    started = time.perf_counter()
+    for text, expected in cases:
+        correct += _normalize(parse(text)) == _normalize(expected)
+    elapsed = time.perf_counter() - started
+    return correct / len(cases), elapsed / len(cases)
+
+
+def streaming_mismatches(cases, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    mismatches = 0
+    for text, _ in cases:
+        scanner = JsonObjectScanner()
+        streamed, position = [], 0
+        while position < len(text):
+            step = rng.randint(1, 64)
+            streamed += scanner.feed(text[position:position + step])
+            position += step
+        whole = JsonObjectScanner().feed(text)
+        mismatches += streamed != whole
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured-output parsing benchmark")
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dump", help="Write the fuzz corpus as JSONL to this file")
+    args = parser.parse_args()
+
+    cases = fuzz_corpus(args.cases, args.seed)
+    if args.dump:
+        with open(args.dump, "w", encoding="utf-8") as f:
+            for text, expected in cases:
+                f.write(json.dumps({"output": text, "expected": expected}) + "\n")
+
+    avg_chars = sum(len(text) for text, _ in cases) / len(cases)
+    print(f"{len(cases)} cases, {avg_chars:.0f} characters on average")
+    print(f"{'parser':<10} {'correct':>8} {'us/parse':>10}")
+    for name, parse in (("legacy", legacy_parse), ("scanner", scanner_parse)):
+        accuracy, seconds = _measure(parse, cases)
+        print(f"{name:<10} {accuracy:>8.1%} {seconds * 1e6:>10.1f}")
+    print(f"Candidates found: {sum(len(list(iter_json_candidates(text))) for text, _ in cases)}, "
+          f"streaming/one-shot mismatches: {streaming_mismatches(cases, args.seed)}")
+
+
+if __name__ == "__main__":
+    main()
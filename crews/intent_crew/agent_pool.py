@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.services.instrumentation import record_wait
+
+
+class AgentPoolStats(BaseModel):
+    """Construction counters for an AgentPool"""
+    built: int = 0
+    reused: int = 0
+    build_seconds: float = 0.0
+
+    @property
+    def avg_build_seconds(self) -> float:
+        return self.build_seconds / self.built if self.built else 0.0
+
+    @property
+    def saved_seconds(self) -> float:
+        """Construction time avoided by handing out an idle agent instead of building one"""
+        return self.reused * self.avg_build_seconds
+
+
+class AgentPool:
+    """
+    Pool of reusable agents keyed by agent name
+
+    An agent is checked out exclusively for the duration of one task execution,
+    because crewAI keeps per-execution state (executor, crew reference) on the
+    agent itself. Idle agents are reused, so in steady state each agent is built
+    once per concurrent slot instead of once per task call.
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[], Any]]):
+        """
+        Args:
+            factories: Mapping of agent name to a callable building a new agent
+        """
+        self._factories = factories
+        self._idle: Dict[str, List[Any]] = {name: [] for name in factories}
+        self._lock = threading.Lock()
+        self._stats = AgentPoolStats()
+
+    @asynccontextmanager
+    async def acquire(self, name: str) -> AsyncIterator[Any]:
+        """Check out an agent for exclusive use, building one if none is idle"""
+        agent = self._take_idle(name)
+        if agent is None:
+            # Agent construction is synchronous and not free, keep it off the event loop
+            started = time.perf_counter()
+            agent = await asyncio.to_thread(self._build, name)
+            record_wait(f"agent build {name}", time.perf_counter() - started)
+        try:
+            yield agent
+        finally:
+            with self._lock:
+                self._idle[name].append(agent)
+
+    def warm(self, names: Iterable[str] = None) -> None:
+        """Pre-build one idle agent per name so the first calls pay nothing"""
+        for name in names or self._factories:
+            agent = self._build(name)
+            with self._lock:
+                self._idle[name].append(agent)
+
+    def stats(self) -> AgentPoolStats:
+        with self._lock:
+            return self._stats.model_copy()
+
+    def _take_idle(self, name: str):
+        if name not in self._factories:
+            raise KeyError(f"Unknown agent: {name}")
+        with self._lock:
+            if self._idle[name]:
+                self._stats.reused += 1
+                return self._idle[name].pop()
+        return None
+
+    def _build(self, name: str):
+        started = time.perf_counter()
+        agent = self._factories[name]()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats.built += 1
+            self._stats.build_seconds += elapsed
+        return agent
@@ -0,0 +1,238 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.models.state import EmailBlock, StageOutput
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, fall back to a character heuristic
+    _ENCODING = None
+
+# Per-task prompt input budgets in tokens
+DEFAULT_BUDGETS = {
+    "analyze_intent": 1500,
+    "retrieve_information": 2000,
+    "create_general_answer": 4000,
+    "create_email_summary": 2500,
+    "prepare_final_material": 5000,
+}
+
+# Lower number = more important; the least important fields are trimmed first
+DEFAULT_PRIORITIES = {
+    "email_subject": 0,
+    "email_sender": 0,
+    "email_body": 1,
+    "email_content": 1,
+    "analysis_results": 2,
+    "email_summary": 2,
+    "created_response": 3,
+    "retrieved_info": 4,
+}
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise roughly 4 characters per token"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def template_fields(*templates: str) -> List[str]:
+    """Placeholder names used in the templates, in order of first appearance"""
+    seen = {}
+    for template in templates:
+        for name in _PLACEHOLDER.findall(template or ""):
+            seen.setdefault(name, None)
+    return list(seen)
+
+
+class ContextReport(BaseModel):
+    """Token accounting of one built context"""
+    task_name: str
+    budget: int
+    tokens_before: Optional[int] = None
+    tokens_after: int
+    field_tokens: Dict[str, int]
+    trimmed_fields: List[str] = []
+    deduplicated_fields: List[str] = []
+
+
+class ContextBuilder:
+    """
+    Builds the interpolation inputs of a task within a token budget
+
+    Only fields referenced by the task template are rendered. Values are
+    rendered compactly (email as a plain Subject/From/Body block, dicts as
+    single-line JSON without the duplicated "raw" text of parsed outputs),
+    fields whose text already appears in another field are replaced by a
+    reference, and if the total still exceeds the task budget the
+    lowest-priority fields are trimmed, keeping their beginning and end.
+
+    An EmailBlock or StageOutput in the context is already rendered and knows
+    its token count, so the fields of a flow are not rendered and counted again
+    for every task.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        priorities: Optional[Dict[str, int]] = None,
+        min_field_tokens: int = 64,
+        measure_savings: bool = False,
+    ):
+        """
+        Args:
+            measure_savings: Also render every field the way it was sent before the builder
+                (pretty-printed JSON) and report its token count as tokens_before
+        """
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.priorities = {**DEFAULT_PRIORITIES, **(priorities or {})}
+        self.min_field_tokens = min_field_tokens
+        self.measure_savings = measure_savings
+
+    def build(self, task_name: str, templates: Tuple[str, ...], context: Dict[str, Any]) -> Tuple[Dict[str, str], ContextReport]:
+        """
+        Args:
+            task_name: Task the inputs are for (selects the budget)
+            templates: Task description/expected output containing {placeholders}
+            context: Raw context values (email dict, crew outputs, dicts, strings)
+
+        Returns:
+            Tuple of (inputs for interpolation, token report)
+        """
+        fields = template_fields(*templates)
+        inputs = {name: self._render(name, context) for name in fields}
+        rendered = dict(inputs)
+        tokens_before = (sum(count_tokens(self._render_legacy(name, context)) for name in fields)
+                         if self.measure_savings else None)
+
+        deduplicated = self._deduplicate(inputs)
+        field_tokens = {name: self._tokens(name, value, context) if value is rendered[name] else count_tokens(value)
+                        for name, value in inputs.items()}
+        budget = self.budgets.get(task_name, max(DEFAULT_BUDGETS.values()))
+        trimmed = self._enforce_budget(inputs, field_tokens, budget)
+
+        report = ContextReport(
+            task_name=task_name,
+            budget=budget,
+            tokens_before=tokens_before,
+            tokens_after=sum(field_tokens.values()),
+            field_tokens=field_tokens,
+            trimmed_fields=trimmed,
+            deduplicated_fields=deduplicated,
+        )
+        logger.debug(
+            "Context for %s: %s -> %s tokens (budget %s, trimmed %s, deduplicated %s)", task_name,
+            report.tokens_before if report.tokens_before is not None else "?", report.tokens_after, budget,
+            trimmed or "-", deduplicated or "-",
+        )
+        return inputs, report
+
+    @staticmethod
+    def _tokens(name: str, text: str, context: Dict[str, Any]) -> int:
+        """Token count of a rendered field, cached on the context value when it is pre-rendered"""
+        value = context.get(name)
+        if isinstance(value, (EmailBlock, StageOutput)) and value.text is text:
+            return value.tokens
+        return count_tokens(text)
+
+    def _render(self, name: str, context: Dict[str, Any]) -> str:
+        email = context.get("email_content")
+        if name in ("email_subject", "email_body", "email_sender"):
+            return (str(email.get(name[len("email_"):], "N/A")) if isinstance(email, (dict, EmailBlock))
+                    else "N/A")
+        value = context.get(name)
+        if isinstance(value, (EmailBlock, StageOutput)):
+            return value.text
+        if name == "email_content" and isinstance(value, dict):
+            return f"Subject: {value.get('subject', '')}\nFrom: {value.get('sender', '')}\n\n{value.get('body', '').strip()}"
+        return self._render_value(value)
+
+    def _render_value(self, value: Any) -> str:
+        if value is None:
+            return ""
+        if hasattr(value, "raw") and not isinstance(value, dict):
+            return value.raw
+        if isinstance(value, dict):
+            # Parsed outputs keep the raw LLM text next to the parsed fields; send only one
+            if "raw" in value and len(value) > 1:
+                value = {k: v for k, v in value.items() if k != "raw"}
+            elif set(value) == {"raw"}:
+                return str(value["raw"])
+            return json.dumps(value, ensure_ascii=False, default=str)
+        if isinstance(value, list):
+            return json.dumps(value, ensure_ascii=False, default=str)
+        return str(value)
+
+    @staticmethod
+    def _render_legacy(name: str, context: Dict[str, Any]) -> str:
+        """The rendering used before the builder, for before/after accounting"""
+        email = context.get("email_content")
+        if name in ("email_subject", "email_body", "email_sender"):
+            return str(email.get(name[len("email_"):], "N/A")) if isinstance(email, (dict, EmailBlock)) else ""
+        value = context.get(name)
+        if value is None:
+            return ""
+        if isinstance(value, EmailBlock):
+            value = value.model_dump(include={"subject", "body", "sender"})
+        elif isinstance(value, StageOutput):
+            value = {"raw": value.raw, **(value.fields or {})} if value.error is None else {"error": value.error}
+        if hasattr(value, "raw") and not isinstance(value, dict):
+            return value.raw
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, indent=2, default=str)
+        return str(value)
+
+    def _deduplicate(self, inputs: Dict[str, str]) -> List[str]:
+        """Replace a field whose whole text is contained in an at least as important field by a reference"""
+        deduplicated = []
+        names = sorted(inputs, key=lambda n: len(inputs[n]))
+        for i, name in enumerate(names):
+            text = inputs[name].strip()
+            if len(text) < 200:
+                continue
+            for other in names[i + 1:]:
+                if (other not in deduplicated and self.priorities.get(other, 2) <= self.priorities.get(name, 2)
+                        and text in inputs[other]):
+                    inputs[name] = f"(included in {other.replace('_', ' ')})"
+                    deduplicated.append(name)
+                    break
+        return deduplicated
+
+    def _enforce_budget(self, inputs: Dict[str, str], field_tokens: Dict[str, int], budget: int) -> List[str]:
+        trimmed = []
+        overflow = sum(field_tokens.values()) - budget
+        candidates = sorted(inputs, key=lambda n: self.priorities.get(n, 2), reverse=True)
+        for name in candidates:
+            if overflow <= 0:
+                break
+            tokens = field_tokens[name]
+            if tokens <= self.min_field_tokens:
+                continue
+            target = max(self.min_field_tokens, tokens - overflow)
+            inputs[name] = self._trim(inputs[name], tokens, target)
+            field_tokens[name] = count_tokens(inputs[name])
+            overflow -= tokens - field_tokens[name]
+            trimmed.append(name)
+        return trimmed
+
+    @staticmethod
+    def _trim(text: str, tokens: int, target: int) -> str:
+        """Keep the head (2/3) and tail (1/3) of the text within roughly target tokens"""
+        keep = int(len(text) * target / tokens) - 40
+        if keep <= 0:
+            return text[:max(int(len(text) * target / tokens), 0)]
+        head = text[:keep * 2 // 3].rsplit(" ", 1)[0]
+        tail = text[len(text) - keep // 3:].split(" ", 1)[-1]
+        return f"{head} [... {tokens - target} tokens trimmed ...] {tail}"
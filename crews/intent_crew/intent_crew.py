@@ -1,204 +1,225 @@
 import asyncio
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from intent_not_identified_flow.tools import Mock_knowledgebase_api
-import json
 from crewai.crews.crew_output import CrewOutput
+from crewai.llms.base_llm import BaseLLM, call_stream_override
+from crewai.llms.cache import mark_cache_breakpoint
+from intent_not_identified_flow.crews.intent_crew.agent_pool import AgentPool
+from intent_not_identified_flow.crews.intent_crew.context_builder import ContextBuilder, template_fields
+from intent_not_identified_flow.crews.intent_crew.model_routing import RoutingPolicy, get_routing_policy
+from intent_not_identified_flow.crews.intent_crew.prompts import BATCH_PROMPTS, TASK_PROMPTS
+from intent_not_identified_flow.models.outputs import IntentAnalysis
+from intent_not_identified_flow.models.state import EmailBlock
+from intent_not_identified_flow.services.instrumentation import (
+    Instrumentation, current_stage, get_instrumentation,
+)
+from intent_not_identified_flow.services.llm_backend import llm_from_env
+from intent_not_identified_flow.services.micro_batching import BatchPolicy, MicroBatcher, get_batch_policy
+from intent_not_identified_flow.services.result_cache import ResultCache
+from intent_not_identified_flow.services.semantic_cache import SemanticCache
+from intent_not_identified_flow.services.streaming import task_stream
+from intent_not_identified_flow.services.structured_logging import get_log_config, lazy, truncated
+from intent_not_identified_flow.services.structured_output import (
+    parse_structured, parse_structured_array, repair_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+# Agent configuration - presná replika z YAML
+AGENT_CONFIGS = {
+    "analyzer": dict(
+        role="Intent Analyzer",
+        goal="Analyze unclear intents in emails and determine if general information can address the query",
+        backstory="You are an expert at analyzing ambiguous requests and determining whether they can be answered with general information or require specific details. You excel at identifying key topics even when the request is vague or unclear.",
+        llm="anthropic/claude-3-7-sonnet-20250219"
+    ),
+    "knowledge_retriever": dict(
+        role="Knowledge Retriever",
+        goal="Find relevant information from APIs and knowledge bases",
+        backstory="You are specialized in querying APIs, databases, and knowledge bases to retrieve the most relevant information for unclear requests. You know how to formulate effective search queries based on limited information and can prioritize search results by relevance.",
+        llm="anthropic/claude-3-7-sonnet-20250219",
+        tools=[Mock_knowledgebase_api]
+    ),
+    "content_creator": dict(
+        role="Content Creator",
+        goal="Create comprehensive, accurate responses based on available information",
+        backstory="You excel at crafting helpful responses from either general knowledge or specific information retrieved from knowledge bases. Your writing is clear, informative, and addresses the core questions even when they are implied rather than explicitly stated.",
+        llm="anthropic/claude-3-7-sonnet-20250219"
+    ),
+    "summary_specialist": dict(
+        role="Summary Specialist",
+        goal="Create concise, accurate summaries of emails and responses",
+        backstory="You are skilled at extracting the key points from communication and summarizing them effectively. You can identify the main questions or concerns in an email, even when they're buried in other content. Your summaries are clear, complete, and capture all essential information.",
+        llm="anthropic/claude-3-7-sonnet-20250219"
+    ),
+}
+
+# Which agent executes which task
+TASK_AGENTS = {
+    "analyze_intent": "analyzer",
+    "retrieve_information": "knowledge_retriever",
+    "create_general_answer": "content_creator",
+    "create_email_summary": "summary_specialist",
+    "prepare_final_material": "content_creator",
+}
+
+# Template inputs marked "(if available)" - a task can run before they are known
+OPTIONAL_INPUTS = {
+    "create_email_summary": {"created_response"},
+    "prepare_final_material": {"created_response", "retrieved_info"},
+}
+
+# Tasks whose calls can be micro-batched across emails, with the schema every answer must match
+BATCHABLE_TASKS = {
+    "analyze_intent": IntentAnalysis,
+}
+
+
+class BatchAnswer(NamedTuple):
+    """One email's share of a batch call: its output, or the cascade tier its own call starts at"""
+    output: Optional[CrewOutput]
+    next_tier: int = 0
+
+
+_shared_crew = None
+_shared_crew_lock = threading.Lock()
+
+
+def get_shared_intent_crew() -> "IntentCrew":
+    """Process-wide IntentCrew, so task templates and pooled agents are built once"""
+    global _shared_crew
+    if _shared_crew is None:
+        with _shared_crew_lock:
+            if _shared_crew is None:
+                threshold = os.environ.get("INTENT_SEMANTIC_CACHE_THRESHOLD")
+                _shared_crew = IntentCrew(
+                    result_cache=ResultCache(disk_path=os.environ.get("INTENT_RESULT_CACHE_PATH")),
+                    semantic_cache=SemanticCache(threshold=float(threshold)) if threshold else None,
+                    routing=get_routing_policy(),
+                    batching=get_batch_policy(),
+                )
+    return _shared_crew
+
 
 @CrewBase
 class IntentCrew:
     """Crew for handling emails with unidentified intent"""
     
-    def __init__(self):
-        """Simple initialization without yaml dependencies"""
+    def __init__(self, result_cache: ResultCache = None, semantic_cache: SemanticCache = None,
+                 context_builder: ContextBuilder = None, instrumentation: Instrumentation = None,
+                 llm_factory: Callable[[str], Any] = None, routing: RoutingPolicy = None,
+                 batching: BatchPolicy = None, verbose: bool = None):
+        """Simple initialization without yaml dependencies
+
+        Args:
+            result_cache: Optional cache of task outputs; a hit skips the LLM call entirely
+            semantic_cache: Optional near-duplicate cache consulted for analyze_intent
+            context_builder: Builds task inputs within per-task token budgets
+            instrumentation: Receives one stage record per task execution (process-wide by default)
+            llm_factory: Turns the configured model name into the agent's llm; by default live,
+                record or replay according to INTENT_LLM_MODE
+            routing: Optional per-task model cascade; without it every task runs on its
+                agent's llm from config/agents.yaml
+            batching: Optional micro-batching of the BATCHABLE_TASKS: concurrent calls within
+                the window are answered by one LLM call, see services/micro_batching.py
+            verbose: crewAI's own console output for every task (env INTENT_CREW_VERBOSE, off
+                by default) - synchronous stdout writes from every flow in flight
+        """
         self._initialized = False
-        self._async_lock = asyncio.Lock()
+        self._result_cache = result_cache
+        self._semantic_cache = semantic_cache
+        self._context_builder = context_builder or ContextBuilder()
+        self._instrumentation = instrumentation or get_instrumentation()
+        self._llm_factory = llm_factory or llm_from_env
+        self._routing = routing
+        self.verbose = get_log_config().crew_verbose if verbose is None else verbose
+        factories = {name: (lambda name=name: self._build_agent(name)) for name in AGENT_CONFIGS}
+        for task_name, route in (routing.routes.items() if routing is not None else ()):
+            if task_name not in TASK_AGENTS:
+                raise ValueError(f"Model routing for unknown task: {task_name}")
+            for model in route.models:
+                # Agents of a routed model are pooled separately from the agent's default model
+                factories[self._agent_key(TASK_AGENTS[task_name], model)] = (
+                    lambda name=TASK_AGENTS[task_name], model=model: self._build_agent(name, model)
+                )
+        self._agent_pool = AgentPool(factories)
+        self._batchers: Dict[str, MicroBatcher] = {
+            task_name: MicroBatcher(functools.partial(self._run_batch, task_name), window=batching.window,
+                                    max_size=batching.max_size, name=task_name)
+            for task_name in (BATCHABLE_TASKS if batching is not None else ())
+        }
         self._setup_tasks()
 
     
     # Define agents with direct parameters - presná replika z YAML
     @agent
     def analyzer(self) -> Agent:
-        return Agent(
-            role="Intent Analyzer",
-            goal="Analyze unclear intents in emails and determine if general information can address the query",
-            backstory="You are an expert at analyzing ambiguous requests and determining whether they can be answered with general information or require specific details. You excel at identifying key topics even when the request is vague or unclear.",
-            llm="anthropic/claude-3-7-sonnet-20250219"
-        )
+        return self._build_agent("analyzer")
         
     @agent
     def knowledge_retriever(self) -> Agent:
-        return Agent(
-            role="Knowledge Retriever",
-            goal="Find relevant information from APIs and knowledge bases",
-            backstory="You are specialized in querying APIs, databases, and knowledge bases to retrieve the most relevant information for unclear requests. You know how to formulate effective search queries based on limited information and can prioritize search results by relevance.",
-            llm="anthropic/claude-3-7-sonnet-20250219",
-            tools=[Mock_knowledgebase_api]
-        )
+        return self._build_agent("knowledge_retriever")
         
     @agent
     def content_creator(self) -> Agent:
-        return Agent(
-            role="Content Creator",
-            goal="Create comprehensive, accurate responses based on available information",
-            backstory="You excel at crafting helpful responses from either general knowledge or specific information retrieved from knowledge bases. Your writing is clear, informative, and addresses the core questions even when they are implied rather than explicitly stated.",
-            llm="anthropic/claude-3-7-sonnet-20250219"
-        )
+        return self._build_agent("content_creator")
         
     @agent
     def summary_specialist(self) -> Agent:
-        return Agent(
-            role="Summary Specialist",
-            goal="Create concise, accurate summaries of emails and responses",
-            backstory="You are skilled at extracting the key points from communication and summarizing them effectively. You can identify the main questions or concerns in an email, even when they're buried in other content. Your summaries are clear, complete, and capture all essential information.",
-            llm="anthropic/claude-3-7-sonnet-20250219"
-        )
+        return self._build_agent("summary_specialist")
+
+    def _build_agent(self, name, model: Optional[str] = None) -> Agent:
+        """Build a new, unshared agent instance from its configuration, optionally on another model"""
+        config = dict(AGENT_CONFIGS[name])
+        config["llm"] = self._llm_factory(model or self._agent_model(name))
+        return Agent(**config)
+
+    def _agent_model(self, name) -> str:
+        """The agent's llm from config/agents.yaml (loaded by CrewBase), else the built-in one"""
+        configured = getattr(self, "agents_config", None) or {}
+        llm = configured.get(name, {}).get("llm")
+        return llm if isinstance(llm, str) else AGENT_CONFIGS[name]["llm"]
+
+    @staticmethod
+    def _agent_key(name, model) -> str:
+        return f"{name}@{model}"
         
-    # Define tasks with direct parameters - presná replika z YAML
+    # Tasks from crews/intent_crew/prompts.py - static instructions first, per-email inputs last
     @task
     def analyze_intent(self) -> Task:
-        return Task(
-            description="""
-Analyze the incoming email where the intent is not clearly identified.
-Determine if we can prepare answers based on general information.
-
-Your task is to:
-1. Identify the main topics or questions in the email, even if they're vague
-2. Assess whether general information about our products/services would adequately address the email
-3. Provide a confidence score for your assessment (0.0 to 1.0)
-
-Input:
-Subject: {email_subject}
-Body: {email_body}
-Sender: {email_sender}
-            """,
-            expected_output="""
-A JSON object with three fields:
-- can_prepare_general_answer (boolean): Whether a general answer can be prepared
-- identified_topics (array of strings): List of topics identified in the email
-- confidence_score (float between 0.0 and 1.0): Your confidence in this assessment
-            """,
-            agent=self.analyzer()
-        )
-        
+        return self._task("analyze_intent")
+
     @task
     def retrieve_information(self) -> Task:
-        return Task(
-            description="""
-Based on the analysis results, query our API and knowledge base to retrieve
-relevant information that can help address the request.
-
-Use the identified topics to guide your search and ensure you retrieve
-comprehensive information that would help address the vague request.
-
-Analysis results:
-{analysis_results}
-
-Original email:
-Subject: {email_subject}
-Body: {email_body}
-Sender: {email_sender}
-            """,
-            expected_output="""
-A comprehensive list of relevant information items retrieved from the knowledge base,
-organized by topic and relevance to the query.
-            """,
-            agent=self.knowledge_retriever()
-        )
-        
+        return self._task("retrieve_information")
+
     @task
     def create_general_answer(self) -> Task:
-        return Task(
-            description="""
-Create a comprehensive answer based on the general information retrieved.
-Ensure the answer addresses all identified topics and is helpful even without
-specific details from the customer.
-
-Your response should:
-1. Be friendly and professional
-2. Address the topics identified in the analysis
-3. Provide useful general information
-4. Invite further questions if needed
-
-Retrieved information:
-{retrieved_info}
-
-Analysis results:
-{analysis_results}
-
-Original email:
-{email_content}
-            """,
-            expected_output="""
-A JSON object with three fields:
-- summary (string): A brief summary of your response
-- detailed_response (string): The complete response to the customer
-- references (array of strings): Any references to specific information sources used
-            """,
-            agent=self.content_creator()
-        )
-        
+        return self._task("create_general_answer")
+
     @task
     def create_email_summary(self) -> Task:
-        return Task(
-            description="""
-Create a concise summary of the email content, capturing the essential
-points and query, especially since the intent is unclear.
-
-Your summary should:
-1. Identify the main request or question
-2. Note any specific details provided
-3. Highlight any constraints or preferences mentioned
-4. Be brief but complete (3-5 bullet points)
-
-Original email:
-{email_content}
-
-Created response (if available):
-{created_response}
-            """,
-            expected_output="""
-A concise but comprehensive summary of the email content in 3-5 bullet points,
-highlighting the main request, specific details, and any constraints mentioned.
-            """,
-            agent=self.summary_specialist()
-        )
-        
+        return self._task("create_email_summary")
+
     @task
     def prepare_final_material(self) -> Task:
-        return Task(
-            description="""
-Prepare a complete package of materials for the handling agent that includes:
-1. The original email summary
-2. The created response (if available)
-3. Reference materials and sources used
-4. Suggestions for follow-up questions or clarifications
-5. Any additional context that would help the agent understand the situation
-
-This package will be handed off to a human agent who will process the request further.
-
-Email summary:
-{email_summary}
-
-Created response (if available):
-{created_response}
-
-Retrieved information:
-{retrieved_info}
-
-Original email:
-{email_content}
-            """,
-            expected_output="""
-A comprehensive package containing the email summary, response (if available),
-reference materials, suggested follow-up questions, and additional context
-to help the human agent process the request effectively.
-            """,
-            agent=self.content_creator()
-        )
+        return self._task("prepare_final_material")
+
+    @staticmethod
+    def _task(task_name) -> Task:
+        prompt = TASK_PROMPTS[task_name]
+        return Task(description=prompt.description, expected_output=prompt.expected_output)
     
     def _setup_tasks(self):
-        """Just setup tasks without agents for now"""
+        """Just setup task templates, agents are bound per call from the agent pool"""
         tasks = {}
         for task_name in ["analyze_intent", "retrieve_information", "create_general_answer", 
                          "create_email_summary", "prepare_final_material"]:
@@ -207,73 +228,283 @@ to help the human agent process the request effectively.
         
         # Store tasks without initializing agents yet
         self._tasks = tasks
+        # Batch calls are attributed to a task of their own (replay, prefix cache and scheduler statistics)
+        self._batch_tasks = {
+            task_name: Task(name=f"{task_name}_batch", description=prompt.instructions.strip(),
+                            expected_output=prompt.expected_output)
+            for task_name, prompt in BATCH_PROMPTS.items()
+        }
     
+    def task_templates(self, task_name) -> Tuple[str, str]:
+        """Description and expected output of a task, with their {placeholders}"""
+        template = self._tasks[task_name]
+        return template.description, template.expected_output
+
+    def task_inputs(self, task_name) -> Set[str]:
+        """Context keys a task template reads (email_subject/body/sender come from email_content)"""
+        return {
+            "email_content" if name.startswith("email_") and name != "email_summary" else name
+            for name in template_fields(*self.task_templates(task_name))
+        }
+
+    def required_inputs(self, task_name) -> Set[str]:
+        """Context keys a task cannot start without"""
+        return self.task_inputs(task_name) - OPTIONAL_INPUTS.get(task_name, set())
+
     async def execute_task_async(self, task_name, context):
-        """Asynchronous execution of a task with a lazy-loaded agent"""
-        task = self._tasks[task_name]
-        print(f"[execute_task_async] Task: {task_name}")
-        print(f"[execute_task_async] Original context keys: {list(context.keys())}")
-
-        # Pripravíme slovník inputs pre interpoláciu v CrewAI
-        inputs = {}
-
-        for key, value in context.items():
-            if key == 'email_content' and isinstance(value, dict):
-                inputs['email_subject'] = value.get('subject', 'N/A')
-                inputs['email_body'] = value.get('body', 'N/A')
-                inputs['email_sender'] = value.get('sender', 'N/A')
-                inputs['email_content'] = json.dumps(value, indent=2)
-            elif isinstance(value, CrewOutput):
-                inputs[key] = value.raw
-            elif isinstance(value, dict):
-                inputs[key] = json.dumps(value, indent=2)
-            elif isinstance(value, list):
-                inputs[key] = json.dumps(value, indent=2)
-            else:
-                inputs[key] = str(value) if value is not None else ""
-
-        print(f"[execute_task_async] Prepared inputs keys for kickoff: {list(inputs.keys())}")
-        if 'analysis_results' in inputs:
-            print(f"[execute_task_async] analysis_results input sample: {str(inputs['analysis_results'])[:150]}...")
-        if 'retrieved_info' in inputs:
-            print(f"[execute_task_async] retrieved_info input sample: {str(inputs['retrieved_info'])[:150]}...")
-        if 'email_content' in inputs:
-             print(f"[execute_task_async] email_content input sample: {str(inputs['email_content'])[:150]}...")
-        if 'email_subject' in inputs:
-             print(f"[execute_task_async] email_subject input: {inputs['email_subject']}")
-
-
-        if task_name == "analyze_intent":
-            task.agent = self.analyzer()
-        elif task_name == "retrieve_information":
-            task.agent = self.knowledge_retriever()
-        elif task_name in ["create_general_answer", "prepare_final_material"]:
-            task.agent = self.content_creator()
-        elif task_name == "create_email_summary":
-            task.agent = self.summary_specialist()
+        """
+        Asynchronous execution of a task with an agent checked out from the pool
+
+        Inside streaming_to() the LLM output is also streamed chunk by chunk,
+        followed by a "final" event with the raw output returned here.
+        """
+        async with self._instrumentation.stage(task_name, kind="task") as metrics:
+            with task_stream(task_name) as stream:
+                result = await self._execute_task(task_name, context, metrics, stream)
+                if stream is not None:
+                    stream.close("final", result.raw)
+                return result
+
+    async def _execute_task(self, task_name, context, metrics, stream=None):
+        logger.debug("Task %s, context keys: %s", task_name, lazy(lambda: list(context)))
+
+        # Pripravíme slovník inputs pre interpoláciu v CrewAI - iba polia, ktoré šablóna
+        # používa, kompaktne a v rámci tokenového rozpočtu úlohy
+        inputs, _ = self._context_builder.build(task_name, self.task_templates(task_name), context)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for key in ('analysis_results', 'retrieved_info', 'email_content', 'email_subject'):
+                if key in inputs:
+                    logger.debug("Task %s input %s: %s", task_name, key, truncated(inputs[key]))
+
+        if self._result_cache is not None:
+            cached = await self._result_cache.get_async(task_name, inputs)
+            if cached is not None:
+                logger.debug("Result cache hit for %s", task_name)
+                metrics.cache_hit("result")
+                return CrewOutput(raw=cached)
+
+        email = context.get('email_content')
+        use_semantic = (self._semantic_cache is not None and task_name == "analyze_intent"
+                        and isinstance(email, (dict, EmailBlock)))
+        if use_semantic:
+            match = self._semantic_cache.lookup(email.get('subject', ''), email.get('body', ''))
+            if match is not None:
+                logger.debug("Semantic cache hit for %s (similarity %.3f)", task_name, match[1])
+                metrics.cache_hit("semantic")
+                return CrewOutput(raw=match[0])
+
+        result, first_tier = None, 0
+        batcher = self._batchers.get(task_name)
+        if batcher is not None and stream is None:
+            # The batch window counts as queue time
+            metrics.mark_submitted()
+            answer = await batcher.submit(inputs)
+            if answer is not None:
+                result, first_tier = answer
+        if result is None:
+            result = await self._kickoff_task(task_name, inputs, stream, first_tier)
+
+        if getattr(result, 'raw', None):
+            if self._result_cache is not None:
+                await self._result_cache.set_async(task_name, inputs, result.raw)
+            if use_semantic:
+                self._semantic_cache.add(email.get('subject', ''), email.get('body', ''), result.raw)
+        return result
+
+    async def execute_structured_task_async(self, task_name, context, schema):
+        """
+        Execute a task whose answer must be a JSON object matching schema
+
+        An answer without a valid object gets one repair re-prompt: a direct
+        call to the task's model with the bad output and the expected fields,
+        without the agent loop or the original context.
+
+        Returns:
+            Tuple of (task output, parsed schema instance or None when the repair failed too)
+        """
+        output = await self.execute_task_async(task_name, context)
+        parsed, error = parse_structured(output.raw, schema)
+        if parsed is None:
+            logger.info("%s output unusable (%s), asking for a repair", task_name, error)
+            parsed = await self._repair_output(task_name, output.raw, schema, error)
+        return output, parsed
+
+    async def _repair_output(self, task_name, raw, schema, error):
+        async with self._instrumentation.stage(f"{task_name}.repair", kind="task") as metrics:
+            metrics.retry()
+            messages = [{"role": "user", "content": repair_prompt(schema, raw, error)}]
+            async with self._agent_pool.acquire(TASK_AGENTS[task_name]) as agent:
+                try:
+                    repaired = await asyncio.to_thread(
+                        agent.llm.call, messages, from_task=self._tasks[task_name], from_agent=agent
+                    )
+                except Exception as e:
+                    logger.warning("Repair of %s failed: %s", task_name, e)
+                    return None
+            parsed, error = parse_structured(str(repaired), schema)
+            if parsed is None:
+                logger.warning("Repaired %s output still unusable (%s)", task_name, error)
+            return parsed
+
+    async def _run_batch(self, task_name, items: List[Dict[str, str]]) -> List[Optional[BatchAnswer]]:
+        """
+        Answer the inputs of several emails with one direct call to the task's (first) model
+
+        Every answer is validated on its own. A missing or invalid one leaves None (the
+        email's own call runs as usual); with routing, one that fails the task's quality
+        check continues the cascade on the next model.
+        """
+        agent_name = TASK_AGENTS[task_name]
+        routed = self._routing is not None and task_name in self._routing.routes
+        models = self._routing.models(task_name, self._agent_model(agent_name)) if routed else [None]
+        agent_key = self._agent_key(agent_name, models[0]) if routed else agent_name
+        messages = [{"role": "user", "content": BATCH_PROMPTS[task_name].batch_description(items)}]
 
+        async with self._instrumentation.stage(f"{task_name}.batch", kind="task") as metrics:
+            metrics.mark_submitted()
+            async with self._agent_pool.acquire(agent_key) as agent:
+                system = f"You are {agent.role}. {agent.backstory}\nYour personal goal is: {agent.goal}"
+                usage_before = agent.llm.get_token_usage_summary() if isinstance(agent.llm, BaseLLM) else None
+                started = time.perf_counter()
+                raw = await asyncio.to_thread(
+                    agent.llm.call, [mark_cache_breakpoint({"role": "system", "content": system}), *messages],
+                    from_task=self._batch_tasks[task_name], from_agent=agent,
+                )
+                seconds = time.perf_counter() - started
+                usage = (agent.llm.get_token_usage_summary().delta_since(usage_before)
+                         if usage_before is not None else None)
+        answers, error = parse_structured_array(str(raw), BATCHABLE_TASKS[task_name], len(items))
+        if error is not None:
+            raise ValueError(f"unusable batch answer ({error})")
+
+        results = []
+        for parsed in answers:
+            if parsed is None:
+                results.append(None)
+                continue
+            output = CrewOutput(raw=parsed.model_dump_json())
+            problem = self._routing.check(task_name, output.raw) if routed and len(models) > 1 else None
+            if routed:
+                # Each email is charged its share of the batch call
+                self._routing.record(task_name, models[0], seconds,
+                                     usage.prompt_tokens // len(items) if usage else 0,
+                                     usage.completion_tokens // len(items) if usage else 0,
+                                     escalated=problem is not None)
+            if problem is not None:
+                logger.info("%s from a batch on %s escalated: %s", task_name, models[0], problem)
+            results.append(BatchAnswer(output) if problem is None else BatchAnswer(None, next_tier=1))
+        return results
+
+    async def _kickoff_task(self, task_name, inputs, stream=None, first_tier=0):
+        """
+        Run a single task in its own mini crew - the only place that calls the LLM for one email
+
+        With routing, the cascade starts at first_tier (a batch answer that failed the checks
+        of the first model continues on the next one).
+        """
+        metrics = current_stage()
+        if metrics is not None:
+            # Waiting for an agent and for a free worker thread counts as queue time
+            metrics.mark_submitted()
+        agent_name = TASK_AGENTS[task_name]
+        if self._routing is None:
+            result, _ = await self._kickoff_on(agent_name, task_name, inputs, stream)
+            return result
+
+        # Cascade: cheaper models first, escalating while the output fails the task's checks
+        models = self._routing.models(task_name, self._agent_model(agent_name))
+        routed = task_name in self._routing.routes
+        for tier, model in enumerate(models[first_tier:], first_tier):
+            last = tier == len(models) - 1
+            started = time.perf_counter()
+            usage = None
+            agent_key = self._agent_key(agent_name, model) if routed else agent_name
+            try:
+                result, usage = await self._kickoff_on(agent_key, task_name, inputs, stream)
+                problem = None if last else self._routing.check(task_name, result.raw)
+            except Exception as e:
+                if last:
+                    raise
+                problem = f"failed ({e})"
+            self._routing.record(task_name, model, time.perf_counter() - started,
+                                 usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0,
+                                 escalated=problem is not None)
+            if problem is None:
+                return result
+            logger.info("%s on %s escalated: %s", task_name, model, problem)
+            if stream is not None:
+                stream.restart(f"{model}: {problem}")
+
+    async def _kickoff_on(self, agent_key, task_name, inputs, stream=None):
+        """Run the task with an agent checked out under agent_key; returns the output and its token usage"""
+        async with self._agent_pool.acquire(agent_key) as agent:
+            # Per-call copy of the template, so concurrent flows never share the
+            # interpolated description, the bound agent or the task output
+            task = self._tasks[task_name].model_copy(update={"agent": agent})
+            # The LLM's counters are cumulative and the agent is ours until the call ends
+            usage_before = agent.llm.get_token_usage_summary() if isinstance(agent.llm, BaseLLM) else None
+
+            streaming = stream is not None
+            run = asyncio.ensure_future(asyncio.to_thread(self._run_mini_crew, agent, task, inputs, streaming,
+                                                          self.verbose))
+            try:
+                try:
+                    result = await asyncio.shield(run)
+                except asyncio.CancelledError:
+                    # The worker thread cannot be interrupted; keep the agent checked
+                    # out until it finishes so no other call picks it up meanwhile
+                    await asyncio.wait([run])
+                    if not run.cancelled():
+                        run.exception()  # abandoned result, do not report its error as unhandled
+                    raise
+                logger.debug("Task %s on %s returned: %s", task_name, agent_key,
+                             truncated(getattr(result, 'raw', result), 100))
+                usage = (agent.llm.get_token_usage_summary().delta_since(usage_before)
+                         if usage_before is not None else None)
+                return result, usage
+            except Exception as e:
+                logger.error("Task %s on %s failed: %s: %s (input keys: %s)", task_name, agent_key,
+                             type(e).__name__, e, list(inputs))
+                if logger.isEnabledFor(logging.DEBUG):
+                    original_desc = getattr(task, '_original_description', None) or task.description
+                    logger.debug("Task %s description before interpolation: %s", task_name,
+                                 truncated(original_desc, 500))
+                    for key, value in inputs.items():
+                        logger.debug("Task %s input %s: %s", task_name, key, truncated(value))
+                raise
+
+    @staticmethod
+    def _run_mini_crew(agent, task, inputs, streaming=False, verbose=False):
+        """Build and run the mini crew in a worker thread - Crew construction opens a
+        file-locked SQLite store and must not block the event loop"""
         mini_crew = Crew(
-            agents=[task.agent],
+            agents=[agent],
             tasks=[task],
             process=Process.sequential,
-            verbose=True,
+            verbose=verbose,
         )
+        # Streaming is switched on for this call only, the pooled agent's LLM stays as configured
+        with (call_stream_override(agent.llm, True) if streaming and isinstance(agent.llm, BaseLLM)
+              else contextlib.nullcontext()):
+            return mini_crew.kickoff(inputs=inputs)
 
-        print("[execute_task_async] Before kickoff_async")
-        try:
-            result = await mini_crew.kickoff_async(inputs=inputs)
-            print(f"[execute_task_async] After kickoff_async, got result type: {type(result)}")
-            if hasattr(result, 'raw'):
-                print(f"[execute_task_async] Result sample: {result.raw[:100]}...")
-            return result
-        except Exception as e:
-            print(f"[execute_task_async] EXCEPTION during kickoff_async: {str(e)}")
-            print(f"[execute_task_async] EXCEPTION TYPE: {type(e)}")
-            original_desc = task._original_description if hasattr(task, '_original_description') else task.description
-            print(f"[execute_task_async] TASK description (before interpolation): {original_desc}")
-            print(f"[execute_task_async] Inputs passed to kickoff: {inputs}")
-            raise
-    
-    
-        
-    
\ No newline at end of file
+    def result_cache_stats(self):
+        """Hit/miss counters of the result cache, or None when caching is disabled"""
+        return self._result_cache.stats() if self._result_cache is not None else None
+
+    def semantic_cache_stats(self):
+        """Lookup counters of the semantic cache, or None when it is disabled"""
+        return self._semantic_cache.stats() if self._semantic_cache is not None else None
+
+    def agent_pool_stats(self):
+        """Agent construction counters, including the build time saved by reuse"""
+        return self._agent_pool.stats()
+
+    def batching_stats(self):
+        """Counters of the micro-batchers by task, empty when batching is off"""
+        return {task_name: batcher.stats() for task_name, batcher in self._batchers.items()}
+
+    def routing_policy(self):
+        """The model routing policy with its per-task, per-model attempt statistics, or None"""
+        return self._routing
@@ -0,0 +1,194 @@
+"""
+Per-task model routing with a quality-gated cascade
+
+config/model_routing.yaml lists the models a task may run on, cheapest
+first. A task runs on the first model; when its output fails the task's
+quality checks it is run again on the next one, and the output of the last
+model is always accepted. The checks are cheap and local:
+
+- every task: the output is not empty
+- analyze_intent: a valid IntentAnalysis with confidence_score of at least
+  min_confidence
+- create_general_answer: a valid GeneralAnswer
+- create_email_summary: between min_bullets and max_bullets bullet points
+
+Every attempt is recorded per task and model (latency, tokens, cost from the
+pricing table, escalations), so the report shows where the cheaper tier pays
+off and where it only adds an extra call. Enabled through the environment by
+get_routing_policy: INTENT_MODEL_ROUTING (a routing file, or "off").
+"""
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import yaml
+from pydantic import BaseModel
+
+from intent_not_identified_flow.models.outputs import GeneralAnswer, IntentAnalysis
+from intent_not_identified_flow.services.batch_runner import percentile
+from intent_not_identified_flow.services.structured_output import parse_structured
+
+DEFAULT_ROUTING_PATH = os.path.join(os.path.dirname(__file__), "config", "model_routing.yaml")
+
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+\S", re.MULTILINE)
+
+
+class TaskRoute(BaseModel):
+    """Models of one task, cheapest first, and the thresholds of its quality checks"""
+    models: List[str]
+    min_confidence: Optional[float] = None
+    min_bullets: Optional[int] = None
+    max_bullets: Optional[int] = None
+
+
+class ModelPrice(BaseModel):
+    """USD per million tokens"""
+    input: float = 0.0
+    output: float = 0.0
+
+
+class TierSummary(BaseModel):
+    """Attempts of one task on one model"""
+    task: str
+    model: str
+    calls: int = 0
+    escalated: int = 0
+    latency_avg: float = 0.0
+    latency_p95: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalated / self.calls if self.calls else 0.0
+
+
+def check_intent_analysis(raw: str, route: TaskRoute) -> Optional[str]:
+    analysis, error = parse_structured(raw, IntentAnalysis)
+    if analysis is None:
+        return f"invalid analysis ({error})"
+    if route.min_confidence is not None and analysis.confidence_score < route.min_confidence:
+        return f"confidence {analysis.confidence_score:.2f} below {route.min_confidence:.2f}"
+    return None
+
+
+def check_general_answer(raw: str, route: TaskRoute) -> Optional[str]:
+    answer, error = parse_structured(raw, GeneralAnswer)
+    if answer is None:
+        return f"invalid answer ({error})"
+    return None if answer.detailed_response.strip() else "empty detailed_response"
+
+
+def check_bullet_summary(raw: str, route: TaskRoute) -> Optional[str]:
+    bullets = len(_BULLET.findall(raw))
+    if route.min_bullets is not None and bullets < route.min_bullets:
+        return f"{bullets} bullet points, expected at least {route.min_bullets}"
+    if route.max_bullets is not None and bullets > route.max_bullets:
+        return f"{bullets} bullet points, expected at most {route.max_bullets}"
+    return None
+
+
+# Task-specific quality checks; the output of any task must not be empty
+TASK_CHECKS: Dict[str, Callable[[str, TaskRoute], Optional[str]]] = {
+    "analyze_intent": check_intent_analysis,
+    "create_general_answer": check_general_answer,
+    "create_email_summary": check_bullet_summary,
+}
+
+
+class RoutingPolicy:
+    """Which models a task runs on, when to escalate, and what each attempt cost"""
+
+    def __init__(self, routes: Dict[str, TaskRoute] = None, pricing: Dict[str, ModelPrice] = None):
+        self.routes = routes or {}
+        self.pricing = pricing or {}
+        self._attempts: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "RoutingPolicy":
+        with open(path, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        return cls(
+            routes={task: TaskRoute(**route) for task, route in (config.get("tasks") or {}).items()},
+            pricing={model: ModelPrice(**price) for model, price in (config.get("pricing") or {}).items()},
+        )
+
+    def models(self, task: str, default: str) -> List[str]:
+        """Cascade of a task, or just the agent's model"""
+        route = self.routes.get(task)
+        return list(route.models) if route and route.models else [default]
+
+    def check(self, task: str, raw: str) -> Optional[str]:
+        """Why an output must be escalated, None when it is good enough"""
+        if not raw or not raw.strip():
+            return "empty output"
+        route = self.routes.get(task)
+        check = TASK_CHECKS.get(task)
+        return check(raw, route) if route is not None and check is not None else None
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.pricing.get(model)
+        if price is None:
+            return 0.0
+        return (prompt_tokens * price.input + completion_tokens * price.output) / 1_000_000
+
+    def record(self, task: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int,
+               escalated: bool) -> None:
+        with self._lock:
+            attempts = self._attempts.setdefault((task, model), {"latencies": [], "escalated": 0,
+                                                                 "prompt_tokens": 0, "completion_tokens": 0})
+            attempts["latencies"].append(seconds)
+            attempts["escalated"] += int(escalated)
+            attempts["prompt_tokens"] += prompt_tokens
+            attempts["completion_tokens"] += completion_tokens
+
+    def summary(self) -> List[TierSummary]:
+        with self._lock:
+            attempts = {key: dict(value, latencies=list(value["latencies"])) for key, value in self._attempts.items()}
+        summaries = []
+        for (task, model), value in sorted(attempts.items()):
+            latencies = value["latencies"]
+            summaries.append(TierSummary(
+                task=task,
+                model=model,
+                calls=len(latencies),
+                escalated=value["escalated"],
+                latency_avg=sum(latencies) / len(latencies),
+                latency_p95=percentile(latencies, 95),
+                prompt_tokens=value["prompt_tokens"],
+                completion_tokens=value["completion_tokens"],
+                cost=self.cost(model, value["prompt_tokens"], value["completion_tokens"]),
+            ))
+        return summaries
+
+    def report(self) -> str:
+        lines = [f"{'task':<24} {'model':<38} {'calls':>6} {'escal':>6} {'avg s':>7} {'p95 s':>7} "
+                 f"{'in tok':>8} {'out tok':>8} {'cost $':>9}"]
+        for s in self.summary():
+            lines.append(f"{s.task:<24} {s.model:<38} {s.calls:>6} {s.escalated:>6} {s.latency_avg:>7.2f} "
+                         f"{s.latency_p95:>7.2f} {s.prompt_tokens:>8} {s.completion_tokens:>8} {s.cost:>9.4f}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._attempts.clear()
+
+
+_policy: Optional[RoutingPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_routing_policy() -> Optional[RoutingPolicy]:
+    """Process-wide policy from INTENT_MODEL_ROUTING (default: config/model_routing.yaml), None when "off" """
+    global _policy
+    path = os.environ.get("INTENT_MODEL_ROUTING", DEFAULT_ROUTING_PATH)
+    if path.lower() in ("off", "none", ""):
+        return None
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = RoutingPolicy.load(path)
+    return _policy
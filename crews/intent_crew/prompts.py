@@ -0,0 +1,198 @@
+"""
+Task prompts laid out for provider-side prefix caching
+
+Each task is its static instructions (including the format of the
+expected output), INPUT_MARKER, then the {placeholders} filled in per
+email. Everything before the marker is identical for every email, so with
+the agent's system prompt it forms a prefix the provider can cache (see
+services/prompt_cache.py). crewAI appends the expected output after the
+description; it is a fixed pointer to the format given in the
+instructions, so no static text that matters follows the per-email part.
+
+BATCH_PROMPTS are the variants for several emails in one call (micro-batching,
+see services/micro_batching.py): the same instructions asking for a JSON array,
+then the inputs of every email, each under a numbered header.
+"""
+from typing import Dict, List
+
+from pydantic import BaseModel, ConfigDict
+
+from intent_not_identified_flow.services.prompt_cache import INPUT_MARKER
+
+
+class TaskPrompt(BaseModel):
+    """Static instructions and per-email inputs of one task"""
+    model_config = ConfigDict(frozen=True)
+
+    instructions: str
+    inputs: str
+    expected_output: str
+
+    @property
+    def description(self) -> str:
+        return f"{self.instructions.strip()}{INPUT_MARKER}{self.inputs.strip()}"
+
+    def batch_description(self, items: List[Dict[str, str]]) -> str:
+        """Instructions, then the inputs of every item under "### Item <n>" (n from 1)"""
+        blocks = [f"### Item {number}\n{self.inputs.strip().format(**inputs)}"
+                  for number, inputs in enumerate(items, 1)]
+        return f"{self.instructions.strip()}{INPUT_MARKER}" + "\n\n".join(blocks)
+
+
+TASK_PROMPTS: Dict[str, TaskPrompt] = {
+    "analyze_intent": TaskPrompt(
+        instructions="""
+Analyze the incoming email where the intent is not clearly identified.
+Determine if we can prepare answers based on general information.
+
+Your task is to:
+1. Identify the main topics or questions in the email, even if they're vague
+2. Assess whether general information about our products/services would adequately address the email
+3. Provide a confidence score for your assessment (0.0 to 1.0)
+
+Answer with a JSON object with three fields:
+- can_prepare_general_answer (boolean): Whether a general answer can be prepared
+- identified_topics (array of strings): List of topics identified in the email
+- confidence_score (float between 0.0 and 1.0): Your confidence in this assessment
+        """,
+        inputs="""
+Subject: {email_subject}
+Body: {email_body}
+Sender: {email_sender}
+        """,
+        expected_output="The JSON object with the three fields described in the task.",
+    ),
+    "retrieve_information": TaskPrompt(
+        instructions="""
+Based on the analysis results, query our API and knowledge base to retrieve
+relevant information that can help address the request.
+
+Use the identified topics to guide your search and ensure you retrieve
+comprehensive information that would help address the vague request.
+
+Answer with a comprehensive list of relevant information items retrieved from
+the knowledge base, organized by topic and relevance to the query.
+        """,
+        inputs="""
+Analysis results:
+{analysis_results}
+
+Original email:
+Subject: {email_subject}
+Body: {email_body}
+Sender: {email_sender}
+        """,
+        expected_output="The list of retrieved information items described in the task.",
+    ),
+    "create_general_answer": TaskPrompt(
+        instructions="""
+Create a comprehensive answer based on the general information retrieved.
+Ensure the answer addresses all identified topics and is helpful even without
+specific details from the customer.
+
+Your response should:
+1. Be friendly and professional
+2. Address the topics identified in the analysis
+3. Provide useful general information
+4. Invite further questions if needed
+
+Answer with a JSON object with three fields:
+- summary (string): A brief summary of your response
+- detailed_response (string): The complete response to the customer
+- references (array of strings): Any references to specific information sources used
+        """,
+        inputs="""
+Retrieved information:
+{retrieved_info}
+
+Analysis results:
+{analysis_results}
+
+Original email:
+{email_content}
+        """,
+        expected_output="The JSON object with the three fields described in the task.",
+    ),
+    "create_email_summary": TaskPrompt(
+        instructions="""
+Create a concise summary of the email content, capturing the essential
+points and query, especially since the intent is unclear.
+
+Your summary should:
+1. Identify the main request or question
+2. Note any specific details provided
+3. Highlight any constraints or preferences mentioned
+4. Be brief but complete (3-5 bullet points)
+
+Answer with a concise but comprehensive summary of the email content in 3-5
+bullet points, highlighting the main request, specific details, and any
+constraints mentioned.
+        """,
+        inputs="""
+Original email:
+{email_content}
+
+Created response (if available):
+{created_response}
+        """,
+        expected_output="The 3-5 bullet point summary described in the task.",
+    ),
+    "prepare_final_material": TaskPrompt(
+        instructions="""
+Prepare a complete package of materials for the handling agent that includes:
+1. The original email summary
+2. The created response (if available)
+3. Reference materials and sources used
+4. Suggestions for follow-up questions or clarifications
+5. Any additional context that would help the agent understand the situation
+
+This package will be handed off to a human agent who will process the request further.
+
+Answer with a comprehensive package containing the email summary, response (if
+available), reference materials, suggested follow-up questions, and additional
+context to help the human agent process the request effectively.
+        """,
+        inputs="""
+Email summary:
+{email_summary}
+
+Created response (if available):
+{created_response}
+
+Retrieved information:
+{retrieved_info}
+
+Original email:
+{email_content}
+        """,
+        expected_output="The package of materials for the handling agent described in the task.",
+    ),
+}
+
+
+BATCH_PROMPTS: Dict[str, TaskPrompt] = {
+    "analyze_intent": TaskPrompt(
+        instructions="""
+Analyze each of the incoming emails below where the intent is not clearly identified.
+For every email, determine if we can prepare answers based on general information.
+
+Assess each email on its own:
+1. Identify the main topics or questions in the email, even if they're vague
+2. Assess whether general information about our products/services would adequately address the email
+3. Provide a confidence score for your assessment (0.0 to 1.0)
+
+Answer with a JSON array holding one object per email, in the order of the emails,
+each with four fields:
+- item (integer): The number of the email from its "### Item" header
+- can_prepare_general_answer (boolean): Whether a general answer can be prepared
+- identified_topics (array of strings): List of topics identified in the email
+- confidence_score (float between 0.0 and 1.0): Your confidence in this assessment
+        """,
+        inputs="""
+Subject: {email_subject}
+Body: {email_body}
+Sender: {email_sender}
+        """,
+        expected_output="The JSON array with one object per email described in the task.",
+    ),
+}
@@ -1,217 +1,395 @@
 import os
+import re
 import asyncio
+import contextlib
 import logging
-from pydantic import BaseModel
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+from pydantic import BaseModel, PrivateAttr
 
 from crewai.flow import Flow, listen, start, router
 
-from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+from intent_not_identified_flow import configure_logging
 from intent_not_identified_flow.models.email import EmailContent
-
-# Konfigurácia loggingu pre produkčné prostredie
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from intent_not_identified_flow.models.outputs import GeneralAnswer, IntentAnalysis
+from intent_not_identified_flow.models.state import EmailBlock, StageOutput
+from intent_not_identified_flow.services.batch_runner import BatchRunner, EmailSource
+from intent_not_identified_flow.services.checkpoints import (
+    CheckpointStore,
+    FlowCheckpoint,
+    LeaseLost,
+    checkpointed_step,
+    get_checkpoint_store,
+    message_key,
 )
+from intent_not_identified_flow.services.instrumentation import get_instrumentation, instrumented_step
+from intent_not_identified_flow.services.pre_router import PreRouter, get_pre_router
+from intent_not_identified_flow.services.profiler import FlowProfiler, format_summary, get_profiler, profile_path
+from intent_not_identified_flow.services.streaming import StreamSink, streaming_to
+from intent_not_identified_flow.services.structured_logging import get_log_config, truncated
+
+if TYPE_CHECKING:
+    # Agents, tools and LLM backends load with the crew, on the first task a flow runs
+    from intent_not_identified_flow.crews.intent_crew.intent_crew import IntentCrew
+
 logger = logging.getLogger(__name__)
 
-print('I am here')
+
+def get_shared_intent_crew() -> "IntentCrew":
+    """The process-wide IntentCrew, importing and building it on first use"""
+    from intent_not_identified_flow.crews.intent_crew.intent_crew import get_shared_intent_crew
+    return get_shared_intent_crew()
+
+
+# Last resort when the analyzer answer has no usable JSON even after the repair re-prompt
+_CAN_PREPARE_HEURISTIC = re.compile(r"can[ _]prepare[ _]general[ _]answer:\s*true", re.IGNORECASE)
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    return default if value is None else value.strip().lower() in ("1", "true", "yes", "on")
 
 class IntentState(BaseModel):
-    """State model for the intent not identified flow"""
+    """State model for the intent not identified flow - task results are kept as compact StageOutputs"""
     email: EmailContent = None
-    analysis_results: dict = None
-    retrieved_info: dict = None
-    created_response: dict = None
-    email_summary: str = ""
-    final_materials: dict = None
+    analysis_results: Optional[StageOutput] = None
+    retrieved_info: Optional[StageOutput] = None
+    created_response: Optional[StageOutput] = None
+    email_summary: Optional[StageOutput] = None
+    final_materials: Optional[StageOutput] = None
     can_prepare_info: bool = False
+    _email_block: Optional[EmailBlock] = PrivateAttr(default=None)
+    _email_source: Optional[EmailContent] = PrivateAttr(default=None)
+
+    @property
+    def email_block(self) -> Optional[EmailBlock]:
+        """The email rendered for the task prompts, once per flow (again only if the email is replaced)"""
+        if self.email is not None and self._email_source is not self.email:
+            self._email_block = EmailBlock.from_email(self.email)
+            self._email_source = self.email
+        return self._email_block if self.email is not None else None
 
 class IntentNotIdentifiedFlow(Flow[IntentState]):
     """Flow for handling emails with unidentified intent - follows the diagram exactly"""
+
+    # The flow never recalls or remembers; crewAI would otherwise give every instance its own
+    # LanceDB-backed Memory, importing lancedb on the first one and opening storage on each
+    _skip_auto_memory: bool = True
     
-    
-    # Creates a new IntentCrew instance without singleton pattern
-    def __init__(self, *args, **kwargs):
+    # Reuses the process-wide IntentCrew unless a dedicated one is passed in
+    def __init__(self, *args, intent_crew: "IntentCrew" = None, parallel: bool = None,
+                 speculative_retrieval: bool = None, pre_router: PreRouter = None,
+                 stream_sink: StreamSink = None, checkpoint_store: CheckpointStore = None, **kwargs):
+        """
+        Args:
+            intent_crew: Crew executing the tasks, by default the shared one, built when the
+                first task runs so creating a flow (e.g. to plot it) does not load the agents
+            parallel: Start every task as soon as the inputs it requires are known instead of
+                strictly step by step; the summary is then always drafted from the email alone,
+                concurrently with analysis and retrieval (env INTENT_FLOW_PARALLEL)
+            speculative_retrieval: Start knowledge retrieval from the email while analyze_intent
+                is still running, cancelled when the flow takes the cannot_prepare_info branch
+                (env INTENT_FLOW_SPECULATIVE_RETRIEVAL, defaults to parallel)
+            pre_router: Classifier cascade that routes trivial emails without the analyzer LLM call,
+                the one configured by INTENT_PRE_ROUTER* env variables by default (off when unset)
+            stream_sink: asyncio.Queue or callback receiving StreamEvents - the output of every task
+                chunk by chunk while it is generated, then the complete output
+            checkpoint_store: Store the state is written to after every step, so a run interrupted
+                midway resumes after its last completed step and a fully processed message is
+                not processed again (env INTENT_CHECKPOINT_PATH, off when unset)
+        """
+        # crewAI prints a console panel for every flow method; only with INTENT_CREW_VERBOSE
+        kwargs.setdefault("suppress_flow_events", not get_log_config().crew_verbose)
         super().__init__(*args, **kwargs)
-        print('Creating IntentCrew')
-        self.intent_crew = IntentCrew()
-        print('IntentCrew created')
+        self._intent_crew = intent_crew
+        self.parallel = _env_flag("INTENT_FLOW_PARALLEL") if parallel is None else parallel
+        if speculative_retrieval is None:
+            speculative_retrieval = _env_flag("INTENT_FLOW_SPECULATIVE_RETRIEVAL", self.parallel)
+        self.speculative_retrieval = speculative_retrieval
+        self.pre_router = pre_router if pre_router is not None else get_pre_router()
+        self.stream_sink = stream_sink
+        self.checkpoint_store = checkpoint_store if checkpoint_store is not None else get_checkpoint_store()
+        self.message_checkpoint = None
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    @property
+    def intent_crew(self) -> "IntentCrew":
+        if self._intent_crew is None:
+            self._intent_crew = get_shared_intent_crew()
+        return self._intent_crew
+
+    async def kickoff_async(self, *args, **kwargs):
+        instrumentation = get_instrumentation()
+        if self.checkpoint_store is not None and self.state.email is not None:
+            self.message_checkpoint = FlowCheckpoint(self.checkpoint_store, message_key(self.state.email))
+            record = await self.message_checkpoint.begin(self.state)
+            if record is not None and record.done:
+                logger.info(f"Message {record.message_id} was already processed, returning the stored result")
+                return record.steps.get("switching_to_agent_with_materials")
+            if record is not None:
+                logger.info(f"Resuming message {record.message_id} after steps: {', '.join(record.steps) or '-'}")
+        try:
+            with streaming_to(self.stream_sink, self.state.id) if self.stream_sink is not None else contextlib.nullcontext():
+                async with instrumentation.email(self.state.id), instrumentation.stage(type(self).__name__, kind="flow"):
+                    result = await super().kickoff_async(*args, **kwargs)
+            if self.message_checkpoint is not None:
+                if "switching_to_agent_with_materials" in self.message_checkpoint.completed:
+                    await self.message_checkpoint.finish(self.state)
+                else:
+                    # A failed step ended the flow early; a redelivery resumes from the last checkpoint
+                    await self.message_checkpoint.abandon()
+            return result
+        except LeaseLost:
+            # Another worker owns the message now; there is no lease left to release
+            logger.warning(f"Lost the lease on message {self.message_checkpoint.message_id}, aborting the flow")
+            raise
+        except BaseException:
+            if self.message_checkpoint is not None:
+                await self.message_checkpoint.abandon()
+            raise
+        finally:
+            # Nothing started early may outlive the flow, e.g. when a step failed
+            for task_name in list(self._pending):
+                self._cancel(task_name)
+
+    def _task_context(self) -> dict:
+        """Every value a task may read, as far as it is known at this point"""
+        return {
+            "email_content": self.state.email_block,
+            "analysis_results": self.state.analysis_results,
+            "retrieved_info": self.state.retrieved_info,
+            "created_response": self.state.created_response,
+            "email_summary": self.state.email_summary,
+        }
+
+    def _start_early(self, task_name: str, assume_optional: Iterable[str] = ()) -> bool:
+        """
+        Start a task in the background if every input it requires is already known
+
+        Args:
+            task_name: Task to start
+            assume_optional: Required inputs to do without (speculative execution)
+
+        Returns:
+            True when the task was started
+        """
+        context = {key: value for key, value in self._task_context().items() if value}
+        missing = self.intent_crew.required_inputs(task_name) - set(assume_optional) - set(context)
+        if missing or task_name in self._pending:
+            return False
+        needed = self.intent_crew.task_inputs(task_name)
+        self._pending[task_name] = asyncio.create_task(self.intent_crew.execute_task_async(
+            task_name, context={key: value for key, value in context.items() if key in needed}
+        ))
+        logger.info(f"Started {task_name} early")
+        return True
+
+    async def _join(self, task_name: str):
+        """Result of a task started early, or None when it was not started"""
+        pending = self._pending.pop(task_name, None)
+        return await pending if pending is not None else None
+
+    def _cancel(self, task_name: str) -> None:
+        pending = self._pending.pop(task_name, None)
+        if pending is not None and not pending.done():
+            pending.cancel()
+            logger.info(f"Cancelled {task_name} started early")
     
     
     @start()
+    @checkpointed_step
+    @instrumented_step
     async def intent_not_identified(self):
         """Starting point - intent not identified"""
         logger.info("Starting flow: Intent not identified")
         # Email should be set before kickoff
         if not self.state.email:
             raise ValueError("Email must be set before starting the flow")
+
+        if self.parallel:
+            # The email-only summary needs nothing but the email
+            self._start_early("create_email_summary")
+        if self.speculative_retrieval:
+            self._start_early("retrieve_information", assume_optional=["analysis_results"])
     
     @listen(intent_not_identified)
+    @checkpointed_step
+    @instrumented_step
     async def text_analysis_general_info(self):
         """Text analysis if we can prepare answers based on general info"""
         logger.info("Text analysis if we can prepare answers based on general info")
         
         try:
-            print('Before execute_task_async for analyze_intent')
-            print(f'Email subject: {self.state.email.subject}')
-            print(f'Email body: {self.state.email.body[:50]}...')
-            print(f'Email context: {{"email_content": {self.state.email.dict()}}}')
-            
-            analysis_output = await self.intent_crew.execute_task_async(
+            if self.pre_router is not None:
+                async with get_instrumentation().stage("pre_route", kind="task"):
+                    decision = self.pre_router.route(self.state.email)
+                if decision is not None:
+                    # Triviálny prípad, analyzátor (LLM) netreba volať
+                    analysis = IntentAnalysis(can_prepare_general_answer=decision.can_prepare_general_answer,
+                                              confidence_score=decision.confidence)
+                    self.state.analysis_results = StageOutput.of(
+                        analysis.model_dump_json(), analysis, routed_by=f"{decision.classifier}:{decision.reason}"
+                    )
+                    self.state.can_prepare_info = decision.can_prepare_general_answer
+                    logger.info(f"Pre-routed by {decision.classifier} ({decision.reason}). "
+                                f"Can prepare general info: {self.state.can_prepare_info}")
+                    return
+
+            logger.debug("Analyzing email %r: %s", self.state.email.subject, truncated(self.state.email.body, 50))
+
+            analysis_output, analysis = await self.intent_crew.execute_structured_task_async(
                 "analyze_intent",
-                context={"email_content": self.state.email.dict()}
+                context={"email_content": self.state.email_block},
+                schema=IntentAnalysis
             )
-            print('After execute_task_async for analyze_intent')
-            print(f'Analysis output raw: {analysis_output.raw[:100]}...')
-            
-            # Uložíme celý výstup pre prípadné ďalšie použitie
-            self.state.analysis_results = {
-                "raw": analysis_output.raw
-            }
+            logger.debug("Analysis output: %s", truncated(analysis_output.raw, 100))
             
-            # Pokúsime sa extrahovať JSON z výstupu, ktorý by mal byť v JSON formáte
-            import json
-            try:
-                # Hľadáme JSON v texte - agenti často vracajú JSON v texte
-                import re
-                json_pattern = r'\{.*\}'
-                json_match = re.search(json_pattern, analysis_output.raw, re.DOTALL)
-                
-                if json_match:
-                    print(f'Found JSON match: {json_match.group(0)[:100]}...')
-                    analysis_json = json.loads(json_match.group(0))
-                    self.state.analysis_results.update(analysis_json)
-                    self.state.can_prepare_info = analysis_json.get("can_prepare_general_answer", False)
-                    print(f'can_prepare_info from JSON: {self.state.can_prepare_info}')
-                else:
-                    # Ak sa nenájde JSON, použijeme heuristiku z textu
-                    print('No JSON found, using text heuristic')
-                    self.state.can_prepare_info = "can prepare general answer: true" in analysis_output.raw.lower() or "can_prepare_general_answer: true" in analysis_output.raw.lower()
-                    print(f'can_prepare_info from heuristic: {self.state.can_prepare_info}')
-                    
-            except json.JSONDecodeError as e:
-                # Ak sa nepodari parsovať JSON, použijeme jednoduchú heuristiku
-                print(f'JSON decode error: {str(e)}')
-                self.state.can_prepare_info = "can prepare general answer: true" in analysis_output.raw.lower() or "can_prepare_general_answer: true" in analysis_output.raw.lower()
-                print(f'can_prepare_info from heuristic after error: {self.state.can_prepare_info}')
+            # Uložíme text výstupu a rozparsované polia pre ďalšie kroky
+            self.state.analysis_results = StageOutput.of(analysis_output, analysis)
+
+            if analysis is not None:
+                self.state.can_prepare_info = analysis.can_prepare_general_answer
+            else:
+                # Ani oprava výstupu nepomohla, použijeme heuristiku z textu
+                logger.warning("Analysis output has no valid JSON even after repair, using text heuristic")
+                self.state.can_prepare_info = bool(_CAN_PREPARE_HEURISTIC.search(analysis_output.raw))
             
             logger.info(f"Analysis complete. Can prepare general info: {self.state.can_prepare_info}")
             
         except Exception as e:
-            logger.error(f"Error during text analysis: {str(e)}")
-            print(f"EXCEPTION: {str(e)}")
-            print(f"EXCEPTION TYPE: {type(e)}")
+            logger.error(f"Error during text analysis: {type(e).__name__}: {str(e)}")
             # Fail gracefully in production
             self.state.can_prepare_info = False
             raise
         
     @listen(text_analysis_general_info)
+    @checkpointed_step
+    @instrumented_step
     async def decision_prepare_info(self):
         """Decision: Able to prepare info?"""
         logger.info(f"Decision: {'Able' if self.state.can_prepare_info else 'Unable'} to prepare info")
     
     @router(decision_prepare_info)
+    @checkpointed_step
+    @instrumented_step
     async def route_based_on_decision(self):
         """Router to direct flow based on analysis decision"""
         if self.state.can_prepare_info:
             return "can_prepare_info"
         else:
+            self._cancel("retrieve_information")
             return "cannot_prepare_info"
     
     @listen("can_prepare_info")
+    @checkpointed_step
+    @instrumented_step
     async def api_knowledge_base_finding(self):
         """API web/knowledge base - finding the info"""
         logger.info("API web/knowledge base - finding the info")
         
         try:
             # Využitie asynchrónneho rozhrania IntentCrew
-            info = await self.intent_crew.execute_task_async(
-                "retrieve_information",
-                context={
-                    "email_content": self.state.email.dict(),
-                    "analysis_results": self.state.analysis_results
-                }
-            )
-            
-            self.state.retrieved_info = info
+            info = await self._join("retrieve_information")
+            if info is None:
+                info = await self.intent_crew.execute_task_async(
+                    "retrieve_information",
+                    context={
+                        "email_content": self.state.email_block,
+                        "analysis_results": self.state.analysis_results
+                    }
+                )
+
+            self.state.retrieved_info = StageOutput.of(info)
             logger.info("API/knowledge base search complete")
         except Exception as e:
             logger.error(f"Error during information retrieval: {str(e)}")
             # Fail gracefully in production
-            self.state.retrieved_info = {"error": "Failed to retrieve information"}
+            self.state.retrieved_info = StageOutput.failed("Failed to retrieve information")
             raise
         
     @listen(api_knowledge_base_finding)
+    @checkpointed_step
+    @instrumented_step
     async def creating_answer_general_info(self):
         """Creating answer based on general info"""
         logger.info("Creating answer based on general info")
         
         try:
             # Využitie asynchrónneho rozhrania IntentCrew
-            response = await self.intent_crew.execute_task_async(
+            response, answer = await self.intent_crew.execute_structured_task_async(
                 "create_general_answer",
                 context={
-                    "email_content": self.state.email.dict(),
+                    "email_content": self.state.email_block,
                     "analysis_results": self.state.analysis_results,
                     "retrieved_info": self.state.retrieved_info
-                }
+                },
+                schema=GeneralAnswer
             )
-            
-            self.state.created_response = response
+
+            self.state.created_response = StageOutput.of(response, answer)
             logger.info("General answer created")
         except Exception as e:
             logger.error(f"Error during answer creation: {str(e)}")
             # Fail gracefully
-            self.state.created_response = {"error": "Failed to create answer"}
+            self.state.created_response = StageOutput.failed("Failed to create answer")
             raise
         
-    @listen(creating_answer_general_info)
+    @router(creating_answer_general_info)
+    @checkpointed_step
+    @instrumented_step
     async def drafting_summary_from_answer(self):
         """Drafting a summary from answer"""
         logger.info("Drafting a summary from answer")
         
         try:
-            # Využitie asynchrónneho rozhrania IntentCrew
-            summary = await self.intent_crew.execute_task_async(
-                "create_email_summary",
-                context={
-                    "email_content": self.state.email.dict(),
-                    "created_response": self.state.created_response
-                }
-            )
-            
-            self.state.email_summary = summary
+            # In parallel mode the email-only summary has been running since the start
+            summary = await self._join("create_email_summary")
+            if summary is None:
+                # Využitie asynchrónneho rozhrania IntentCrew
+                summary = await self.intent_crew.execute_task_async(
+                    "create_email_summary",
+                    context={
+                        "email_content": self.state.email_block,
+                        "created_response": self.state.created_response
+                    }
+                )
+
+            self.state.email_summary = StageOutput.of(summary)
             logger.info("Summary from answer drafted")
             return "summary_created"
         except Exception as e:
             logger.error(f"Error during summary creation: {str(e)}")
             # Fail gracefully
-            self.state.email_summary = "Failed to create summary from answer"
+            self.state.email_summary = StageOutput.of("Failed to create summary from answer")
             return "summary_created"  # Still proceed to next step
     
-    @listen("cannot_prepare_info")
+    @router("cannot_prepare_info")
+    @checkpointed_step
+    @instrumented_step
     async def creating_summary_from_email(self):
         """Creating a summary from email"""
         logger.info("Creating a summary from email")
         
         try:
-            # Využitie asynchrónneho rozhrania IntentCrew
-            summary = await self.intent_crew.execute_task_async(
-                "create_email_summary",
-                context={"email_content": self.state.email.dict()}
-            )
-            
-            self.state.email_summary = summary
+            summary = await self._join("create_email_summary")
+            if summary is None:
+                # Využitie asynchrónneho rozhrania IntentCrew
+                summary = await self.intent_crew.execute_task_async(
+                    "create_email_summary",
+                    context={"email_content": self.state.email_block}
+                )
+
+            self.state.email_summary = StageOutput.of(summary)
             logger.info("Email summary created")
             return "summary_created"
         except Exception as e:
             logger.error(f"Error during email summary creation: {str(e)}")
             # Fail gracefully
-            self.state.email_summary = "Failed to create summary from email"
+            self.state.email_summary = StageOutput.of("Failed to create summary from email")
             return "summary_created"  # Still proceed to next step
         
     @listen("summary_created")
+    @checkpointed_step
+    @instrumented_step
     async def switching_to_agent_with_materials(self):
         """Switching to an agent with a pre-prepared material for the processed part"""
         logger.info("Switching to an agent with a pre-prepared material for the processed part")
@@ -221,20 +399,20 @@ class IntentNotIdentifiedFlow(Flow[IntentState]):
             materials = await self.intent_crew.execute_task_async(
                 "prepare_final_material",
                 context={
-                    "email_content": self.state.email.dict(),
+                    "email_content": self.state.email_block,
                     "email_summary": self.state.email_summary,
                     "created_response": self.state.created_response,
                     "retrieved_info": self.state.retrieved_info
                 }
             )
             
-            self.state.final_materials = materials
+            self.state.final_materials = StageOutput.of(materials)
             logger.info("Flow complete - materials prepared for agent handoff!")
-            return materials
+            return self.state.final_materials
         except Exception as e:
             logger.error(f"Error during final material preparation: {str(e)}")
             # Fail gracefully
-            self.state.final_materials = {"error": "Failed to prepare final materials"}
+            self.state.final_materials = StageOutput.failed("Failed to prepare final materials")
             return self.state.final_materials
 
 async def async_kickoff():
@@ -262,16 +440,12 @@ async def async_kickoff():
     )
     
     # Initialize flow with email - with additional logging
-    print('Creating IntentNotIdentifiedFlow')
     flow = IntentNotIdentifiedFlow()
     flow.state.email = mock_email
-    print('Email set in state')
     
     try:
         # Kickoff the flow asynchronously
-        print('Before kickoff_async')
         result = await flow.kickoff_async()
-        print('After kickoff_async')
         
         logger.info("\n--- Flow Execution Complete ---")
         logger.info(f"Final materials prepared: {result}")
@@ -281,6 +455,48 @@ async def async_kickoff():
         logger.error(f"Error during flow execution: {str(e)}")
         return {"error": str(e)}
 
+async def async_batch_kickoff(emails: EmailSource, concurrency: int = 10, ordered: bool = False):
+    """Run the flow for many emails at once with bounded concurrency
+
+    Args:
+        emails: Iterable or async stream of EmailContent objects
+        concurrency: Maximum number of flows in flight
+        ordered: Return results in input order instead of completion order
+
+    Returns:
+        Tuple of (list of BatchItemResult, BatchStats)
+    """
+    runner = BatchRunner(IntentNotIdentifiedFlow, concurrency=concurrency, ordered=ordered)
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.start()
+    try:
+        results = await runner.run(emails)
+    finally:
+        if profiler is not None:
+            await profiler.stop()
+
+    pool_stats = get_shared_intent_crew().agent_pool_stats()
+    logger.info(
+        f"Agents built: {pool_stats.built}, reused: {pool_stats.reused}, "
+        f"construction time saved: {pool_stats.saved_seconds:.2f}s"
+    )
+    pre_router = get_pre_router()
+    if pre_router is not None:
+        pre_stats = pre_router.stats()
+        logger.info(
+            f"Pre-routed without the analyzer: {pre_stats.short_circuited}/{pre_stats.total} "
+            f"({pre_stats.short_circuit_rate:.1%}), by classifier: {pre_stats.by_classifier}"
+        )
+    routing = get_shared_intent_crew().routing_policy()
+    if routing is not None:
+        logger.info(f"Model routing per task and model:\n{routing.report()}")
+    logger.info(f"Per-stage latency:\n{get_instrumentation().report()}")
+    if profiler is not None:
+        logger.info(f"Flow profile:\n{format_summary(profiler.summary())}")
+        profiler.write_report(profile_path(), flow=IntentNotIdentifiedFlow())
+    return results, runner.stats
+
 async def generate_flow_plot():
     """Generate and save a visualization plot of the flow"""
     # Create flow instance
@@ -291,7 +507,21 @@ async def generate_flow_plot():
     
     print("Flow plot successfully generated and saved to 'intent_not_identified_flow_plot.html'")
 
+async def generate_flow_profile(emails: EmailSource, concurrency: int = 10):
+    """Run the flow for emails with the profiler attached and save its timeline report next to the plot"""
+    profiler = FlowProfiler().attach()
+    profiler.start()
+    try:
+        await BatchRunner(IntentNotIdentifiedFlow, concurrency=concurrency).run(emails)
+    finally:
+        await profiler.stop()
+        profiler.detach()
+    profiler.write_report("intent_not_identified_flow_profile.html", flow=IntentNotIdentifiedFlow())
+    print(format_summary(profiler.summary()))
+    print("Flow profile successfully generated and saved to 'intent_not_identified_flow_profile.html'")
+
 if __name__ == "__main__":
+    configure_logging()
     # asyncio.run(generate_flow_plot())
     # or
     asyncio.run(async_kickoff())
@@ -1,7 +1,10 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 class EmailContent(BaseModel):
     """Model for email content"""
     subject: str = Field(description="The email subject")
     body: str = Field(description="The email body content")
-    sender: str = Field(description="The email sender")
\ No newline at end of file
+    sender: str = Field(description="The email sender")
+    message_id: Optional[str] = Field(default=None, description="The Message-ID header, used for idempotent processing")
@@ -0,0 +1,23 @@
+from typing import List
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class IntentAnalysis(BaseModel):
+    """Structured output of the analyze_intent task"""
+    can_prepare_general_answer: bool = Field(description="Whether a general answer can be prepared")
+    identified_topics: List[str] = Field(default_factory=list, description="Topics identified in the email")
+    confidence_score: float = Field(default=0.0, ge=0.0, le=1.0, description="Confidence in the assessment")
+
+    @field_validator("identified_topics", mode="before")
+    @classmethod
+    def _topics_as_list(cls, value):
+        # A single topic is sometimes returned as a plain string
+        return [value] if isinstance(value, str) else value
+
+
+class GeneralAnswer(BaseModel):
+    """Structured output of the create_general_answer task"""
+    summary: str = Field(description="A brief summary of the response")
+    detailed_response: str = Field(description="The complete response to the customer")
+    references: List[str] = Field(default_factory=list, description="Information sources used")
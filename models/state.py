@@ -0,0 +1,117 @@
+"""
+Compact building blocks of the flow state
+
+EmailBlock is the email as every task sees it, rendered once per flow
+instead of at each of the LLM-calling steps. StageOutput is what the flow
+keeps of a task result: the raw text and the parsed fields, not the crewAI
+output object with its task outputs, token usage and agent references. Both
+are frozen, so one instance is safely shared by every step, task context
+and checkpoint of a flow, and identical stage outputs (result cache hits,
+fixed fallbacks) are interned: concurrent flows hold one instance.
+"""
+import functools
+import json
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+from intent_not_identified_flow.models.email import EmailContent
+
+
+def _count_tokens(text: str) -> int:
+    from intent_not_identified_flow.crews.intent_crew.context_builder import count_tokens
+    return count_tokens(text)
+
+
+class EmailBlock(BaseModel):
+    """The email of a flow, pre-rendered for the task prompts"""
+    model_config = ConfigDict(frozen=True)
+
+    subject: str
+    body: str
+    sender: str
+    text: str
+
+    @classmethod
+    def from_email(cls, email: EmailContent) -> "EmailBlock":
+        return cls(
+            subject=email.subject,
+            body=email.body,
+            sender=email.sender,
+            text=f"Subject: {email.subject}\nFrom: {email.sender}\n\n{email.body.strip()}",
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Read like the email dict it replaces in task contexts"""
+        return getattr(self, key, default) if key in type(self).model_fields else default
+
+    @functools.cached_property
+    def tokens(self) -> int:
+        return _count_tokens(self.text)
+
+
+class StageOutput(BaseModel):
+    """
+    Result of one task as kept in the flow state
+
+    text is what later tasks see: the parsed fields as single-line JSON when the
+    output was structured (or the error), the raw text otherwise.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    raw: str = ""
+    fields: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    text: str = ""
+
+    @classmethod
+    def of(cls, output: Any, parsed: Any = None, **extra: Any) -> "StageOutput":
+        """
+        Args:
+            output: Task output (CrewOutput, StageOutput or anything with .raw) or plain text
+            parsed: Parsed structured output (a model or a dict), if any
+            extra: Additional parsed fields, e.g. how the result was obtained
+        """
+        raw = output.raw if hasattr(output, "raw") else str(output or "")
+        fields = parsed.model_dump() if isinstance(parsed, BaseModel) else dict(parsed or {})
+        fields.update(extra)
+        if not fields:
+            return _intern(raw, None, None, raw)
+        return _intern(raw, fields, None, json.dumps(fields, ensure_ascii=False, default=str))
+
+    @classmethod
+    def failed(cls, error: str) -> "StageOutput":
+        """Placeholder of a task that failed; later tasks see {"error": ...}"""
+        return _intern("", None, error, json.dumps({"error": error}, ensure_ascii=False))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """A parsed field, "raw" or "error", like the dict this replaces"""
+        if key == "raw":
+            return self.raw
+        if key == "error":
+            return self.error if self.error is not None else default
+        return (self.fields or {}).get(key, default)
+
+    @functools.cached_property
+    def tokens(self) -> int:
+        return _count_tokens(self.text)
+
+    def __str__(self) -> str:
+        return self.raw if self.error is None else self.text
+
+
+_interned: "weakref.WeakValueDictionary[tuple, StageOutput]" = weakref.WeakValueDictionary()
+_interned_lock = threading.Lock()
+
+
+def _intern(raw: str, fields: Optional[Dict[str, Any]], error: Optional[str], text: str) -> StageOutput:
+    # text renders the fields, so (raw, text, error) identifies the output
+    key = (raw, text, error)
+    with _interned_lock:
+        output = _interned.get(key)
+        if output is None:
+            output = StageOutput(raw=raw, fields=fields, error=error, text=text)
+            _interned[key] = output
+        return output
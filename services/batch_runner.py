@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, List, Optional, Union
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.models.email import EmailContent
+
+logger = logging.getLogger(__name__)
+
+EmailSource = Union[Iterable[EmailContent], AsyncIterable[EmailContent]]
+_EXHAUSTED = object()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values (0.0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of a single email processed by the batch runner"""
+    index: int
+    email: EmailContent
+    result: Any = None
+    error: Optional[str] = None
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BatchStats(BaseModel):
+    """Throughput and latency statistics for one batch run"""
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    wall_time: float = 0.0
+    throughput: float = 0.0
+    latency_avg: float = 0.0
+    latency_p50: float = 0.0
+    latency_p95: float = 0.0
+    latency_p99: float = 0.0
+    latency_max: float = 0.0
+
+
+class BatchRunner:
+    """Runs one flow per email with a bounded number of flows in flight"""
+
+    def __init__(
+        self,
+        flow_factory: Callable[[], Any],
+        concurrency: int = 10,
+        ordered: bool = False,
+        reorder_window: Optional[int] = None,
+    ):
+        """
+        Args:
+            flow_factory: Callable returning a fresh flow instance, so every email
+                gets its own isolated state
+            concurrency: Maximum number of flows running at the same time
+            ordered: Yield results in input order instead of as they complete
+            reorder_window: Maximum number of finished-but-unyielded plus running
+                flows in ordered mode (defaults to 4 x concurrency)
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.flow_factory = flow_factory
+        self.concurrency = concurrency
+        self.ordered = ordered
+        self.reorder_window = max(reorder_window or 4 * concurrency, concurrency)
+        self.stats = BatchStats()
+
+    async def run(self, emails: EmailSource) -> List[BatchItemResult]:
+        """Process all emails and return the results as a list"""
+        return [item async for item in self.stream(emails)]
+
+    async def stream(self, emails: EmailSource) -> AsyncIterator[BatchItemResult]:
+        """
+        Process emails concurrently and yield results as they become available
+
+        Args:
+            emails: Iterable or async iterable of EmailContent objects; it is
+                consumed lazily, only as fast as flow slots free up
+
+        Yields:
+            BatchItemResult per email, in input order if ordered=True
+        """
+        source = self._aiter(emails)
+        latencies: List[float] = []
+        failed = 0
+        pending = set()
+        finished = {}
+        next_index = 0
+        index = 0
+        exhausted = False
+        fetch = None
+        started = time.perf_counter()
+
+        try:
+            while True:
+                if fetch is None and not exhausted and self._has_capacity(pending, finished):
+                    # Awaited alongside the flows: a source waiting for new emails (a job queue)
+                    # must not hold back the results of flows that already finished
+                    fetch = asyncio.ensure_future(self._next(source))
+
+                if not pending and fetch is None:
+                    break
+
+                done, _ = await asyncio.wait(pending | {fetch} if fetch else pending,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if fetch in done:
+                    email = fetch.result()
+                    fetch = None
+                    if email is _EXHAUSTED:
+                        exhausted = True
+                    else:
+                        pending.add(asyncio.create_task(self._run_one(index, email)))
+                        index += 1
+                for task in done & pending:
+                    pending.discard(task)
+                    item = task.result()
+                    latencies.append(item.latency)
+                    if not item.ok:
+                        failed += 1
+                    if self.ordered:
+                        finished[item.index] = item
+                    else:
+                        yield item
+
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+        finally:
+            if fetch is not None:
+                fetch.cancel()
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            self.stats = self._build_stats(latencies, failed, time.perf_counter() - started)
+            logger.info(
+                "Batch complete: %d emails (%d failed) in %.2fs, %.2f emails/s, p50 %.2fs, p95 %.2fs",
+                self.stats.total, self.stats.failed, self.stats.wall_time, self.stats.throughput,
+                self.stats.latency_p50, self.stats.latency_p95,
+            )
+
+    def _has_capacity(self, pending, finished) -> bool:
+        if len(pending) >= self.concurrency:
+            return False
+        # In ordered mode a slow head-of-line email must not let the buffer grow unbounded
+        return not self.ordered or len(pending) + len(finished) < self.reorder_window
+
+    async def _run_one(self, index: int, email: EmailContent) -> BatchItemResult:
+        """Run a fresh flow for one email, turning failures into an error result"""
+        started = time.perf_counter()
+        try:
+            flow = self.flow_factory()
+            flow.state.email = email
+            result = await flow.kickoff_async()
+            return BatchItemResult(index=index, email=email, result=result,
+                                   latency=time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Flow for email #{index} failed: {str(e)}")
+            return BatchItemResult(index=index, email=email, error=str(e),
+                                   latency=time.perf_counter() - started)
+
+    @staticmethod
+    async def _next(source: AsyncIterator[EmailContent]):
+        try:
+            return await source.__anext__()
+        except StopAsyncIteration:
+            return _EXHAUSTED
+
+    @staticmethod
+    async def _aiter(emails: EmailSource) -> AsyncIterator[EmailContent]:
+        if hasattr(emails, "__aiter__"):
+            async for email in emails:
+                yield email
+        else:
+            for email in emails:
+                yield email
+
+    @staticmethod
+    def _build_stats(latencies: List[float], failed: int, wall_time: float) -> BatchStats:
+        total = len(latencies)
+        return BatchStats(
+            total=total,
+            succeeded=total - failed,
+            failed=failed,
+            wall_time=wall_time,
+            throughput=total / wall_time if wall_time > 0 else 0.0,
+            latency_avg=sum(latencies) / total if total else 0.0,
+            latency_p50=percentile(latencies, 50),
+            latency_p95=percentile(latencies, 95),
+            latency_p99=percentile(latencies, 99),
+            latency_max=max(latencies) if latencies else 0.0,
+        )
@@ -0,0 +1,335 @@
+"""
+Durable per-message checkpoints of flow state
+
+After every completed step the flow state and the step's return value are
+written to a local SQLite file, keyed by the email's message ID. A flow for a
+message that already has a checkpoint
+
+- returns the stored result right away when the message was fully processed
+  (a redelivered email is not processed twice)
+- resumes after the last completed step when a previous worker died midway:
+  completed steps return their recorded value without running again, so
+  routing is replayed exactly and no LLM call is repeated
+- is rejected with MessageInProgress while another worker holds the lease
+
+A worker whose lease expired and was taken over gets LeaseLost on its next
+checkpoint write, which aborts its flow: only the new owner goes on making
+LLM calls and answers the email.
+
+Checkpoints use a compact binary encoding: pickle of plain Python values
+(CrewOutput objects are reduced to their raw text, StageOutputs to their raw
+text and fields), read back with an unpickler that refuses every class, so a
+checkpoint file cannot execute code.
+Enabled through the environment by get_checkpoint_store:
+INTENT_CHECKPOINT_PATH and INTENT_CHECKPOINT_LEASE (seconds).
+"""
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from crewai.crews.crew_output import CrewOutput
+from pydantic import BaseModel
+
+from intent_not_identified_flow.models.email import EmailContent
+from intent_not_identified_flow.models.state import StageOutput
+
+logger = logging.getLogger(__name__)
+
+_CREW_OUTPUT = "__crew_output__"
+_STAGE_OUTPUT = "__stage_output__"
+# Payloads above this size are zlib-compressed; state is mostly LLM text, which compresses well
+_COMPRESS_ABOVE = 1024
+_RAW, _ZLIB = b"P", b"Z"
+
+
+class MessageInProgress(RuntimeError):
+    """Another worker holds the lease on this message"""
+
+
+class LeaseLost(RuntimeError):
+    """This worker's lease expired and another worker took the message over"""
+
+
+class CheckpointRecord(BaseModel):
+    """Latest checkpoint of one message"""
+    message_id: str
+    status: str
+    owner: str
+    steps: Dict[str, Any] = {}
+    state: Dict[str, Any] = {}
+    updated_at: float = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.status == "done"
+
+
+class CheckpointStats(BaseModel):
+    """Checkpoint write counters"""
+    writes: int = 0
+    bytes_written: int = 0
+    encode_time: float = 0.0
+    write_time: float = 0.0
+
+    @property
+    def avg_write_ms(self) -> float:
+        return (self.encode_time + self.write_time) / self.writes * 1000 if self.writes else 0.0
+
+
+def message_key(email: EmailContent) -> str:
+    """Message ID of an email, or a fingerprint of sender, subject and body when it has none"""
+    if email.message_id:
+        return email.message_id
+    payload = "\x1f".join((email.sender, email.subject, email.body))
+    return "sha256:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def to_plain(value: Any) -> Any:
+    """Reduce flow values to builtins: CrewOutput keeps only its raw text, models become dicts"""
+    if isinstance(value, CrewOutput):
+        return {_CREW_OUTPUT: value.raw}
+    if isinstance(value, StageOutput):
+        # text is derived from the fields, the error or raw; it is rebuilt on restore
+        return {_STAGE_OUTPUT: (value.raw, to_plain(value.fields), value.error)}
+    if isinstance(value, BaseModel):
+        return to_plain(dict(value))
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
+
+
+def from_plain(value: Any) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and _CREW_OUTPUT in value:
+            return CrewOutput(raw=value[_CREW_OUTPUT])
+        if len(value) == 1 and _STAGE_OUTPUT in value:
+            raw, fields, error = value[_STAGE_OUTPUT]
+            return StageOutput.failed(error) if error is not None else StageOutput.of(raw, fields)
+        return {key: from_plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_plain(item) for item in value]
+    return value
+
+
+class _BuiltinsUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Checkpoints may only contain builtin values, found {module}.{name}")
+
+
+def encode(value: Any) -> bytes:
+    data = pickle.dumps(to_plain(value), protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > _COMPRESS_ABOVE:
+        return _ZLIB + zlib.compress(data, 1)
+    return _RAW + data
+
+
+def decode(blob: bytes) -> Any:
+    data = zlib.decompress(blob[1:]) if blob[:1] == _ZLIB else blob[1:]
+    return from_plain(_BuiltinsUnpickler(io.BytesIO(data)).load())
+
+
+class CheckpointStore:
+    """SQLite table of the latest checkpoint per message, with a lease per processing worker"""
+
+    def __init__(self, path: str, lease: float = 300.0, synchronous: str = "NORMAL"):
+        """
+        Args:
+            path: SQLite file, shared by every worker on the host
+            lease: Seconds a worker may go without writing a checkpoint before
+                another one may take the message over
+            synchronous: SQLite synchronous mode; NORMAL survives process crashes,
+                FULL also power loss at a higher cost per write
+        """
+        self.path = path
+        self.lease = lease
+        self._stats = CheckpointStats()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " message_id TEXT PRIMARY KEY, status TEXT NOT NULL, owner TEXT NOT NULL,"
+            " lease_until REAL NOT NULL, payload BLOB, updated_at REAL NOT NULL)"
+        )
+
+    def load(self, message_id: str) -> Optional[CheckpointRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, owner, payload, updated_at FROM checkpoints WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        return self._record(message_id, row) if row is not None else None
+
+    def claim(self, message_id: str, owner: str) -> Optional[CheckpointRecord]:
+        """
+        Take the lease on a message
+
+        Returns:
+            The existing checkpoint (possibly done), or None for a new message
+
+        Raises:
+            MessageInProgress: Another owner holds an unexpired lease
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT status, owner, payload, updated_at, lease_until FROM checkpoints WHERE message_id = ?",
+                    (message_id,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO checkpoints (message_id, status, owner, lease_until, payload, updated_at)"
+                        " VALUES (?, 'running', ?, ?, NULL, ?)",
+                        (message_id, owner, now + self.lease, now),
+                    )
+                elif row[0] != "done":
+                    if row[1] != owner and row[4] > now:
+                        raise MessageInProgress(f"Message {message_id} is being processed by {row[1]}")
+                    self._conn.execute(
+                        "UPDATE checkpoints SET owner = ?, lease_until = ? WHERE message_id = ?",
+                        (owner, now + self.lease, message_id),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._record(message_id, row) if row is not None else None
+
+    def save(self, message_id: str, owner: str, steps: Dict[str, Any], state: Dict[str, Any],
+             done: bool = False) -> None:
+        """
+        Write the checkpoint and renew the lease
+
+        Raises:
+            LeaseLost: The message is no longer leased to owner
+        """
+        started = time.perf_counter()
+        payload = encode({"steps": steps, "state": state})
+        encoded = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE checkpoints SET status = ?, payload = ?, lease_until = ?, updated_at = ?"
+                " WHERE message_id = ? AND owner = ?",
+                ("done" if done else "running", payload, now + self.lease, now, message_id, owner),
+            )
+            if cursor.rowcount == 0:
+                raise LeaseLost(f"Message {message_id} is no longer leased to {owner}")
+            self._stats.writes += 1
+            self._stats.bytes_written += len(payload)
+            self._stats.encode_time += encoded - started
+            self._stats.write_time += time.perf_counter() - encoded
+
+    def release(self, message_id: str, owner: str) -> None:
+        """Give up the lease so a redelivery can resume at once, e.g. after a failed step"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE checkpoints SET lease_until = 0 WHERE message_id = ? AND owner = ? AND status != 'done'",
+                (message_id, owner),
+            )
+
+    def stats(self) -> CheckpointStats:
+        with self._lock:
+            return self._stats.model_copy()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @staticmethod
+    def _record(message_id: str, row) -> CheckpointRecord:
+        payload = decode(row[2]) if row[2] is not None else {}
+        return CheckpointRecord(message_id=message_id, status=row[0], owner=row[1], updated_at=row[3],
+                                steps=payload.get("steps", {}), state=payload.get("state", {}))
+
+
+class FlowCheckpoint:
+    """Checkpointing of one flow run for one message; the SQLite work runs in worker threads"""
+
+    # State fields that are never restored: the identity of this run and the email as redelivered
+    SKIP_FIELDS = ("id", "email")
+
+    def __init__(self, store: CheckpointStore, message_id: str):
+        self.store = store
+        self.message_id = message_id
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        self.completed: Dict[str, Any] = {}
+        self.record: Optional[CheckpointRecord] = None
+
+    async def begin(self, state: BaseModel) -> Optional[CheckpointRecord]:
+        """Claim the message and restore the state of an interrupted run into state"""
+        self.record = await asyncio.to_thread(self.store.claim, self.message_id, self.owner)
+        if self.record is not None:
+            self.completed = dict(self.record.steps)
+            for name, value in self.record.state.items():
+                if name not in self.SKIP_FIELDS and name in type(state).model_fields:
+                    setattr(state, name, value)
+        return self.record
+
+    async def step_done(self, step: str, result: Any, state: BaseModel) -> None:
+        """Raises LeaseLost when another worker has taken the message over"""
+        self.completed[step] = result
+        await self._save(state)
+
+    async def finish(self, state: BaseModel) -> None:
+        await self._save(state, done=True)
+
+    async def abandon(self) -> None:
+        await asyncio.to_thread(self.store.release, self.message_id, self.owner)
+
+    async def _save(self, state: BaseModel, done: bool = False) -> None:
+        # Snapshot on the loop; other steps may go on changing the state while the thread encodes it
+        fields = {name: getattr(state, name) for name in type(state).model_fields if name not in self.SKIP_FIELDS}
+        await asyncio.to_thread(self.store.save, self.message_id, self.owner, dict(self.completed), fields,
+                                done=done)
+
+
+def checkpointed_step(method: Callable) -> Callable:
+    """
+    Skip a flow step completed by an earlier run of the same message, checkpoint it otherwise
+
+    The flow exposes its FlowCheckpoint (or None) as `message_checkpoint`; apply
+    below @start/@listen/@router.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        checkpoint = self.message_checkpoint
+        if checkpoint is None:
+            return await method(self, *args, **kwargs)
+        if method.__name__ in checkpoint.completed:
+            logger.info(f"Step {method.__name__} already completed for {checkpoint.message_id}, skipping")
+            return checkpoint.completed[method.__name__]
+        result = await method(self, *args, **kwargs)
+        await checkpoint.step_done(method.__name__, result, self.state)
+        return result
+    return wrapper
+
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """Process-wide CheckpointStore at INTENT_CHECKPOINT_PATH, None when unset"""
+    global _store
+    path = os.environ.get("INTENT_CHECKPOINT_PATH")
+    if not path:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CheckpointStore(path, lease=float(os.environ.get("INTENT_CHECKPOINT_LEASE", "300")))
+    return _store
@@ -0,0 +1,108 @@
+import re
+import zlib
+from typing import Iterable, List
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# A greeting line at the top of an email ("Hello,", "Hi John,", "Dear Ms. Smith,")
+_GREETING = re.compile(
+    r"^\s*(?:hello|hi|hey|dear|good (?:morning|afternoon|evening)|greetings)\b[^\n]{0,40}\n",
+    re.IGNORECASE,
+)
+# A sign-off line ("Thanks,", "Best regards, John"); only stripped together with what follows it
+# when that is a short signature at the very end of the body
+_SIGN_OFF = re.compile(
+    r"^(?:thanks|thank you|many thanks|best|best regards|kind regards|regards|cheers|sincerely|"
+    r"all the best|warm regards|sent from my)\b.{0,40}$",
+    re.IGNORECASE,
+)
+# Lines after the sign-off that still count as the signature (name, title, company): a few
+# short ones that are not sentences
+_SIGNATURE_LINES = 3
+_SIGNATURE_WIDTH = 40
+_SENTENCE_END = (".", "?", "!")
+# Stripping that would leave less than this share of the words keeps the body as it is
+_MIN_KEPT = 0.5
+
+
+def strip_boilerplate(text: str) -> str:
+    """
+    Remove the greeting line and the sign-off/signature block of an email body
+
+    The sign-off block is found from the bottom up: sign-off lines and at most a few
+    short signature lines, up to the first line of content. A "Thanks for your reply."
+    above the content is kept. When stripping would remove most of the words, the
+    body is returned unchanged.
+    """
+    original = text.strip()
+    lines = _GREETING.sub("", original + "\n", count=1).strip().split("\n")
+    sign_off = None
+    signature = 0
+    for index in range(len(lines) - 1, -1, -1):
+        line = lines[index].strip()
+        if not line:
+            continue
+        if _SIGN_OFF.match(line):
+            sign_off = index
+        elif len(line) <= _SIGNATURE_WIDTH and not line.endswith(_SENTENCE_END) and signature < _SIGNATURE_LINES:
+            signature += 1
+        else:
+            break
+    stripped = "\n".join(lines[:sign_off]).strip() if sign_off is not None else "\n".join(lines).strip()
+    if len(tokenize(stripped)) < _MIN_KEPT * len(tokenize(original)):
+        return original
+    return stripped
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric word tokens"""
+    return _TOKEN.findall(text.lower())
+
+
+class HashingEmbedder:
+    """
+    CPU-only text embedder based on the hashing trick
+
+    Word unigrams, word bigrams and character trigrams are hashed into a fixed
+    number of signed buckets with sublinear term frequency, then L2-normalized,
+    so the dot product of two embeddings is their cosine similarity. No model
+    download or training is needed and the output is deterministic.
+    """
+
+    def __init__(self, dim: int = 1024, char_ngrams: bool = True):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * (1.0 + np.log(count))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.embed(text)
+        return matrix
+
+    def _features(self, text: str):
+        tokens = tokenize(text)
+        yield from tokens
+        for first, second in zip(tokens, tokens[1:]):
+            yield first + " " + second
+        if self.char_ngrams:
+            for token in tokens:
+                padded = f"<{token}>"
+                for i in range(len(padded) - 2):
+                    yield "#" + padded[i:i + 3]
@@ -0,0 +1,646 @@
+"""
+Per-stage latency, token and cache instrumentation for the intent flow
+
+Every flow step and every IntentCrew task execution is recorded as one
+StageRecord per email. Task records also carry what happened inside crewAI:
+LLM and tool time, token usage and retries. These are collected from the
+crewAI event bus and attributed to the task through a context variable.
+Records go to pluggable sinks: JSONL file, in-memory histogram (which also
+produces the p50/p95/p99 summary report) and Prometheus text format.
+
+With a sink that asks for them (FlowProfiler, services/profiler.py), records
+also carry the timeline inside the stage: every LLM and tool call, the wait
+for a worker thread and the waits recorded by record_wait (scheduler
+admission, agent builds, batch windows).
+
+The process-wide instance is configured from the environment:
+INTENT_METRICS_JSONL and INTENT_METRICS_PROMETHEUS are output paths; the
+in-memory histogram is always attached.
+"""
+import abc
+import asyncio
+import atexit
+import contextvars
+import functools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.services.batch_runner import percentile
+
+logger = logging.getLogger(__name__)
+
+_current_email: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("intent_email_id", default=None)
+_current_stage: contextvars.ContextVar[Optional["StageMetrics"]] = contextvars.ContextVar("intent_stage", default=None)
+
+
+class Span(BaseModel):
+    """One interval inside a stage (epoch seconds): an "llm" or "tool" call, or a "wait" """
+    kind: str
+    name: str = ""
+    start: float
+    end: float
+
+
+class StageRecord(BaseModel):
+    """Measurements of one whole flow run ("flow"), flow step ("step") or task execution ("task") for one email"""
+    email_id: Optional[str] = None
+    stage: str
+    kind: str = "step"
+    started_at: float
+    wall_time: float = 0.0
+    queue_time: float = 0.0
+    llm_time: float = 0.0
+    tool_time: float = 0.0
+    llm_calls: int = 0
+    tool_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_hit: Optional[str] = None
+    retries: int = 0
+    error: Optional[str] = None
+    spans: Optional[List[Span]] = None
+
+    @property
+    def ended_at(self) -> float:
+        return self.started_at + self.wall_time
+
+
+class StageMetrics:
+    """Mutable accumulator of a stage in progress; crewAI event handlers update it from worker threads"""
+
+    def __init__(self, stage: str, kind: str, email_id: Optional[str], detailed: bool = False):
+        self.record = StageRecord(stage=stage, kind=kind, email_id=email_id, started_at=time.time())
+        self.started = time.perf_counter()
+        self.submitted_at: Optional[float] = None
+        self._llm_calls: Dict[str, List[Optional[float]]] = {}
+        self._llm_models: Dict[str, str] = {}
+        # Timeline inside the stage, kept only for a profiler
+        self._spans: Optional[List[Span]] = [] if detailed else None
+        self._lock = threading.Lock()
+
+    def mark_submitted(self) -> None:
+        """The task was handed to crewAI; the time until its crew starts counts as queue time"""
+        self.submitted_at = time.time()
+
+    def crew_started(self, at: float) -> None:
+        with self._lock:
+            if self.submitted_at is not None and self.record.queue_time == 0.0:
+                self.record.queue_time = max(0.0, at - self.submitted_at)
+                if self._spans is not None and at > self.submitted_at:
+                    self._spans.append(Span(kind="wait", name="queue", start=self.submitted_at, end=at))
+
+    def llm_started(self, call_id: str, at: float, model: Optional[str] = None) -> None:
+        with self._lock:
+            self._llm_calls.setdefault(call_id, [None, None])[0] = at
+            if self._spans is not None and model:
+                self._llm_models[call_id] = model
+
+    def llm_finished(self, call_id: str, at: float, usage: Optional[Dict[str, Any]] = None,
+                     failed: bool = False) -> None:
+        with self._lock:
+            self._llm_calls.setdefault(call_id, [None, None])[1] = at
+            if failed:
+                self.record.retries += 1
+            if usage:
+                self.record.prompt_tokens += int(usage.get("prompt_tokens") or usage.get("input_tokens") or 0)
+                self.record.completion_tokens += int(
+                    usage.get("completion_tokens") or usage.get("output_tokens") or 0
+                )
+
+    def tool_finished(self, seconds: float, failed: bool = False, name: str = "", at: float = None) -> None:
+        with self._lock:
+            self.record.tool_calls += 1
+            self.record.tool_time += seconds
+            if failed:
+                self.record.retries += 1
+            if self._spans is not None and at is not None:
+                self._spans.append(Span(kind="tool", name=name, start=at - seconds, end=at))
+
+    def waited(self, name: str, started: float, ended: float) -> None:
+        """A wait inside the stage (epoch seconds); only kept for a profiler"""
+        if self._spans is not None and ended > started:
+            with self._lock:
+                self._spans.append(Span(kind="wait", name=name, start=started, end=ended))
+
+    def retry(self) -> None:
+        with self._lock:
+            self.record.retries += 1
+
+    def cache_hit(self, kind: str) -> None:
+        self.record.cache_hit = kind
+
+    def finish(self, error: Optional[BaseException] = None) -> StageRecord:
+        with self._lock:
+            record = self.record.model_copy()
+            calls = list(self._llm_calls.items())
+            models = dict(self._llm_models)
+            spans = list(self._spans) if self._spans is not None else None
+        record.wall_time = time.perf_counter() - self.started
+        if error is not None:
+            record.error = type(error).__name__
+        # Start and end events of one call are handled on different threads, pair them up here
+        for call_id, (started, finished) in calls:
+            if started is not None and finished is not None:
+                record.llm_calls += 1
+                record.llm_time += max(0.0, finished - started)
+                if spans is not None:
+                    spans.append(Span(kind="llm", name=models.get(call_id, ""), start=started, end=finished))
+        if spans is not None:
+            record.spans = sorted(spans, key=lambda span: span.start)
+        return record
+
+
+def current_stage() -> Optional[StageMetrics]:
+    """Metrics of the innermost stage running in this context, if any"""
+    return _current_stage.get()
+
+
+def current_email_id() -> Optional[str]:
+    """Id of the email whose flow runs in this context, if any"""
+    return _current_email.get()
+
+
+def record_retry() -> None:
+    """Count a retry (e.g. of an HTTP request) against the current stage"""
+    metrics = _current_stage.get()
+    if metrics is not None:
+        metrics.retry()
+
+
+def record_wait(name: str, seconds: float, ended: float = None) -> None:
+    """A wait of the current stage, by default one that just ended (scheduler admission, agent build, batch window)"""
+    metrics = _current_stage.get()
+    if metrics is not None and seconds > 0:
+        ended = time.time() if ended is None else ended
+        metrics.waited(name, ended - seconds, ended)
+
+
+class MetricsSink(abc.ABC):
+    """Destination for finished stage records"""
+
+    @abc.abstractmethod
+    def emit(self, record: StageRecord) -> None:
+        """Called on the event loop for every finished stage; must not block"""
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlSink(MetricsSink):
+    """
+    Appends one JSON line per record
+
+    Like the log pipeline (services/structured_logging.py), emit only puts the
+    record into a bounded queue; a writer thread serializes, writes and
+    flushes. A full queue drops records (counted in dropped) rather than
+    stalling the flows.
+    """
+
+    def __init__(self, path: str, queue_size: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._file = open(path, "a", encoding="utf-8")
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._write, name="metrics-jsonl", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: StageRecord) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            self._file.write(record.model_dump_json(exclude={"spans"} if record.spans is None else None) + "\n")
+            # One flush per burst of records instead of one per record
+            if self._queue.empty():
+                self._file.flush()
+        self._file.flush()
+
+    def close(self) -> None:
+        """Write out what is still queued and close the file"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._file.close()
+        if self.dropped:
+            logger.warning(f"Metrics queue was full: {self.dropped} records not written to {self.path}")
+
+
+_KIND_ORDER = {"flow": 0, "step": 1, "task": 2}
+
+
+class StageSummary(BaseModel):
+    """Aggregate of all records of one stage"""
+    stage: str
+    kind: str
+    count: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+    wall_p50: float = 0.0
+    wall_p95: float = 0.0
+    wall_p99: float = 0.0
+    queue_avg: float = 0.0
+    llm_avg: float = 0.0
+    tool_avg: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class HistogramSink(MetricsSink):
+    """
+    In-memory per-stage distributions
+
+    Keeps at most max_samples wall times per stage (reservoir sampling) for
+    the percentiles; counters and totals are exact.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._stages: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record: StageRecord) -> None:
+        with self._lock:
+            stage = self._stages.setdefault((record.kind, record.stage), {
+                "samples": [], "count": 0, "errors": 0, "cache_hits": 0, "retries": 0,
+                "queue": 0.0, "llm": 0.0, "tool": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            stage["count"] += 1
+            if len(stage["samples"]) < self.max_samples:
+                stage["samples"].append(record.wall_time)
+            else:
+                slot = random.randrange(stage["count"])
+                if slot < self.max_samples:
+                    stage["samples"][slot] = record.wall_time
+            stage["errors"] += record.error is not None
+            stage["cache_hits"] += record.cache_hit is not None
+            stage["retries"] += record.retries
+            stage["queue"] += record.queue_time
+            stage["llm"] += record.llm_time
+            stage["tool"] += record.tool_time
+            stage["prompt_tokens"] += record.prompt_tokens
+            stage["completion_tokens"] += record.completion_tokens
+
+    def summary(self) -> List[StageSummary]:
+        """One summary per stage: flow, then steps, then tasks, each in order of first appearance"""
+        with self._lock:
+            items = [(key, dict(stage, samples=list(stage["samples"]))) for key, stage in self._stages.items()]
+        summaries = []
+        for (kind, name), stage in sorted(items, key=lambda item: _KIND_ORDER.get(item[0][0], len(_KIND_ORDER))):
+            count = stage["count"]
+            summaries.append(StageSummary(
+                stage=name,
+                kind=kind,
+                count=count,
+                errors=stage["errors"],
+                cache_hits=stage["cache_hits"],
+                retries=stage["retries"],
+                wall_p50=percentile(stage["samples"], 50),
+                wall_p95=percentile(stage["samples"], 95),
+                wall_p99=percentile(stage["samples"], 99),
+                queue_avg=stage["queue"] / count,
+                llm_avg=stage["llm"] / count,
+                tool_avg=stage["tool"] / count,
+                prompt_tokens=stage["prompt_tokens"],
+                completion_tokens=stage["completion_tokens"],
+            ))
+        return summaries
+
+    def report(self) -> str:
+        return format_report(self.summary())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+def format_report(summaries: Iterable[StageSummary]) -> str:
+    """Plain-text table of per-stage percentiles (milliseconds) and totals"""
+    header = (f"{'kind':<5} {'stage':<36} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} "
+              f"{'queue':>8} {'llm':>8} {'tool':>8} {'tok in':>8} {'tok out':>8} {'cache':>6} {'retry':>6} {'err':>4}")
+    lines = [header, "-" * len(header)]
+    for s in summaries:
+        lines.append(
+            f"{s.kind:<5} {s.stage:<36} {s.count:>6} {s.wall_p50 * 1000:>9.1f} {s.wall_p95 * 1000:>9.1f} "
+            f"{s.wall_p99 * 1000:>9.1f} {s.queue_avg * 1000:>8.1f} {s.llm_avg * 1000:>8.1f} "
+            f"{s.tool_avg * 1000:>8.1f} {s.prompt_tokens:>8} {s.completion_tokens:>8} {s.cache_hits:>6} "
+            f"{s.retries:>6} {s.errors:>4}"
+        )
+    return "\n".join(lines)
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Cumulative metrics in the Prometheus text exposition format
+
+    render() returns the current exposition; with a path the file is
+    rewritten atomically every write_interval seconds and on close, for a
+    node_exporter textfile collector.
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    # Record field -> counter metric name (without prefix)
+    COUNTERS = {
+        "queue_time": "stage_queue_seconds_total",
+        "llm_time": "stage_llm_seconds_total",
+        "tool_time": "stage_tool_seconds_total",
+        "prompt_tokens": "stage_prompt_tokens_total",
+        "completion_tokens": "stage_completion_tokens_total",
+        "retries": "stage_retries_total",
+        "errors": "stage_errors_total",
+        "cache_hits": "stage_cache_hits_total",
+    }
+
+    def __init__(self, path: Optional[str] = None, buckets: Iterable[float] = DEFAULT_BUCKETS,
+                 prefix: str = "intent_flow", write_interval: float = 10.0):
+        self.path = path
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self.write_interval = write_interval
+        self._histograms: Dict[Tuple[str, str], List[float]] = {}
+        self._counters: Dict[Tuple[str, str, str], float] = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def emit(self, record: StageRecord) -> None:
+        key = (record.kind, record.stage)
+        with self._lock:
+            # Per-bucket counts, then sum and count
+            histogram = self._histograms.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if record.wall_time <= bound:
+                    histogram[i] += 1
+            histogram[-2] += record.wall_time
+            histogram[-1] += 1
+            for name in self.COUNTERS:
+                if name == "errors":
+                    value = record.error is not None
+                elif name == "cache_hits":
+                    value = record.cache_hit is not None
+                else:
+                    value = getattr(record, name)
+                self._counters[key + (name,)] = self._counters.get(key + (name,), 0.0) + value
+        if self.path and time.monotonic() - self._last_write >= self.write_interval:
+            self.write()
+
+    def render(self) -> str:
+        p = self.prefix
+        with self._lock:
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = [f"# HELP {p}_stage_seconds Wall time of flow steps and crew tasks",
+                 f"# TYPE {p}_stage_seconds histogram"]
+        for (kind, stage), values in sorted(histograms.items()):
+            labels = f'kind="{kind}",stage="{stage}"'
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{p}_stage_seconds_bucket{{{labels},le="{bound}"}} {count:g}')
+            lines.append(f'{p}_stage_seconds_bucket{{{labels},le="+Inf"}} {values[-1]:g}')
+            lines.append(f"{p}_stage_seconds_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"{p}_stage_seconds_count{{{labels}}} {values[-1]:g}")
+        for name, suffix in self.COUNTERS.items():
+            metric = f"{p}_{suffix}"
+            lines.append(f"# TYPE {metric} counter")
+            for (kind, stage, counter), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f'{metric}{{kind="{kind}",stage="{stage}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        self._last_write = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        if self.path:
+            self.write()
+
+
+class Instrumentation:
+    """Records flow steps and crew tasks as StageRecords and fans them out to the sinks"""
+
+    def __init__(self, sinks: Iterable[MetricsSink] = ()):
+        self.sinks: List[MetricsSink] = list(sinks)
+        _install_event_handlers()
+
+    @property
+    def detailed(self) -> bool:
+        """Whether a sink wants the timeline inside every stage (StageRecord.spans)"""
+        return any(getattr(sink, "wants_spans", False) for sink in self.sinks)
+
+    def add_sink(self, sink: MetricsSink) -> None:
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink: MetricsSink) -> None:
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
+    @asynccontextmanager
+    async def stage(self, name: str, kind: str = "step") -> AsyncIterator[StageMetrics]:
+        """Measure the enclosed block as one stage of the current email"""
+        metrics = StageMetrics(name, kind, _current_email.get(), detailed=self.detailed)
+        token = _current_stage.set(metrics)
+        error = None
+        try:
+            yield metrics
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_stage.reset(token)
+            self.emit(metrics.finish(error))
+
+    @asynccontextmanager
+    async def email(self, email_id: str) -> AsyncIterator[None]:
+        """Attribute every stage recorded in the enclosed block to one email"""
+        token = _current_email.set(email_id)
+        try:
+            yield
+        finally:
+            _current_email.reset(token)
+
+    def emit(self, record: StageRecord) -> None:
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                logger.warning(f"Metrics sink {type(sink).__name__} failed: {e}")
+
+    def histogram(self) -> Optional[HistogramSink]:
+        return next((sink for sink in self.sinks if isinstance(sink, HistogramSink)), None)
+
+    def report(self) -> str:
+        """p50/p95/p99 per stage from the attached histogram sink"""
+        histogram = self.histogram()
+        return histogram.report() if histogram is not None else "No histogram sink attached"
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+
+class EventLoopLagMonitor:
+    """
+    Measures event loop responsiveness
+
+    A background task sleeps for interval seconds and records how much later
+    than requested it wakes up; sustained lag means something blocks the loop.
+    A wake-up later than stall_threshold is also passed to on_stall as the
+    (start, end) epoch seconds of the stall.
+    """
+
+    def __init__(self, interval: float = 0.01, stall_threshold: float = None,
+                 on_stall: Callable[[float, float], None] = None):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.on_stall = on_stall
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples.append(lag)
+            if self.on_stall is not None and self.stall_threshold is not None and lag >= self.stall_threshold:
+                ended = time.time()
+                self.on_stall(ended - lag, ended)
+
+    def stats(self) -> Dict[str, float]:
+        """Lag percentiles and maximum in seconds"""
+        return {
+            "samples": len(self.samples),
+            "p50": percentile(self.samples, 50),
+            "p95": percentile(self.samples, 95),
+            "p99": percentile(self.samples, 99),
+            "max": max(self.samples, default=0.0),
+        }
+
+
+def instrumented_step(method: Callable) -> Callable:
+    """Record an async flow step method as a stage; apply below @start/@listen/@router"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        async with get_instrumentation().stage(method.__name__, kind="step"):
+            return await method(self, *args, **kwargs)
+    return wrapper
+
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_lock = threading.Lock()
+
+
+def get_instrumentation() -> Instrumentation:
+    """Process-wide instrumentation with sinks configured from the environment"""
+    global _instrumentation
+    if _instrumentation is None:
+        with _instrumentation_lock:
+            if _instrumentation is None:
+                sinks: List[MetricsSink] = [HistogramSink()]
+                if os.environ.get("INTENT_METRICS_JSONL"):
+                    sinks.append(JsonlSink(os.environ["INTENT_METRICS_JSONL"]))
+                if os.environ.get("INTENT_METRICS_PROMETHEUS"):
+                    sinks.append(PrometheusSink(os.environ["INTENT_METRICS_PROMETHEUS"]))
+                _instrumentation = Instrumentation(sinks)
+    return _instrumentation
+
+
+@atexit.register
+def _close_at_exit() -> None:
+    # Writes out what the JSONL sink still has queued
+    if _instrumentation is not None:
+        _instrumentation.close()
+
+
+_handlers_installed = False
+_handlers_lock = threading.Lock()
+
+
+def _timestamp(value: Any) -> float:
+    return value.timestamp() if isinstance(value, datetime) else time.time()
+
+
+def _install_event_handlers() -> None:
+    """
+    Feed crewAI LLM, tool and crew events into the stage running in their context
+
+    crewAI runs handlers on its own thread pool with a copy of the emitting
+    context, so _current_stage resolves to the task that made the call and
+    event timestamps, not handler run times, are used for durations.
+    """
+    global _handlers_installed
+    with _handlers_lock:
+        if _handlers_installed:
+            return
+        _handlers_installed = True
+
+    from crewai.events import crewai_event_bus
+    from crewai.events.types.crew_events import CrewKickoffStartedEvent
+    from crewai.events.types.llm_events import LLMCallCompletedEvent, LLMCallFailedEvent, LLMCallStartedEvent
+    from crewai.events.types.tool_usage_events import ToolUsageErrorEvent, ToolUsageFinishedEvent
+
+    @crewai_event_bus.on(CrewKickoffStartedEvent)
+    def _on_crew_started(source, event):
+        metrics = _current_stage.get()
+        if metrics is not None:
+            metrics.crew_started(_timestamp(event.timestamp))
+
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def _on_llm_started(source, event):
+        metrics = _current_stage.get()
+        if metrics is not None:
+            metrics.llm_started(event.call_id, _timestamp(event.timestamp), event.model)
+
+    @crewai_event_bus.on(LLMCallCompletedEvent)
+    def _on_llm_completed(source, event):
+        metrics = _current_stage.get()
+        if metrics is not None:
+            metrics.llm_finished(event.call_id, _timestamp(event.timestamp), event.usage)
+
+    @crewai_event_bus.on(LLMCallFailedEvent)
+    def _on_llm_failed(source, event):
+        metrics = _current_stage.get()
+        if metrics is not None:
+            metrics.llm_finished(event.call_id, _timestamp(event.timestamp), failed=True)
+
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def _on_tool_finished(source, event):
+        metrics = _current_stage.get()
+        if metrics is not None:
+            metrics.tool_finished(_timestamp(event.finished_at) - _timestamp(event.started_at),
+                                  name=event.tool_name, at=_timestamp(event.finished_at))
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def _on_tool_error(source, event):
+        metrics = _current_stage.get()
+        if metrics is not None:
+            metrics.tool_finished(0.0, failed=True)
@@ -0,0 +1,348 @@
+"""
+Email job sources for the worker service
+
+A JobSource yields Jobs (an email plus its delivery identity) only as fast as
+the worker asks for them, and is told the outcome of every job:
+
+- JsonlSource: JSONL files or directories of them, optionally followed like
+  `tail -f` for new lines and files; records may use the email fields
+  (subject, body, sender, message_id) or the title/body/request_id layout of
+  requests.jsonl
+- QueueSource: a SQLiteJobQueue shared by any number of worker processes on
+  the host; jobs are leased, the lease is renewed while the flow runs, and a
+  job whose worker died is handed out again once its lease expires
+"""
+import abc
+import asyncio
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.models.email import EmailContent
+
+logger = logging.getLogger(__name__)
+
+
+class Job(BaseModel):
+    """One email to process"""
+    id: str
+    email: EmailContent
+    attempts: int = 1
+
+
+class JobResult(BaseModel):
+    """Final outcome of a queued job"""
+    id: str
+    email: EmailContent
+    status: str
+    attempts: int
+    result: Any = None
+    error: Optional[str] = None
+
+
+def email_from_record(record: dict) -> EmailContent:
+    """EmailContent from a JSON record in email or requests.jsonl (title/body/request_id) layout"""
+    return EmailContent(
+        subject=str(record.get("subject", record.get("title", ""))),
+        body=str(record.get("body", "")),
+        sender=str(record.get("sender", record.get("from", "unknown"))),
+        message_id=record.get("message_id") or record.get("request_id") or record.get("id"),
+    )
+
+
+class JobSource(abc.ABC):
+    """Base class of job sources; ack and nack are no-ops for sources without delivery tracking"""
+
+    @abc.abstractmethod
+    def jobs(self, stop: asyncio.Event) -> AsyncIterator[Job]:
+        """Jobs until the source is exhausted or stop is set"""
+
+    async def ack(self, job: Job, result: Any = None) -> None:
+        """The job was processed; result is JSON-friendly"""
+
+    async def nack(self, job: Job, error: str) -> None:
+        """The job failed"""
+
+    async def close(self) -> None:
+        """Give back jobs handed out but not acknowledged"""
+
+
+async def _wait(stop: asyncio.Event, timeout: float) -> None:
+    """Sleep for timeout, waking up early when stop is set"""
+    try:
+        await asyncio.wait_for(stop.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+class JsonlSource(JobSource):
+    """Emails from JSONL files and directories of *.jsonl files, read in name order"""
+
+    def __init__(self, paths: Iterable[str], follow: bool = False, poll_interval: float = 1.0):
+        """
+        Args:
+            paths: Files or directories
+            follow: Keep waiting for lines appended to the files and new files in the directories
+            poll_interval: Seconds between checks for new data in follow mode
+        """
+        self.paths = list(paths)
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self._offsets: Dict[str, int] = {}
+        self._lines: Dict[str, int] = {}
+
+    def _files(self) -> List[str]:
+        files = []
+        for path in self.paths:
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path])
+        return files
+
+    def _read_new(self, path: str) -> List[Job]:
+        """Complete lines appended since the last read"""
+        jobs = []
+        with open(path, "rb") as f:
+            f.seek(self._offsets.get(path, 0))
+            data = f.read()
+        end = data.rfind(b"\n") + 1 if self.follow else len(data)  # a partial last line may still be written
+        line_number = self._lines.get(path, 0)
+        for line in data[:end].splitlines():
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                email = email_from_record(json.loads(line))
+            except (ValueError, AttributeError) as e:
+                # Skipped for good: the offset moves past it, so a restart does not trip over it again
+                logger.warning("Skipping malformed job record %s:%d: %s", path, line_number, e)
+                continue
+            jobs.append(Job(id=f"{path}:{line_number}", email=email))
+        self._offsets[path] = self._offsets.get(path, 0) + end
+        self._lines[path] = line_number
+        return jobs
+
+    async def jobs(self, stop: asyncio.Event) -> AsyncIterator[Job]:
+        while not stop.is_set():
+            found = False
+            for path in self._files():
+                if not os.path.exists(path):
+                    continue
+                for job in self._read_new(path):
+                    found = True
+                    if stop.is_set():
+                        return
+                    yield job
+            if not self.follow:
+                return
+            if not found:
+                await _wait(stop, self.poll_interval)
+
+
+class QueueStats(BaseModel):
+    """Jobs per status"""
+    ready: int = 0
+    leased: int = 0
+    done: int = 0
+    failed: int = 0
+
+
+class SQLiteJobQueue:
+    """
+    Persistent job queue in one SQLite file with lease/ack semantics
+
+    lease() atomically hands out the oldest ready jobs (and jobs whose lease
+    expired) to one owner; the owner acks or nacks them, or renews the lease
+    with extend() while it is still working on them. A job is retried until it
+    failed max_attempts times.
+    """
+
+    def __init__(self, path: str, lease: float = 120.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_time = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, lease_until REAL NOT NULL DEFAULT 0,"
+            " error TEXT, result TEXT, enqueued_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until)")
+
+    def put(self, emails: Iterable[EmailContent]) -> List[str]:
+        """Enqueue emails, returns their job IDs"""
+        now = time.time()
+        ids = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for email in emails:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (payload, status, enqueued_at, updated_at) VALUES (?, 'ready', ?, ?)",
+                    (email.model_dump_json(), now, now),
+                )
+                ids.append(str(cursor.lastrowid))
+            self._conn.execute("COMMIT")
+        return ids
+
+    def lease(self, owner: str, limit: int = 1) -> List[Job]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A job whose worker kept dying while processing it is given up
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'lease expired', updated_at = ?"
+                    " WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                rows = self._conn.execute(
+                    "SELECT id, payload, attempts FROM jobs"
+                    " WHERE status = 'ready' OR (status = 'leased' AND lease_until < ?) ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1,"
+                    " updated_at = ? WHERE id = ?",
+                    [(owner, now + self.lease_time, now, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [Job(id=str(row[0]), email=EmailContent.model_validate_json(row[1]), attempts=row[2] + 1)
+                for row in rows]
+
+    def extend(self, job_ids: Iterable[str], owner: str) -> None:
+        """Renew the lease of jobs still being processed"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                [(now + self.lease_time, now, int(job_id), owner) for job_id in job_ids],
+            )
+
+    def ack(self, job_id: str, owner: str, result: Any = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', error = NULL, result = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (json.dumps(result, ensure_ascii=False, default=str), time.time(), int(job_id), owner),
+            )
+
+    def nack(self, job_id: str, owner: str, error: str = None) -> None:
+        """Record a failure: the job is retried, or marked failed after max_attempts"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'ready' END,"
+                " error = ?, lease_until = 0, updated_at = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), int(job_id), owner),
+            )
+
+    def release(self, job_ids: Iterable[str], owner: str) -> None:
+        """Return unfinished jobs to the queue without counting an attempt (shutdown)"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'ready', attempts = attempts - 1, lease_until = 0, updated_at = ?"
+                " WHERE id = ? AND owner = ? AND status = 'leased'",
+                [(now, int(job_id), owner) for job_id in job_ids],
+            )
+
+    def requeue_owner(self, owner: str, error: str) -> int:
+        """Hand out the jobs of a dead or stalled worker again right away; returns how many"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'ready' END,"
+                " error = ?, lease_until = 0, updated_at = ? WHERE owner = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), owner),
+            )
+            return cursor.rowcount
+
+    def results(self, job_ids: Iterable[str]) -> List[JobResult]:
+        """Outcome of the given jobs in the given order (status ready/leased while unfinished)"""
+        ids = [int(job_id) for job_id in job_ids]
+        rows = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows.update((row[0], row) for row in self._conn.execute(
+                    f"SELECT id, payload, status, attempts, result, error FROM jobs"
+                    f" WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ))
+        return [
+            JobResult(id=str(row[0]), email=EmailContent.model_validate_json(row[1]), status=row[2],
+                      attempts=row[3], result=json.loads(row[4]) if row[4] else None, error=row[5])
+            for row in (rows[job_id] for job_id in ids if job_id in rows)
+        ]
+
+    def stats(self) -> QueueStats:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return QueueStats(**dict(rows))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class QueueSource(JobSource):
+    """Jobs leased from a SQLiteJobQueue, with the leases of in-flight jobs renewed in the background"""
+
+    def __init__(self, queue: SQLiteJobQueue, owner: str, poll_interval: float = 0.5, wait_for_jobs: bool = True):
+        """
+        Args:
+            queue: Shared queue
+            owner: Unique name of this worker, e.g. host:pid
+            poll_interval: Seconds between polls of an empty queue
+            wait_for_jobs: Keep polling an empty queue instead of finishing
+        """
+        self.queue = queue
+        self.owner = owner
+        self.poll_interval = poll_interval
+        self.wait_for_jobs = wait_for_jobs
+        self._in_flight: Dict[str, Job] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def jobs(self, stop: asyncio.Event) -> AsyncIterator[Job]:
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._renew_leases())
+        while not stop.is_set():
+            # One job per request keeps leases only on jobs that can start right away
+            leased = await asyncio.to_thread(self.queue.lease, self.owner, 1)
+            if not leased:
+                if not self.wait_for_jobs:
+                    return
+                await _wait(stop, self.poll_interval)
+                continue
+            job = leased[0]
+            self._in_flight[job.id] = job
+            yield job
+
+    async def ack(self, job: Job, result: Any = None) -> None:
+        self._in_flight.pop(job.id, None)
+        await asyncio.to_thread(self.queue.ack, job.id, self.owner, result)
+
+    async def nack(self, job: Job, error: str) -> None:
+        self._in_flight.pop(job.id, None)
+        await asyncio.to_thread(self.queue.nack, job.id, self.owner, error)
+
+    async def close(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self._in_flight:
+            await asyncio.to_thread(self.queue.release, list(self._in_flight), self.owner)
+            self._in_flight.clear()
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease_time / 3)
+            if self._in_flight:
+                await asyncio.to_thread(self.queue.extend, list(self._in_flight), self.owner)
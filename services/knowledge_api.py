@@ -1,40 +1,150 @@
-from typing import Dict, List, Any
+import logging
+import os
+import threading
+from typing import Dict, List, Any, Optional
+
+from intent_not_identified_flow.services.embeddings import HashingEmbedder
+from intent_not_identified_flow.services.search_index import BM25Index, Document, load_corpus
+from intent_not_identified_flow.services.vector_store import EmbeddingStore, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ("lexical", "dense", "hybrid")
+
+# Built-in corpus used when no corpus path is configured
+DEFAULT_DOCUMENTS = [
+    Document(
+        id="product-information",
+        title="Product Information",
+        content="Our product is a comprehensive customer service solution that combines AI-driven analytics with human-centered design. It features a unified dashboard, real-time data processing, custom reporting tools, and seamless integration with existing systems."
+    ),
+    Document(
+        id="pricing-structure",
+        title="Pricing Structure",
+        content="We offer three tiers of service: Basic ($49/month), Professional ($99/month), and Enterprise (custom pricing). Each tier includes different feature sets and support levels to accommodate businesses of all sizes."
+    ),
+    Document(
+        id="common-applications",
+        title="Common Applications",
+        content="Our solution is commonly used for customer service management, data analytics, workflow optimization, and compliance tracking. It's particularly popular in retail, healthcare, finance, and technology sectors."
+    ),
+    Document(
+        id="implementation-process",
+        title="Implementation Process",
+        content="Our standard implementation process takes 2-4 weeks and includes system integration, data migration, customization, and staff training. We provide dedicated support throughout the entire process."
+    ),
+]
+
 
 class KnowledgeAPI:
-    """Mock API service for knowledge retrieval"""
-    
-    def search(self, query: str) -> List[Dict[str, Any]]:
+    """Knowledge retrieval service backed by a local BM25 index and optional dense vectors"""
+
+    def __init__(
+        self,
+        corpus_path: Optional[str] = None,
+        index_path: Optional[str] = None,
+        top_k: int = 5,
+        min_score: float = 0.0,
+        mode: Optional[str] = None,
+        vector_store_path: Optional[str] = None,
+    ):
         """
-        Mock API that returns knowledge base results
-        
+        Args:
+            corpus_path: JSONL file or directory of documents (KNOWLEDGE_CORPUS_PATH,
+                defaults to the built-in documents)
+            index_path: Directory of a persisted index (KNOWLEDGE_INDEX_PATH); it is
+                loaded if present, otherwise built from the corpus and saved there
+            top_k: Default maximum number of results per search
+            min_score: Default minimum BM25 score of a result (lexical mode only)
+            mode: "lexical" (BM25), "dense" (embeddings) or "hybrid" (both fused with
+                reciprocal rank fusion); KNOWLEDGE_SEARCH_MODE, defaults to lexical
+            vector_store_path: Directory of a prebuilt embedding store
+                (KNOWLEDGE_VECTOR_STORE_PATH); without it dense vectors are computed
+                in memory on first use
+        """
+        corpus_path = corpus_path or os.environ.get("KNOWLEDGE_CORPUS_PATH")
+        index_path = index_path or os.environ.get("KNOWLEDGE_INDEX_PATH")
+        self.top_k = top_k
+        self.min_score = min_score
+        self.mode = mode or os.environ.get("KNOWLEDGE_SEARCH_MODE", "lexical")
+        if self.mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {self.mode}")
+        self.vector_store_path = vector_store_path or os.environ.get("KNOWLEDGE_VECTOR_STORE_PATH")
+        self._store = None
+        self._store_positions = None
+        self._embedder = None
+        # The knowledge client searches from worker threads; the store is loaded once
+        self._store_lock = threading.Lock()
+
+        if index_path and BM25Index.exists(index_path):
+            self.index = BM25Index.load(index_path)
+        else:
+            documents = load_corpus(corpus_path) if corpus_path else DEFAULT_DOCUMENTS
+            self.index = BM25Index().build(documents)
+            if index_path:
+                self.index.save(index_path)
+
+    def search(self, query: str, top_k: Optional[int] = None, min_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Search the knowledge base
+
         Args:
             query: The search query string
-            
+            top_k: Maximum number of results (defaults to the instance setting)
+            min_score: Minimum relevance score - BM25, cosine or fused RRF score
+                depending on the mode (defaults to the instance setting in lexical mode)
+
         Returns:
-            List of search results with title and content
+            List of search results with id, title, content and relevance score, best first
         """
-        print(f"Searching knowledge base for: {query}")
-        
-        # Mock data - in production, replace with actual API integration
-        results = [
-            {
-                "title": "Product Information", 
-                "content": "Our product is a comprehensive customer service solution that combines AI-driven analytics with human-centered design. It features a unified dashboard, real-time data processing, custom reporting tools, and seamless integration with existing systems."
-            },
-            {
-                "title": "Pricing Structure", 
-                "content": "We offer three tiers of service: Basic ($49/month), Professional ($99/month), and Enterprise (custom pricing). Each tier includes different feature sets and support levels to accommodate businesses of all sizes."
-            },
-            {
-                "title": "Common Applications", 
-                "content": "Our solution is commonly used for customer service management, data analytics, workflow optimization, and compliance tracking. It's particularly popular in retail, healthcare, finance, and technology sectors."
-            },
+        logger.debug("Searching knowledge base for: %s", query)
+
+        top_k = self.top_k if top_k is None else top_k
+        if self.mode == "lexical":
+            hits = self.index.search(query, top_k=top_k,
+                                     min_score=self.min_score if min_score is None else min_score)
+        elif self.mode == "dense":
+            hits = self._dense_search(query, top_k)
+            if min_score is not None:
+                hits = [(doc, score) for doc, score in hits if score >= min_score]
+        else:
+            # Fuse deeper candidate lists than requested, so documents ranked
+            # moderately by both retrievers can surface
+            depth = max(top_k * 4, 20)
+            lexical = [doc for doc, _ in self.index.search(query, top_k=depth)]
+            dense = [doc for doc, _ in self._dense_search(query, depth)]
+            hits = reciprocal_rank_fusion([lexical, dense])[:top_k]
+            if min_score is not None:
+                hits = [(doc, score) for doc, score in hits if score >= min_score]
+
+        return [
             {
-                "title": "Implementation Process", 
-                "content": "Our standard implementation process takes 2-4 weeks and includes system integration, data migration, customization, and staff training. We provide dedicated support throughout the entire process."
+                "id": self.index.documents[doc_id].id,
+                "title": self.index.documents[doc_id].title,
+                "content": self.index.documents[doc_id].content,
+                "score": round(score, 4),
             }
+            for doc_id, score in hits
         ]
-        
-        # Filter results based on the query if needed
-        # In a real implementation, this would use actual search logic
-        return results
\ No newline at end of file
+
+    def _dense_search(self, query: str, top_k: int):
+        """Embedding search, mapped back to positions in the lexical index"""
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._load_store()
+
+        hits = self._store.search(self._embedder.embed(query), top_k=top_k)
+        return [(self._store_positions[row], score) for row, score in hits if self._store_positions[row] >= 0]
+
+    def _load_store(self) -> None:
+        if self.vector_store_path and EmbeddingStore.exists(self.vector_store_path):
+            store = EmbeddingStore.open(self.vector_store_path)
+            self._embedder = HashingEmbedder(dim=store.dim)
+        else:
+            self._embedder = HashingEmbedder()
+            store = EmbeddingStore.from_documents(self.index.documents, self._embedder)
+        positions = {document.id: i for i, document in enumerate(self.index.documents)}
+        self._store_positions = [positions.get(doc_id, -1) for doc_id in store.ids]
+        # Published last: a thread that sees the store also sees its embedder and positions
+        self._store = store
@@ -0,0 +1,226 @@
+import abc
+import asyncio
+import concurrent.futures
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from intent_not_identified_flow.services.instrumentation import record_retry
+from intent_not_identified_flow.services.knowledge_api import KnowledgeAPI
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def format_results(results: List[Dict[str, Any]], max_chars: int = 600) -> str:
+    """
+    Serialize search results into compact prompt text
+
+    Args:
+        results: Search results with title, content and optionally score
+        max_chars: Maximum characters of content kept per result
+
+    Returns:
+        One numbered block per result, or a short notice when nothing was found
+    """
+    if not results:
+        return "No matching knowledge base entries."
+    blocks = []
+    for i, result in enumerate(results, 1):
+        content = _WHITESPACE.sub(" ", result.get("content", "")).strip()
+        if len(content) > max_chars:
+            content = content[:max_chars].rsplit(" ", 1)[0] + " ..."
+        blocks.append(f"[{i}] {result.get('title', 'Untitled')}\n{content}")
+    return "\n\n".join(blocks)
+
+
+class KnowledgeClient(abc.ABC):
+    """
+    Async knowledge base client with a TTL cache and request coalescing
+
+    Identical queries that arrive while a request is already in flight share
+    its result instead of issuing another request. Subclasses implement
+    _fetch; an instance belongs to the event loop it is first used on.
+    """
+
+    def __init__(self, cache_ttl: float = 300.0, cache_size: int = 1024):
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[str, int], int] = {}
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    async def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Search results for a query, served from cache or a shared in-flight request when possible"""
+        key = (_WHITESPACE.sub(" ", query).strip().lower(), top_k)
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] <= self.cache_ttl:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached[1]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.requests += 1
+            task = asyncio.ensure_future(self._fetch_and_cache(key, query, top_k))
+            self._in_flight[key] = task
+            self._waiters[key] = 0
+        else:
+            self.coalesced += 1
+        # Every caller waits through shield: a caller that is cancelled leaves the request
+        # running for the others, and only the last one to leave cancels it
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._in_flight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 or task.done():
+                    del self._in_flight[key]
+                    del self._waiters[key]
+                    task.cancel()
+
+    async def _fetch_and_cache(self, key: Tuple[str, int], query: str, top_k: int) -> List[Dict[str, Any]]:
+        results = await self._fetch(query, top_k)
+        self._cache[key] = (time.monotonic(), results)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    @abc.abstractmethod
+    async def _fetch(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Search results of one request to the knowledge base"""
+
+    async def aclose(self) -> None:
+        pass
+
+
+class LocalKnowledgeClient(KnowledgeClient):
+    """Client for an in-process KnowledgeAPI, shared instead of rebuilt per call"""
+
+    def __init__(self, api: KnowledgeAPI = None, **kwargs):
+        super().__init__(**kwargs)
+        self.api = api or KnowledgeAPI()
+
+    async def _fetch(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        # BM25 scoring is synchronous CPU work; off the loop, concurrent lookups overlap
+        return await asyncio.to_thread(self.api.search, query, top_k=top_k)
+
+
+class HttpKnowledgeClient(KnowledgeClient):
+    """Client for a knowledge base HTTP service (GET /search?q=...&top_k=...)"""
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 5.0,
+        retries: int = 3,
+        backoff: float = 0.2,
+        max_connections: int = 20,
+        **kwargs,
+    ):
+        """
+        Args:
+            base_url: Service root URL, e.g. http://localhost:8765
+            timeout: Per-request timeout in seconds
+            retries: Retries after the first attempt on timeouts, connection errors and 5xx
+            backoff: Base delay of the exponential backoff between retries (with jitter)
+            max_connections: Size of the keep-alive connection pool
+        """
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _fetch(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._client.get("/search", params={"q": query, "top_k": top_k})
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()["results"]
+                error = httpx.HTTPStatusError(f"Server error {response.status_code}",
+                                              request=response.request, response=response)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = e
+            if attempt == self.retries:
+                raise error
+            delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"Knowledge API request failed ({error}), retrying in {delay:.2f}s")
+            record_retry()
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class _ClientRuntime:
+    """Background event loop that owns the process-wide client and its connection pool"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="knowledge-client", daemon=True).start()
+        url = os.environ.get("KNOWLEDGE_API_URL")
+        self.client = HttpKnowledgeClient(url) if url else LocalKnowledgeClient()
+
+
+_runtime: Optional[_ClientRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def _get_runtime() -> _ClientRuntime:
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = _ClientRuntime()
+    return _runtime
+
+
+def get_knowledge_client() -> KnowledgeClient:
+    """Process-wide client: HTTP when KNOWLEDGE_API_URL is set, in-process KnowledgeAPI otherwise"""
+    return _get_runtime().client
+
+
+async def search_knowledge_base(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """Search from any event loop without blocking it"""
+    runtime = _get_runtime()
+    return await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(runtime.client.search(query, top_k), runtime.loop)
+    )
+
+
+def search_knowledge_base_sync(query: str, top_k: int = 5, timeout: float = 30.0) -> List[Dict[str, Any]]:
+    """Search from synchronous code (e.g. tools running in crewAI worker threads)"""
+    runtime = _get_runtime()
+    future = asyncio.run_coroutine_threadsafe(runtime.client.search(query, top_k), runtime.loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        # Nobody waits for the answer any more; stop the request on the runtime loop
+        future.cancel()
+        raise
@@ -0,0 +1,92 @@
+"""
+Local HTTP stand-in for the knowledge base service
+
+Serves KnowledgeAPI.search as GET /search?q=...&top_k=... returning
+{"results": [...]}, with optional synthetic latency and failure rate so
+timeouts, retries and request coalescing of HttpKnowledgeClient can be
+exercised offline.
+
+Run: python -m intent_not_identified_flow.services.knowledge_stub_server --port 8765
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+
+from intent_not_identified_flow.services.knowledge_api import KnowledgeAPI
+
+
+class KnowledgeStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, api: KnowledgeAPI, latency: float = 0.0, failure_rate: float = 0.0):
+        super().__init__(address, _SearchHandler)
+        self.api = api
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.request_count = 0
+
+
+class _SearchHandler(BaseHTTPRequestHandler):
+    server: KnowledgeStubServer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/search":
+            self._reply(404, {"error": "not found"})
+            return
+        self.server.request_count += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.failure_rate:
+            self._reply(503, {"error": "synthetic failure"})
+            return
+        params = parse_qs(url.query)
+        query = params.get("q", [""])[0]
+        top_k = int(params.get("top_k", ["5"])[0])
+        self._reply(200, {"results": self.server.api.search(query, top_k=top_k)})
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, api: KnowledgeAPI = None,
+                      latency: float = 0.0, failure_rate: float = 0.0) -> Tuple[KnowledgeStubServer, str]:
+    """
+    Start the stub server in a background thread
+
+    Returns:
+        Tuple of (server, base URL); call server.shutdown() to stop it
+    """
+    server = KnowledgeStubServer((host, port), api or KnowledgeAPI(), latency, failure_rate)
+    threading.Thread(target=server.serve_forever, name="knowledge-stub-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local knowledge base stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of synthetic latency per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+
+    server = KnowledgeStubServer((args.host, args.port), KnowledgeAPI(), args.latency, args.failure_rate)
+    print(f"Knowledge stub server listening on http://{args.host}:{server.server_address[1]}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
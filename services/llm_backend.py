@@ -0,0 +1,521 @@
+"""
+Record/replay LLM backends for offline load tests and benchmarks
+
+- record: calls the real model and appends every exchange to a JSONL
+  fixture store
+- replay: serves recorded responses without any network access, with a
+  configurable synthetic latency distribution; requests that were never
+  recorded get a response recorded for the same task, or a synthetic
+  schema-conforming one
+
+Both backends drive crewAI in its text (ReAct) mode, so a recorded
+conversation including tool calls replays step by step. They emit the regular
+crewAI LLM events, so instrumentation sees replayed calls like live ones;
+with streaming switched on, replay also emits the response in small chunks
+spread over the synthetic latency. Replay can also enforce provider-side
+rate limits (MockRateLimits), answering calls above them with a 429 and a
+retry-after header like the real API, and simulate a provider-side prompt
+prefix cache (MockPrefixCache) with its pricing and time-to-first-token.
+Both backends see the task messages as sent, i.e. split for prefix caching
+(services/prompt_cache.py) unless INTENT_PROMPT_CACHE=0, so fixtures
+recorded with one setting replay exactly only with the same one.
+
+Selected through the environment by llm_from_env:
+INTENT_LLM_MODE (live | record | replay), INTENT_LLM_FIXTURES (fixture file),
+INTENT_LLM_LATENCY (latency spec, see LatencyModel.parse),
+INTENT_LLM_MISS_POLICY (task | synthetic | error), INTENT_LLM_SEED and
+INTENT_LLM_MOCK_RPM / INTENT_LLM_MOCK_TPM (simulated provider limits in replay),
+INTENT_LLM_MOCK_PREFIX_CACHE=1 and INTENT_LLM_MOCK_CACHE_MIN_TOKENS (simulated
+prefix cache in replay), INTENT_LLM_OUTPUT_RATE (replay: generated tokens per
+second on top of the latency, so longer answers take longer).
+With INTENT_LLM_RPM set, every LLM is wrapped in the scheduler of llm_scheduler.
+"""
+import abc
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from crewai import LLM
+from crewai.events.types.llm_events import LLMCallType
+from crewai.llms.base_llm import BaseLLM, llm_call_context
+from crewai.llms.cache import CACHE_BREAKPOINT_KEY
+from pydantic import BaseModel, ConfigDict, Field
+
+from intent_not_identified_flow.crews.intent_crew.context_builder import count_tokens
+from intent_not_identified_flow.services.llm_scheduler import (
+    LLMScheduler, TokenBucket, get_llm_scheduler, prompt_text, scheduled,
+)
+from intent_not_identified_flow.services.prompt_cache import prefix_cached, prompt_cache_enabled
+
+MISS_POLICIES = ("task", "synthetic", "error")
+
+# Replayed responses are streamed a few words at a time
+_STREAM_CHUNK = re.compile(r"(?:\S+\s*){1,4}|\s+")
+# Items of a batch prompt (crews/intent_crew/prompts.py)
+_BATCH_ITEM = re.compile(r"^### Item (\d+)$", re.MULTILINE)
+
+
+class ReplayMiss(KeyError):
+    """No recorded response for a request and the miss policy is "error" """
+
+
+class ProviderRateLimitError(RuntimeError):
+    """HTTP 429 of the simulated provider, carrying a retry-after header like the real API"""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": f"{retry_after:.3f}"})
+
+
+class MockRateLimits:
+    """
+    Provider-side limits shared by every replayed LLM, enforced like Anthropic does:
+    requests and input tokens are checked when a call arrives, output tokens
+    are counted against the token limit once generated
+    """
+
+    def __init__(self, rpm: float, tpm: float = None):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._counts = {"accepted": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def admit(self, prompt_tokens: int) -> None:
+        """Accept a call or raise ProviderRateLimitError with the time until it would be accepted"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._requests.delay(1, now), self._tokens.delay(prompt_tokens, now) if self._tokens else 0.0)
+            if wait > 0:
+                self._counts["rejected"] += 1
+                raise ProviderRateLimitError("rate_limit_error: Number of requests or tokens per minute exceeded",
+                                             retry_after=wait)
+            self._requests.take(1, now)
+            if self._tokens:
+                self._tokens.take(prompt_tokens, now)
+            self._counts["accepted"] += 1
+
+    def charge(self, completion_tokens: int) -> None:
+        if self._tokens:
+            with self._lock:
+                self._tokens.take(completion_tokens, time.monotonic())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+class MockPrefixCache:
+    """
+    Provider-side prompt prefix cache shared by every replayed LLM, simulated like Anthropic's
+
+    The prompt up to a cache breakpoint is written by the first call sending
+    it, if it is at least min_tokens long, and read by the calls sending it
+    again within ttl, each read renewing it. The time to first token is the
+    prefill of the prompt: prefill_rate tokens per second for uncached tokens,
+    read_rate for cached ones.
+    """
+
+    def __init__(self, ttl: float = 300.0, min_tokens: int = 1024, prefill_rate: float = 5000.0,
+                 read_rate: float = 100000.0):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.prefill_rate = prefill_rate
+        self.read_rate = read_rate
+        self._expiry: Dict[str, float] = {}
+        self._counts = {"hits": 0, "misses": 0, "read_tokens": 0, "written_tokens": 0}
+        self._lock = threading.Lock()
+
+    def lookup(self, model: str, messages: Any) -> Tuple[int, int]:
+        """Tokens read from the cache and written to it by a call sending messages"""
+        if isinstance(messages, str):
+            return 0, 0
+        prefixes = [(request_key(model, messages[:i + 1]), count_tokens(prompt_text(messages[:i + 1])))
+                    for i, message in enumerate(messages) if message.get(CACHE_BREAKPOINT_KEY)]
+        with self._lock:
+            now = time.monotonic()
+            read = next((tokens for key, tokens in reversed(prefixes) if self._expiry.get(key, 0.0) > now), 0)
+            written = 0
+            for key, tokens in prefixes:
+                if tokens >= self.min_tokens:
+                    self._expiry[key] = now + self.ttl
+                    written = max(written, tokens - read)
+            if len(self._expiry) > 10000:
+                self._expiry = {key: expiry for key, expiry in self._expiry.items() if expiry > now}
+            self._counts["hits" if read else "misses"] += 1
+            self._counts["read_tokens"] += read
+            self._counts["written_tokens"] += written
+        return read, written
+
+    def prefill_time(self, prompt_tokens: int, cached_tokens: int) -> float:
+        return (prompt_tokens - cached_tokens) / self.prefill_rate + cached_tokens / self.read_rate
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+def request_key(model: str, messages: Any) -> str:
+    """Stable fingerprint of an LLM request (model and role/content of every message)"""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = [[m.get("role", ""), str(m.get("content", ""))] for m in messages]
+    payload = json.dumps([model, normalized], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_final_answer(response: str) -> bool:
+    return "Final Answer:" in response
+
+
+class Fixture(BaseModel):
+    """One recorded LLM exchange"""
+    key: str
+    task: Optional[str] = None
+    model: str
+    response: str
+    latency: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    recorded_at: float = Field(default_factory=time.time)
+
+
+class FixtureStore:
+    """Append-only JSONL file of recorded exchanges, indexed by request key and by task"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._by_key: Dict[str, Fixture] = {}
+        self._final_by_task: Dict[str, List[Fixture]] = {}
+        self._served = {"hits": 0, "task_fallbacks": 0, "synthetic": 0}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(Fixture.model_validate_json(line))
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def get(self, key: str) -> Optional[Fixture]:
+        return self._by_key.get(key)
+
+    def final_for_task(self, task: str) -> List[Fixture]:
+        """Recorded final answers of a task (never intermediate tool-use steps)"""
+        return self._final_by_task.get(task, [])
+
+    def count_served(self, outcome: str) -> None:
+        with self._lock:
+            self._served[outcome] += 1
+
+    def replay_stats(self) -> Dict[str, int]:
+        """Replayed requests: exact hits, fallbacks to another recording of the task, synthetic responses"""
+        with self._lock:
+            return dict(self._served)
+
+    def add(self, fixture: Fixture) -> None:
+        with self._lock:
+            self._index(fixture)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(fixture.model_dump_json() + "\n")
+
+    def _index(self, fixture: Fixture) -> None:
+        self._by_key[fixture.key] = fixture
+        if fixture.task and is_final_answer(fixture.response):
+            self._final_by_task.setdefault(fixture.task, []).append(fixture)
+
+
+class LatencyModel:
+    """
+    Deterministic synthetic latency: the same request always gets the same delay
+
+    Specs: "0" (none), "fixed:S", "uniform:LOW:HIGH", "normal:MEAN:STDDEV",
+    "lognormal:MEDIAN:SIGMA" (long-tailed, closest to real LLM latency) and
+    "recorded[:SCALE]" (the latency measured when recording, scaled).
+    """
+
+    def __init__(self, kind: str = "fixed", params: tuple = (0.0,), seed: int = 0):
+        self.kind = kind
+        self.params = params
+        self.seed = seed
+
+    @classmethod
+    def parse(cls, spec: Optional[str], seed: int = 0) -> "LatencyModel":
+        if not spec or spec == "0":
+            return cls("fixed", (0.0,), seed)
+        kind, _, rest = spec.partition(":")
+        params = tuple(float(p) for p in rest.split(":") if p)
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "recorded": (0, 1)}
+        if kind not in expected:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        counts = expected[kind] if isinstance(expected[kind], tuple) else (expected[kind],)
+        if len(params) not in counts:
+            raise ValueError(f"Latency spec {spec!r} needs {' or '.join(map(str, counts))} parameters")
+        return cls(kind, params, seed)
+
+    def sample(self, key: str, recorded: float = 0.0) -> float:
+        rng = random.Random(f"{self.seed}:{key}")
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma)
+        return recorded * (self.params[0] if self.params else 1.0)
+
+
+def _synthetic_analysis(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "can_prepare_general_answer": rng.random() < 0.7,
+        "identified_topics": rng.sample(["product information", "pricing", "implementation",
+                                         "integrations", "support", "security"], 2),
+        "confidence_score": round(rng.uniform(0.5, 0.95), 2),
+    }
+
+
+def synthetic_response(task: Optional[str], key: str, prompt: str = "") -> str:
+    """
+    Schema-conforming final answer for a task, derived deterministically from the request key
+
+    A batch task (name ending in _batch) gets one answer per "### Item" of the prompt.
+    """
+    rng = random.Random(key)
+    if task == "analyze_intent":
+        answer = _synthetic_analysis(rng)
+        return f"Thought: I can assess the request.\nFinal Answer: {json.dumps(answer)}"
+    if task == "analyze_intent_batch":
+        answers = [{"item": int(number), **_synthetic_analysis(random.Random(f"{key}:{number}"))}
+                   for number in _BATCH_ITEM.findall(prompt)]
+        return json.dumps(answers, indent=1)
+    if task == "create_general_answer":
+        answer = {
+            "summary": "General overview of our products and next steps.",
+            "detailed_response": "Thank you for reaching out. We offer a range of solutions for small "
+                                 "businesses and enterprises, with implementation typically taking 2-4 "
+                                 "weeks. Let us know more about your needs and we will follow up.",
+            "references": ["Company Overview", "Pricing Plans"],
+        }
+        return f"Thought: I have what I need.\nFinal Answer: {json.dumps(answer)}"
+    if task == "retrieve_information":
+        return ("Thought: I know the relevant entries.\nFinal Answer: Company Overview: solutions for "
+                "businesses of all sizes. Pricing Plans: Basic $99, Professional $299, Enterprise custom. "
+                "Implementation: 2-4 weeks with a dedicated manager.")
+    if task == "create_email_summary":
+        return ("Thought: I can summarize.\nFinal Answer: - Sender asks for general information\n"
+                "- No specific product named\n- Wants to know available options")
+    return ("Thought: I can prepare the package.\nFinal Answer: Summary, drafted response, references "
+            "and suggested follow-up questions for the handling agent.")
+
+
+class _FixtureLLM(BaseLLM):
+    """Shared plumbing: crewAI call context and LLM events around _respond"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None):
+        with llm_call_context():
+            self._emit_call_started_event(messages=messages, tools=tools, callbacks=callbacks,
+                                          available_functions=available_functions,
+                                          from_task=from_task, from_agent=from_agent)
+            try:
+                response, usage = self._respond(messages, from_task, from_agent)
+            except Exception as e:
+                self._emit_call_failed_event(error=str(e), from_task=from_task, from_agent=from_agent)
+                raise
+            self._track_token_usage_internal(usage)
+            self._emit_call_completed_event(response=response, call_type=LLMCallType.LLM_CALL,
+                                            from_task=from_task, from_agent=from_agent,
+                                            messages=messages, usage=usage)
+            return response
+
+    @abc.abstractmethod
+    def _respond(self, messages, from_task, from_agent):
+        """(response text, token usage) of one call"""
+
+
+class RecordingLLM(_FixtureLLM):
+    """Calls the real model and records every exchange"""
+
+    inner: Any
+    store: Any
+
+    def _respond(self, messages, from_task, from_agent):
+        task = getattr(from_task, "name", None)
+        started = time.perf_counter()
+        response = self.inner.call(messages)
+        latency = time.perf_counter() - started
+        fixture = Fixture(
+            key=request_key(self.model, messages),
+            task=task,
+            model=self.model,
+            response=str(response),
+            latency=latency,
+            prompt_tokens=count_tokens(prompt_text(messages)),
+            completion_tokens=count_tokens(str(response)),
+        )
+        self.store.add(fixture)
+        return fixture.response, {"prompt_tokens": fixture.prompt_tokens,
+                                  "completion_tokens": fixture.completion_tokens}
+
+
+class ReplayLLM(_FixtureLLM):
+    """Serves recorded responses with synthetic latency, never touching the network"""
+
+    store: Any
+    latency_model: Any = None
+    miss_policy: str = "task"
+    rate_limits: Any = None
+    prefix_cache: Any = None
+    output_rate: Optional[float] = None
+
+    def _respond(self, messages, from_task, from_agent):
+        task = getattr(from_task, "name", None)
+        prompt_tokens = count_tokens(prompt_text(messages))
+        if self.rate_limits is not None:
+            self.rate_limits.admit(prompt_tokens)
+        key = request_key(self.model, messages)
+        fixture = self.store.get(key)
+        if fixture is None and self.miss_policy == "error":
+            raise ReplayMiss(f"No recorded response for task {task} (key {key[:12]})")
+        if fixture is not None:
+            self.store.count_served("hits")
+        elif self.miss_policy == "task" and task and self.store.final_for_task(task):
+            candidates = self.store.final_for_task(task)
+            fixture = candidates[int(key, 16) % len(candidates)]
+            self.store.count_served("task_fallbacks")
+        if fixture is not None:
+            response, recorded = fixture.response, fixture.latency
+        else:
+            response, recorded = synthetic_response(task, key, prompt_text(messages)), 0.0
+            self.store.count_served("synthetic")
+
+        delay = self.latency_model.sample(key, recorded) if self.latency_model is not None else 0.0
+        completion_tokens = count_tokens(response)
+        if self.output_rate and fixture is None:
+            # Recorded latencies already include the generation
+            delay += completion_tokens / self.output_rate
+        cached, written = 0, 0
+        if self.prefix_cache is not None:
+            cached, written = self.prefix_cache.lookup(self.model, messages)
+            # The prefill comes before the first token
+            time.sleep(self.prefix_cache.prefill_time(prompt_tokens, cached))
+        if self._effective_stream():
+            # Spread the latency over the chunks like a streaming provider would
+            chunks = _STREAM_CHUNK.findall(response)
+            for chunk in chunks:
+                time.sleep(delay / len(chunks))
+                self._emit_stream_chunk_event(chunk, from_task=from_task, from_agent=from_agent,
+                                              call_type=LLMCallType.LLM_CALL)
+        elif delay > 0:
+            time.sleep(delay)
+        if self.rate_limits is not None:
+            self.rate_limits.charge(completion_tokens)
+        return response, {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "cached_prompt_tokens": cached, "cache_creation_tokens": written}
+
+
+_stores: Dict[str, FixtureStore] = {}
+_stores_lock = threading.Lock()
+_mock_limits: Optional[MockRateLimits] = None
+_mock_prefix_cache: Optional[MockPrefixCache] = None
+
+
+def get_fixture_store(path: str) -> FixtureStore:
+    """One store per fixture file, shared by every agent's LLM"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = FixtureStore(path)
+        return _stores[path]
+
+
+def get_mock_rate_limits() -> Optional[MockRateLimits]:
+    """Process-wide simulated provider limits from INTENT_LLM_MOCK_RPM / INTENT_LLM_MOCK_TPM, None when unset"""
+    global _mock_limits
+    rpm = float(os.environ.get("INTENT_LLM_MOCK_RPM") or 0)
+    if not rpm:
+        return None
+    with _stores_lock:
+        if _mock_limits is None:
+            _mock_limits = MockRateLimits(rpm, tpm=float(os.environ.get("INTENT_LLM_MOCK_TPM") or 0) or None)
+        return _mock_limits
+
+
+def get_mock_prefix_cache() -> Optional[MockPrefixCache]:
+    """Process-wide simulated prefix cache when INTENT_LLM_MOCK_PREFIX_CACHE is set, None otherwise"""
+    global _mock_prefix_cache
+    if os.environ.get("INTENT_LLM_MOCK_PREFIX_CACHE", "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    with _stores_lock:
+        if _mock_prefix_cache is None:
+            _mock_prefix_cache = MockPrefixCache(
+                min_tokens=int(os.environ.get("INTENT_LLM_MOCK_CACHE_MIN_TOKENS") or 1024)
+            )
+        return _mock_prefix_cache
+
+
+def build_llm(model: str, mode: str = "live", fixtures: str = "llm_fixtures.jsonl", latency: str = None,
+              miss_policy: str = "task", seed: int = 0, rate_limits: MockRateLimits = None,
+              scheduler: LLMScheduler = None, prefix_cache: MockPrefixCache = None,
+              prompt_cache: bool = True, output_rate: float = None) -> Any:
+    """
+    LLM for an agent in the given mode
+
+    In live mode the model string, from which crewAI builds the provider
+    client (an LLM for it when wrapped), otherwise a recording or replaying
+    wrapper. With
+    prompt_cache, task messages are split into a cacheable static prefix and
+    the per-email rest (services/prompt_cache.py). With a scheduler, the LLM
+    is wrapped so every call is admitted by it. Replay enforces the simulated
+    provider rate_limits and prefix_cache, and with output_rate adds the
+    generation time of a response that was not recorded.
+    """
+    if mode == "live":
+        llm = model
+    elif mode == "record":
+        llm = RecordingLLM(model=model, inner=LLM(model=model), store=get_fixture_store(fixtures))
+    elif mode == "replay":
+        if miss_policy not in MISS_POLICIES:
+            raise ValueError(f"Miss policy must be one of {MISS_POLICIES}")
+        llm = ReplayLLM(model=model, store=get_fixture_store(fixtures),
+                        latency_model=LatencyModel.parse(latency, seed=seed), miss_policy=miss_policy,
+                        rate_limits=rate_limits, prefix_cache=prefix_cache, output_rate=output_rate)
+    else:
+        raise ValueError(f"Unknown LLM mode: {mode}")
+    if prompt_cache:
+        llm = prefix_cached(LLM(model=llm) if isinstance(llm, str) else llm)
+    if scheduler is None:
+        return llm
+    return scheduled(LLM(model=llm) if isinstance(llm, str) else llm, scheduler)
+
+
+def llm_from_env(model: str) -> Any:
+    """build_llm configured by the INTENT_LLM_* environment variables (see the module docstring)"""
+    return build_llm(
+        model,
+        mode=os.environ.get("INTENT_LLM_MODE", "live"),
+        fixtures=os.environ.get("INTENT_LLM_FIXTURES", "llm_fixtures.jsonl"),
+        latency=os.environ.get("INTENT_LLM_LATENCY"),
+        miss_policy=os.environ.get("INTENT_LLM_MISS_POLICY", "task"),
+        seed=int(os.environ.get("INTENT_LLM_SEED", "0")),
+        rate_limits=get_mock_rate_limits(),
+        scheduler=get_llm_scheduler(),
+        prefix_cache=get_mock_prefix_cache(),
+        prompt_cache=prompt_cache_enabled(),
+        output_rate=float(os.environ.get("INTENT_LLM_OUTPUT_RATE") or 0) or None,
+    )
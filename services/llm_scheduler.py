@@ -0,0 +1,382 @@
+"""
+Client-side rate limiting and scheduling of LLM calls
+
+Every agent's LLM is wrapped in a ScheduledLLM that asks the process-wide
+LLMScheduler for permission before calling the provider:
+
+- two token buckets mirror the provider limits, requests per minute and
+  tokens per minute; a call's tokens are predicted before it is sent (counted
+  prompt tokens plus the typical completion of its task) and reconciled with
+  the actual usage afterwards
+- waiting calls are served by priority: the analyze_intent calls that gate
+  routing go before drafting, and the final material comes last
+- a throttled response (HTTP 429) pauses every call until its retry-after
+  (or an exponential backoff) has passed and halves the request rate; the
+  rate recovers step by step with every successful call (AIMD)
+
+The scheduler retries throttled calls itself, so crewAI's built-in retries
+of throttled provider calls are switched off inside ScheduledLLM.
+Enabled through the environment by get_llm_scheduler: INTENT_LLM_RPM and
+INTENT_LLM_TPM (limits per minute, 0 or unset for no token limit).
+"""
+import collections
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Deque, Dict, Optional
+
+from crewai.llms import retry as crewai_retry
+from crewai.llms.base_llm import BaseLLM, call_stop_override, call_stream_override
+from pydantic import BaseModel, ConfigDict
+
+from intent_not_identified_flow.crews.intent_crew.context_builder import count_tokens
+from intent_not_identified_flow.services.batch_runner import percentile
+from intent_not_identified_flow.services.instrumentation import record_wait
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: routing depends on the analysis, the final material is needed last
+TASK_PRIORITIES = {
+    "analyze_intent": 0,
+    "analyze_intent_batch": 0,
+    "retrieve_information": 1,
+    "create_general_answer": 2,
+    "create_email_summary": 3,
+    "prepare_final_material": 4,
+}
+DEFAULT_PRIORITY = 2
+
+
+def prompt_text(messages: Any) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether an exception (or one it was raised from) is a provider throttle"""
+    for candidate in _error_chain(error):
+        status = getattr(candidate, "status_code", None) or getattr(getattr(candidate, "response", None),
+                                                                      "status_code", None)
+        if status == 429 or "ratelimit" in type(candidate).__name__.lower():
+            return True
+    return False
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked to wait (retry-after / retry-after-ms headers), if any"""
+    for candidate in _error_chain(error):
+        headers = getattr(getattr(candidate, "response", None), "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms") is not None:
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after") is not None:
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            continue  # an HTTP date instead of seconds: fall back to backoff
+    return None
+
+
+def _error_chain(error: BaseException):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+class TokenBucket:
+    """Allowance refilled continuously at per_minute units per minute, up to capacity (not thread-safe)"""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.per_minute = per_minute
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.scale = 1.0  # fraction of per_minute currently refilled
+        self._updated = time.monotonic()
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (requests above capacity only need a full bucket)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60.0 / (self.per_minute * self.scale))
+
+    def take(self, amount: float, now: float) -> None:
+        """Consume amount (negative to give back); a negative level delays later requests until paid back"""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self.level = min(self.capacity, self.level + elapsed * self.per_minute * self.scale / 60.0)
+
+
+class UsagePredictor:
+    """Tokens a call will use: its counted prompt plus the running average completion of its task"""
+
+    def __init__(self, default_completion: int = 400, alpha: float = 0.2):
+        self.default_completion = default_completion
+        self.alpha = alpha
+        self._completion: Dict[Optional[str], float] = {}
+        self._lock = threading.Lock()
+
+    def completion(self, task: Optional[str]) -> int:
+        with self._lock:
+            return int(self._completion.get(task, self.default_completion))
+
+    def observe(self, task: Optional[str], completion_tokens: int) -> None:
+        with self._lock:
+            previous = self._completion.get(task)
+            self._completion[task] = (completion_tokens if previous is None
+                                      else previous + self.alpha * (completion_tokens - previous))
+
+
+class SchedulerStats(BaseModel):
+    """Counters of an LLMScheduler"""
+    calls: int = 0
+    throttled: int = 0
+    failed: int = 0
+    wait_time: float = 0.0
+    max_waiting: int = 0
+    rate_scale: float = 1.0
+    predicted_tokens: int = 0
+    actual_tokens: int = 0
+    wait_p95_by_task: Dict[str, float] = {}
+
+    @property
+    def avg_wait(self) -> float:
+        return self.wait_time / self.calls if self.calls else 0.0
+
+    @property
+    def prediction_error(self) -> float:
+        """Relative error of the predicted token usage over all calls"""
+        return (self.predicted_tokens - self.actual_tokens) / self.actual_tokens if self.actual_tokens else 0.0
+
+
+class LLMScheduler:
+    """Priority admission of LLM calls under requests- and tokens-per-minute limits"""
+
+    def __init__(self, rpm: float, tpm: float = None, max_retries: int = 6, max_backoff: float = 60.0,
+                 min_rate: float = 0.1, recovery: float = 0.05, priorities: Dict[str, int] = None,
+                 predictor: UsagePredictor = None):
+        """
+        Args:
+            rpm: Requests per minute allowed by the provider
+            tpm: Tokens per minute allowed by the provider (None for no token limit)
+            max_retries: Throttled attempts of one call before its error is raised
+            max_backoff: Longest pause after a throttled call without retry-after
+            min_rate: Lowest fraction of the limits the rate is cut down to
+            recovery: Fraction of the limits regained with every successful call
+            priorities: Task name -> priority (lower runs first)
+            predictor: Token usage prediction, learned from the completed calls
+        """
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.priorities = TASK_PRIORITIES if priorities is None else priorities
+        self.predictor = predictor or UsagePredictor()
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._cooldown_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._stats = SchedulerStats()
+        self._waits: Dict[str, Deque[float]] = collections.defaultdict(lambda: collections.deque(maxlen=10_000))
+
+    def priority(self, task: Optional[str]) -> int:
+        return self.priorities.get(task, DEFAULT_PRIORITY)
+
+    def acquire(self, priority: int, tokens: int) -> float:
+        """Block until the call may be sent, returns the seconds waited"""
+        entry = (priority, next(self._sequence))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            self._stats.max_waiting = max(self._stats.max_waiting, len(self._waiting))
+            try:
+                while True:
+                    timeout = None  # only the head of the queue watches the clock
+                    if self._waiting[0] == entry:
+                        now = time.monotonic()
+                        timeout = max(self._cooldown_until - now, self._requests.delay(1, now),
+                                      self._tokens.delay(tokens, now) if self._tokens else 0.0)
+                        if timeout <= 0:
+                            self._requests.take(1, now)
+                            if self._tokens:
+                                self._tokens.take(tokens, now)
+                            return time.monotonic() - started
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def completed(self, task: Optional[str], waited: float, predicted: int, prompt_tokens: int,
+                  completion_tokens: int) -> None:
+        """Settle a successful call: charge the prediction error and regain some of the rate"""
+        actual = prompt_tokens + completion_tokens
+        self.predictor.observe(task, completion_tokens)
+        with self._cond:
+            if self._tokens:
+                self._tokens.take(actual - predicted, time.monotonic())
+            self._set_scale(self._requests.scale + self.recovery)
+            self._stats.calls += 1
+            self._stats.wait_time += waited
+            self._stats.predicted_tokens += predicted
+            self._stats.actual_tokens += actual
+            self._waits[task or "-"].append(waited)
+            self._cond.notify_all()
+
+    def failed(self, predicted: int) -> None:
+        """A call failed for another reason than throttling; its completion tokens were never used"""
+        with self._cond:
+            if self._tokens:
+                self._tokens.take(-predicted, time.monotonic())
+            self._stats.failed += 1
+            self._cond.notify_all()
+
+    def throttled(self, attempt: int, delay: Optional[float] = None) -> float:
+        """
+        The provider rejected a call: pause every call and halve the rate
+
+        Returns:
+            The pause in seconds (retry-after, or exponential backoff with jitter)
+        """
+        if delay is None:
+            delay = min(self.max_backoff, 2.0 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+        with self._cond:
+            now = time.monotonic()
+            self._cooldown_until = max(self._cooldown_until, now + delay)
+            self._set_scale(self._requests.scale / 2)
+            # The provider saw our allowance as spent
+            self._requests.drain(now)
+            if self._tokens:
+                self._tokens.drain(now)
+            self._stats.throttled += 1
+            self._cond.notify_all()
+        logger.warning(f"LLM call throttled (attempt {attempt}), pausing {delay:.1f}s, "
+                       f"rate cut to {self._requests.scale:.0%} of the limits")
+        return delay
+
+    def stats(self) -> SchedulerStats:
+        with self._cond:
+            stats = self._stats.model_copy()
+            stats.rate_scale = self._requests.scale
+            stats.wait_p95_by_task = {task: percentile(list(waits), 95) for task, waits in self._waits.items()}
+        return stats
+
+    def _set_scale(self, scale: float) -> None:
+        scale = min(1.0, max(self.min_rate, scale))
+        now = time.monotonic()
+        for bucket in (self._requests, self._tokens):
+            if bucket is not None:
+                bucket.delay(0, now)  # refill at the old rate up to now
+                bucket.scale = scale
+
+
+@contextlib.contextmanager
+def _provider_retries_disabled():
+    # crewAI retries throttled calls inside every provider call; nested calls skip it while this flag is set
+    flag = getattr(crewai_retry, "_active_llm_rate_limit_retry", None)
+    token = flag.set(True) if flag is not None else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            flag.reset(token)
+
+
+class DelegatingLLM(BaseLLM):
+    """An LLM wrapping another one (inner): capabilities, token usage and per-call overrides are the inner LLM's"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: Any
+
+    def supports_function_calling(self) -> bool:
+        supports = getattr(self.inner, "supports_function_calling", None)
+        return bool(supports()) if supports else False
+
+    def supports_stop_words(self) -> bool:
+        return self.inner.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.inner.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.inner.get_token_usage_summary()
+
+    @contextlib.contextmanager
+    def _forwarded_overrides(self):
+        # crewAI sets per-call stop words and streaming on the agent's LLM, i.e. on this wrapper
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(call_stop_override(self.inner, self.stop_sequences))
+            stream = self._effective_stream()
+            if stream is not None:
+                stack.enter_context(call_stream_override(self.inner, stream))
+            yield
+
+
+class ScheduledLLM(DelegatingLLM):
+    """An agent's LLM whose calls go through an LLMScheduler"""
+
+    scheduler: Any
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None):
+        task = getattr(from_task, "name", None)
+        prompt_tokens = count_tokens(prompt_text(messages))
+        predicted = prompt_tokens + self.scheduler.predictor.completion(task)
+        for attempt in itertools.count(1):
+            waited = self.scheduler.acquire(self.scheduler.priority(task), predicted)
+            record_wait("llm_scheduler", waited)
+            try:
+                with self._forwarded_overrides(), _provider_retries_disabled():
+                    response = self.inner.call(messages, tools=tools, callbacks=callbacks,
+                                               available_functions=available_functions, from_task=from_task,
+                                               from_agent=from_agent, response_model=response_model)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt > self.scheduler.max_retries:
+                    self.scheduler.failed(predicted)
+                    raise
+                self.scheduler.throttled(attempt, retry_after(e))
+                continue
+            self.scheduler.completed(task, waited, predicted, prompt_tokens, count_tokens(str(response)))
+            return response
+
+    # Not wrapped in crewAI's retry of throttled calls, the loop above replaces it
+    call._crewai_rate_limit_wrapped = True
+
+
+def scheduled(llm: BaseLLM, scheduler: LLMScheduler) -> ScheduledLLM:
+    return ScheduledLLM(model=llm.model, inner=llm, scheduler=scheduler, stop=list(llm.stop),
+                        stream=llm.stream, is_litellm=llm.is_litellm)
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> Optional[LLMScheduler]:
+    """Process-wide LLMScheduler for the limits in INTENT_LLM_RPM and INTENT_LLM_TPM, None when unset"""
+    global _scheduler
+    rpm = float(os.environ.get("INTENT_LLM_RPM") or 0)
+    if not rpm:
+        return None
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(rpm, tpm=float(os.environ.get("INTENT_LLM_TPM") or 0) or None)
+    return _scheduler
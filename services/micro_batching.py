@@ -0,0 +1,177 @@
+"""
+Micro-batching of same-task LLM requests from concurrent flows
+
+Under load, many flows ask for the same short classification within
+milliseconds of each other. Each is a separate round trip that pays for the
+whole instruction prompt. MicroBatcher holds these requests for a short
+window, or until max_size of them are waiting, then passes them to one batch
+call. It fans the per-item results back out to the waiting coroutines. An
+item that the batch could not answer comes back as None, and its caller runs
+it individually as before. That covers an item missing from the reply or
+failing validation, every item of a batch whose call failed, and a request
+that found no one to share the window with.
+
+The window is the latency a request gives up: the first one of a batch
+waits the full window, the last one no time at all. In exchange the batch
+sends the instructions once for all of its items and makes one request
+against the provider's rate limit instead of max_size.
+Enabled for analyze_intent in IntentCrew through the environment by
+get_batch_policy: INTENT_ANALYZE_BATCH_WINDOW (seconds, unset or 0 for
+off) and INTENT_ANALYZE_BATCH_SIZE (default 8).
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.services.instrumentation import record_wait
+
+logger = logging.getLogger(__name__)
+
+
+class BatchPolicy(BaseModel):
+    """How long requests wait for company and how many share one call"""
+    window: float = 0.05
+    max_size: int = 8
+
+
+class BatchStats(BaseModel):
+    """Counters of one MicroBatcher"""
+    requests: int = 0
+    batches: int = 0
+    batched: int = 0
+    full_batches: int = 0
+    failed_batches: int = 0
+    alone: int = 0
+    fallbacks: int = 0
+    wait_total: float = 0.0
+
+    @property
+    def mean_size(self) -> float:
+        """Items per batch call"""
+        return self.batched / self.batches if self.batches else 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Seconds a request spent in the window before its batch left"""
+        return self.wait_total / self.requests if self.requests else 0.0
+
+
+class _Window:
+    """Requests collected on one event loop since the first of them arrived"""
+
+    def __init__(self, opened: float):
+        self.opened = opened
+        self.items: List[Any] = []
+        self.arrived: List[float] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.left: Optional[float] = None
+
+
+class MicroBatcher:
+    """
+    Collects submitted items and runs them through run_batch together
+
+    run_batch receives the items of a batch (at least two) and returns one
+    result per item, in order; None, an exception or a result list of the
+    wrong length make the affected callers fall back to their own call.
+    Windows are kept per event loop, so flows on different loops never
+    share a batch.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], Awaitable[List[Optional[Any]]]],
+                 window: float = 0.05, max_size: int = 8, name: str = "batch"):
+        if window < 0:
+            raise ValueError("window must not be negative")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.window = window
+        self.max_size = max_size
+        self.name = name
+        self._run_batch = run_batch
+        self._windows: Dict[asyncio.AbstractEventLoop, _Window] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._stats = BatchStats()
+        self._lock = threading.Lock()
+
+    async def submit(self, item: Any) -> Optional[Any]:
+        """The item's result from a batch call, or None when the caller has to run it itself"""
+        loop = asyncio.get_running_loop()
+        window = self._windows.get(loop)
+        if window is None:
+            window = self._windows[loop] = _Window(loop.time())
+            window.timer = loop.call_later(self.window, self._flush, loop, window, False)
+        future = loop.create_future()
+        arrived = loop.time()
+        window.items.append(item)
+        window.arrived.append(arrived)
+        window.futures.append(future)
+        if len(window.items) >= self.max_size:
+            self._flush(loop, window, True)
+        result = await future
+        # For a profiler: the time in the window, then waiting for the shared call
+        now = loop.time()
+        record_wait(f"{self.name} batch window", window.left - arrived, ended=time.time() - (now - window.left))
+        record_wait(f"{self.name} batch call", now - window.left)
+        return result
+
+    def _flush(self, loop: asyncio.AbstractEventLoop, window: _Window, full: bool) -> None:
+        if self._windows.get(loop) is not window:
+            return
+        del self._windows[loop]
+        window.timer.cancel()
+        window.left = loop.time()
+        # The batch serves several flows and belongs to none of them: it runs outside
+        # the context of whichever request happened to close the window
+        task = loop.create_task(self._run(loop, window, full), context=contextvars.Context())
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, loop: asyncio.AbstractEventLoop, window: _Window, full: bool) -> None:
+        count = len(window.items)
+        results: List[Optional[Any]] = [None] * count
+        failed = False
+        try:
+            if count > 1:
+                answered = await self._run_batch(list(window.items))
+                if len(answered) != count:
+                    raise ValueError(f"{len(answered)} results for {count} items")
+                results = list(answered)
+        except Exception as e:
+            failed = True
+            logger.warning("Batch of %d %s requests failed, running them one by one: %s: %s",
+                           count, self.name, type(e).__name__, e)
+        finally:
+            for future, result in zip(window.futures, results):
+                if not future.done():
+                    future.set_result(result)
+            with self._lock:
+                stats = self._stats
+                stats.requests += count
+                stats.wait_total += sum(window.left - arrived for arrived in window.arrived)
+                if count == 1:
+                    stats.alone += 1
+                else:
+                    stats.batches += 1
+                    stats.batched += count
+                    stats.full_batches += full
+                    stats.failed_batches += failed
+                    stats.fallbacks += sum(result is None for result in results)
+
+    def stats(self) -> BatchStats:
+        with self._lock:
+            return self._stats.model_copy()
+
+
+def get_batch_policy() -> Optional[BatchPolicy]:
+    """Micro-batching of analyze_intent from INTENT_ANALYZE_BATCH_WINDOW / _SIZE, None when off"""
+    window = float(os.environ.get("INTENT_ANALYZE_BATCH_WINDOW") or 0)
+    if window <= 0:
+        return None
+    return BatchPolicy(window=window, max_size=int(os.environ.get("INTENT_ANALYZE_BATCH_SIZE") or 8))
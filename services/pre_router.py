@@ -0,0 +1,248 @@
+"""
+Cheap pre-routing of emails in front of the analyze_intent LLM call
+
+A cascade of classifiers looks at every email before the analyzer runs:
+
+- RuleClassifier: compiled keyword/regex rules for the trivial cases (empty
+  messages, auto-replies and out-of-office notices, one-line "send me info"
+  requests, obvious billing or outage reports)
+- NgramClassifier: logistic regression on hashed word and character n-grams,
+  trained on analyzer labels (see benchmarks/pre_router_bench.py)
+
+The first classifier that is at least `threshold` confident decides the route
+and the LLM call is skipped; otherwise the email goes to the analyzer as
+before. Enabled through the environment by get_pre_router:
+INTENT_PRE_ROUTER (on/off), INTENT_PRE_ROUTER_THRESHOLD and
+INTENT_PRE_ROUTER_MODEL (trained n-gram model, rules only when unset).
+"""
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+from intent_not_identified_flow.models.email import EmailContent
+from intent_not_identified_flow.services.embeddings import HashingEmbedder, strip_boilerplate, tokenize
+
+
+class RouteDecision(BaseModel):
+    """Route chosen without the analyzer"""
+    can_prepare_general_answer: bool
+    confidence: float
+    classifier: str
+    reason: str = ""
+
+
+class PreRouterStats(BaseModel):
+    """How much traffic the pre-router decided on its own"""
+    total: int = 0
+    short_circuited: int = 0
+    by_classifier: Dict[str, int] = {}
+
+    @property
+    def short_circuit_rate(self) -> float:
+        return self.short_circuited / self.total if self.total else 0.0
+
+
+# Stripping that leaves less than this share of the words falls through to the analyzer
+_MIN_STRIPPED_SHARE = 0.5
+
+
+def email_text(email: EmailContent) -> str:
+    """Subject and body without greeting and signature, the text every classifier sees"""
+    return f"{email.subject}\n{strip_boilerplate(email.body)}"
+
+
+def raw_text(email: EmailContent) -> str:
+    """Subject and body as received; rule vetoes and length limits look at this"""
+    return f"{email.subject}\n{email.body}"
+
+
+class Rule:
+    """
+    One keyword rule: matches when the pattern is found and the text length is in range
+
+    The pattern is searched in the email text without greeting and signature; the length
+    limits and the veto apply to the raw text, so nothing the stripping removed can slip
+    past them.
+
+    Args:
+        name: Reported as the reason of a decision
+        can_prepare: Route of a matching email
+        confidence: Confidence of a decision by this rule
+        pattern: Regex searched in the email text (case-insensitive), None matches any text
+        min_words: Minimum number of words of the raw email text
+        max_words: Maximum number of words of the raw email text
+        unless: Regex that vetoes the rule when found in the raw email text
+    """
+
+    def __init__(self, name: str, can_prepare: bool, confidence: float, pattern: str = None,
+                 min_words: int = 0, max_words: int = None, unless: str = None):
+        self.name = name
+        self.can_prepare = can_prepare
+        self.confidence = confidence
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.min_words = min_words
+        self.max_words = max_words
+        self.unless = re.compile(unless, re.IGNORECASE) if unless else None
+
+    def matches(self, text: str, raw: str, raw_words: int) -> bool:
+        if raw_words < self.min_words or (self.max_words is not None and raw_words > self.max_words):
+            return False
+        if self.pattern is not None and not self.pattern.search(text):
+            return False
+        return self.unless is None or not self.unless.search(raw)
+
+
+# Problems a general answer cannot solve; they veto the "send me info" rule
+_SPECIFIC_ISSUE = (r"\b(?:refund|charged|invoice|billing|cancel(?:led|lation)?|outage|down|broken|not working|"
+                   r"error|bug|urgent|complain\w*|password|login|account)\b")
+
+DEFAULT_RULES = [
+    Rule("empty_message", can_prepare=False, confidence=0.95, max_words=2),
+    Rule("auto_reply", can_prepare=False, confidence=0.98,
+         pattern=r"\b(?:auto(?:matic)?[ -]?reply|out of (?:the )?office|ooo|away from (?:the )?office|"
+                 r"on (?:annual |parental )?leave until|undeliverable|delivery status notification|"
+                 r"mail delivery (?:failed|subsystem))\b"),
+    Rule("specific_issue", can_prepare=False, confidence=0.9, max_words=80,
+         pattern=r"\b(?:refund|charged (?:me )?twice|double charged|outage|(?:is|are|has been) down|not working|"
+                 r"cancel my|reset my password|can(?:no|')t log ?in)\b"),
+    Rule("info_request", can_prepare=True, confidence=0.92, max_words=40,
+         pattern=r"\b(?:send|share|provide|give|tell)\b[^.?!\n]{0,40}\b(?:info|information|brochure|"
+                 r"overview|details|more about)\b|\b(?:more|general) info(?:rmation)?\b",
+         unless=_SPECIFIC_ISSUE),
+]
+
+
+class RuleClassifier:
+    """First matching rule of an ordered list"""
+
+    name = "rules"
+
+    def __init__(self, rules: Sequence[Rule] = None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+
+    def classify(self, text: str, raw: str = None) -> Optional[RouteDecision]:
+        raw = text if raw is None else raw
+        raw_words = len(tokenize(raw))
+        for rule in self.rules:
+            if rule.matches(text, raw, raw_words):
+                return RouteDecision(can_prepare_general_answer=rule.can_prepare, confidence=rule.confidence,
+                                     classifier=self.name, reason=rule.name)
+        return None
+
+
+class NgramClassifier:
+    """
+    Logistic regression over HashingEmbedder features
+
+    Word unigrams/bigrams and character trigrams are hashed into `dim`
+    buckets, so the model is one weight vector and a bias; training on a few
+    thousand labelled emails takes well under a second on a CPU.
+    """
+
+    name = "ngram"
+
+    def __init__(self, dim: int = 2048, weights: np.ndarray = None, bias: float = 0.0):
+        self.embedder = HashingEmbedder(dim=dim)
+        self.weights = np.zeros(dim, dtype=np.float32) if weights is None else weights.astype(np.float32)
+        self.bias = float(bias)
+
+    def fit(self, texts: Sequence[str], labels: Sequence[bool], epochs: int = 300, learning_rate: float = 2.0,
+            l2: float = 1e-4) -> "NgramClassifier":
+        """Full-batch gradient descent on the class-balanced log loss"""
+        x = self.embedder.embed_many(texts)
+        y = np.asarray(labels, dtype=np.float32)
+        positives = max(float(y.sum()), 1.0)
+        negatives = max(float(len(y) - y.sum()), 1.0)
+        sample_weights = np.where(y > 0, len(y) / (2 * positives), len(y) / (2 * negatives)).astype(np.float32)
+        for _ in range(epochs):
+            error = (self._sigmoid(x @ self.weights + self.bias) - y) * sample_weights
+            self.weights -= learning_rate * (x.T @ error / len(y) + l2 * self.weights)
+            self.bias -= learning_rate * float(error.mean())
+        return self
+
+    def probability(self, text: str) -> float:
+        """Probability that a general answer can be prepared"""
+        return float(self._sigmoid(self.embedder.embed(text) @ self.weights + self.bias))
+
+    def classify(self, text: str, raw: str = None) -> Optional[RouteDecision]:
+        p = self.probability(text)
+        return RouteDecision(can_prepare_general_answer=p >= 0.5, confidence=max(p, 1.0 - p),
+                             classifier=self.name, reason=f"p={p:.2f}")
+
+    def save(self, path: str) -> None:
+        np.savez(path, weights=self.weights, bias=np.float32(self.bias))
+
+    @classmethod
+    def load(cls, path: str) -> "NgramClassifier":
+        with np.load(path) as data:
+            weights = data["weights"]
+            return cls(dim=len(weights), weights=weights, bias=float(data["bias"]))
+
+    @staticmethod
+    def _sigmoid(z):
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+
+class PreRouter:
+    """Cascade of classifiers; the first confident one decides, otherwise the analyzer does"""
+
+    def __init__(self, classifiers: Sequence = None, threshold: float = 0.9):
+        """
+        Args:
+            classifiers: Objects with a name and classify(text, raw) -> Optional[RouteDecision]
+                (text without greeting and signature, raw as received), cheapest first; a
+                RuleClassifier by default
+            threshold: Minimum confidence to skip the analyzer
+        """
+        self.classifiers = list(classifiers) if classifiers is not None else [RuleClassifier()]
+        self.threshold = threshold
+        self._stats = PreRouterStats()
+        self._lock = threading.Lock()
+
+    def route(self, email: EmailContent) -> Optional[RouteDecision]:
+        """Decision of the first confident classifier, or None to ask the analyzer"""
+        text, raw = email_text(email), raw_text(email)
+        decision = None
+        # Most of the email was taken for greeting and signature: too odd to decide without the analyzer
+        if len(tokenize(text)) >= _MIN_STRIPPED_SHARE * len(tokenize(raw)):
+            for classifier in self.classifiers:
+                candidate = classifier.classify(text, raw=raw)
+                if candidate is not None and candidate.confidence >= self.threshold:
+                    decision = candidate
+                    break
+        with self._lock:
+            self._stats.total += 1
+            if decision is not None:
+                self._stats.short_circuited += 1
+                counts = self._stats.by_classifier
+                counts[decision.classifier] = counts.get(decision.classifier, 0) + 1
+        return decision
+
+    def stats(self) -> PreRouterStats:
+        with self._lock:
+            return self._stats.model_copy(deep=True)
+
+
+_pre_router: Optional[PreRouter] = None
+_pre_router_lock = threading.Lock()
+
+
+def get_pre_router() -> Optional[PreRouter]:
+    """Process-wide PreRouter configured from the environment, None when disabled"""
+    global _pre_router
+    if os.environ.get("INTENT_PRE_ROUTER", "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    if _pre_router is None:
+        with _pre_router_lock:
+            if _pre_router is None:
+                classifiers: List = [RuleClassifier()]
+                model_path = os.environ.get("INTENT_PRE_ROUTER_MODEL")
+                if model_path:
+                    classifiers.append(NgramClassifier.load(model_path))
+                _pre_router = PreRouter(classifiers,
+                                        threshold=float(os.environ.get("INTENT_PRE_ROUTER_THRESHOLD", "0.9")))
+    return _pre_router
@@ -0,0 +1,269 @@
+"""
+Multi-process execution of flows over a shared SQLite job queue
+
+One event loop runs all CPU-side work of its flows (validation, prompt
+interpolation, serialization, crewAI bookkeeping) on one core. ProcessPool
+starts N worker processes, each with its own event loop, its own warm
+IntentCrew and a Worker pulling from the same SQLiteJobQueue, so the work
+spreads over N cores while the queue keeps every job processed once.
+
+The supervisor watches a heartbeat per process. A process that died or whose
+event loop stopped beating for stall_timeout seconds is killed, its leased
+jobs go back to the queue at once (the other processes pick them up) and a
+fresh process takes its slot. Results are merged back from the queue in input
+order.
+
+Worker processes are spawned, so each one imports crewAI and the crew from
+scratch before it builds its IntentCrew. With preload (a "warm pool") they
+are forked from a forkserver that has already imported those modules: a
+process, and above all a replacement for a crashed one, then only builds its
+crew. The forkserver starts with the first process and keeps the environment
+of that moment. Only modules are preloaded - a built crew runs background
+threads, which must not be forked.
+"""
+import asyncio
+import contextlib
+import importlib
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow import configure_logging
+from intent_not_identified_flow.models.email import EmailContent
+from intent_not_identified_flow.services.job_queue import JobResult, QueueSource, SQLiteJobQueue
+from intent_not_identified_flow.services.worker import Worker
+
+logger = logging.getLogger(__name__)
+
+# Imported once by the forkserver of a warm pool, inherited by every worker process
+WARM_MODULES = (
+    "intent_not_identified_flow.main",
+    "intent_not_identified_flow.crews.intent_crew.intent_crew",
+)
+
+
+class FlowFactory:
+    """
+    Picklable flow factory naming the flow class by import path, so the process
+    creating the pool (e.g. the supervisor) never has to import crewAI itself
+    """
+
+    def __init__(self, target: str = "intent_not_identified_flow.main:IntentNotIdentifiedFlow", **kwargs):
+        self.target = target
+        self.kwargs = kwargs
+
+    def __call__(self):
+        module, _, name = self.target.partition(":")
+        return getattr(importlib.import_module(module), name)(**self.kwargs)
+
+
+class PoolStats(BaseModel):
+    """Outcome of one ProcessPool run"""
+    processes: int = 0
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    restarts: int = 0
+    startup_time: float = 0.0
+    wall_time: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Jobs per second once every process had started (imports and warm-up excluded)"""
+        busy = self.wall_time - self.startup_time
+        return self.done / busy if busy > 0 else 0.0
+
+
+async def _serve(queue_path: str, owner: str, flow_factory: Callable[[], Any], concurrency: int, lease: float,
+                 max_attempts: int, output: Optional[str], heartbeat, stop) -> None:
+    # crewAI runs every task in a worker thread; the default executor would cap the LLM calls in flight
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=3 * concurrency))
+    flow_factory().intent_crew  # builds the process-wide IntentCrew before the first job arrives
+    stop_event = asyncio.Event()
+
+    async def beat():
+        # Runs on the event loop: a blocked loop stops the heartbeat
+        while True:
+            heartbeat.value = time.time()
+            if stop.is_set():
+                stop_event.set()
+            await asyncio.sleep(0.5)
+
+    beating = asyncio.create_task(beat())
+    try:
+        queue = SQLiteJobQueue(queue_path, lease=lease, max_attempts=max_attempts)
+        source = QueueSource(queue, owner=owner, poll_interval=0.1)
+        await Worker(source, flow_factory, concurrency=concurrency, output=output).run(stop_event)
+    finally:
+        beating.cancel()
+
+
+def _worker_main(queue_path: str, owner: str, flow_factory: Callable[[], Any], concurrency: int, lease: float,
+                 max_attempts: int, output: Optional[str], heartbeat, stop, quiet: bool) -> None:
+    """Entry point of a worker process"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when workers stop
+    with contextlib.ExitStack() as stack:
+        if not quiet:
+            configure_logging()
+        else:
+            # The flow and crewAI print progress for every step
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(_serve(queue_path, owner, flow_factory, concurrency, lease, max_attempts, output, heartbeat, stop))
+
+
+class _Slot:
+    """One worker process and its heartbeat"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.generation = 0
+        self.process = None
+        self.heartbeat = None
+        self.started = 0.0
+
+    @property
+    def owner(self) -> str:
+        return f"pool-{os.getpid()}-{self.index}.{self.generation}"
+
+
+class ProcessPool:
+    """N worker processes fed from one SQLite job queue"""
+
+    def __init__(self, flow_factory: Callable[[], Any], processes: int = None, concurrency: int = 20,
+                 queue_path: str = None, lease: float = 60.0, max_attempts: int = 3, stall_timeout: float = 30.0,
+                 startup_timeout: float = 120.0, output: str = None, quiet: bool = True,
+                 preload: Sequence[str] = None):
+        """
+        Args:
+            flow_factory: Picklable callable returning a fresh flow, e.g. a FlowFactory, the flow
+                class or a functools.partial of it
+            processes: Number of worker processes (default: CPU count)
+            concurrency: Flows in flight per process
+            queue_path: SQLite queue file; a temporary one by default
+            lease: Queue lease in seconds, renewed while a job runs
+            max_attempts: Attempts per job before it is marked failed
+            stall_timeout: Seconds without a heartbeat after which a process is replaced
+            startup_timeout: Seconds a new process may take to import and warm up
+            output: JSONL file every process appends its results to
+            quiet: Silence the per-step output of the worker processes
+            preload: Modules to import once in a forkserver the worker processes are forked
+                from (e.g. WARM_MODULES) instead of spawning each process cold
+        """
+        self.flow_factory = flow_factory
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.queue_path = queue_path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = startup_timeout
+        self.output = output
+        self.quiet = quiet
+        self.preload = list(preload or ())
+        self.stats = PoolStats()
+        if self.preload:
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(self.preload)
+        else:
+            self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+
+    def run(self, emails: Iterable[EmailContent]) -> List[JobResult]:
+        """Process emails across the worker processes and return their results in input order"""
+        directory = None
+        queue_path = self.queue_path
+        if queue_path is None:
+            directory = tempfile.mkdtemp(prefix="intent-pool-")
+            queue_path = os.path.join(directory, "jobs.db")
+        try:
+            queue = SQLiteJobQueue(queue_path, lease=self.lease, max_attempts=self.max_attempts)
+            ids = queue.put(emails)
+            self.supervise(queue, until_empty=True)
+            results = queue.results(ids)
+            queue.close()
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+        self.stats.total = len(results)
+        self.stats.done = sum(result.status == "done" for result in results)
+        self.stats.failed = sum(result.status == "failed" for result in results)
+        return results
+
+    def stop(self) -> None:
+        """Ask the worker processes to drain their flows and exit (safe from signal handlers)"""
+        self._stop.set()
+
+    def supervise(self, queue: SQLiteJobQueue, until_empty: bool = False, check_interval: float = 0.5) -> None:
+        """
+        Run the worker processes until stop() is called, or until the queue has no ready
+        or leased jobs left when until_empty is set
+        """
+        started = time.perf_counter()
+        self._stop.clear()
+        self.stats = PoolStats(processes=self.processes)
+        slots = [_Slot(index) for index in range(self.processes)]
+        for slot in slots:
+            self._start(slot, queue.path)
+        try:
+            while not self._stop.is_set():
+                time.sleep(check_interval)
+                if not self.stats.startup_time and all(slot.heartbeat.value for slot in slots):
+                    self.stats.startup_time = time.perf_counter() - started
+                if until_empty:
+                    counts = queue.stats()
+                    if counts.ready == 0 and counts.leased == 0:
+                        break
+                for slot in slots:
+                    problem = self._check(slot)
+                    if problem:
+                        self._replace(slot, queue, problem)
+        finally:
+            self._stop.set()
+            deadline = time.monotonic() + max(self.lease, 10.0)
+            for slot in slots:
+                slot.process.join(max(0.0, deadline - time.monotonic()))
+                if slot.process.is_alive():
+                    slot.process.kill()
+                    slot.process.join()
+                    queue.requeue_owner(slot.owner, "worker did not stop")
+            self.stats.wall_time = time.perf_counter() - started
+
+    def _start(self, slot: _Slot, queue_path: str) -> None:
+        slot.generation += 1
+        slot.heartbeat = self._context.Value("d", 0.0, lock=False)
+        slot.started = time.time()
+        slot.process = self._context.Process(
+            target=_worker_main,
+            args=(queue_path, slot.owner, self.flow_factory, self.concurrency, self.lease, self.max_attempts,
+                  self.output, slot.heartbeat, self._stop, self.quiet),
+            name=f"intent-worker-{slot.index}",
+            daemon=True,
+        )
+        slot.process.start()
+
+    def _check(self, slot: _Slot) -> Optional[str]:
+        if not slot.process.is_alive():
+            return f"exited with code {slot.process.exitcode}"
+        last = slot.heartbeat.value
+        if last == 0.0:
+            return "did not start" if time.time() - slot.started > self.startup_timeout else None
+        return "stalled" if time.time() - last > self.stall_timeout else None
+
+    def _replace(self, slot: _Slot, queue: SQLiteJobQueue, problem: str) -> None:
+        if slot.process.is_alive():
+            slot.process.kill()
+        slot.process.join()
+        requeued = queue.requeue_owner(slot.owner, f"worker {problem}")
+        logger.warning(f"Worker process {slot.index} ({slot.owner}) {problem}, "
+                       f"{requeued} jobs back in the queue, starting a replacement")
+        self.stats.restarts += 1
+        self._start(slot, queue.path)
@@ -0,0 +1,332 @@
+"""
+HTML report of a profiled run (services/profiler.py)
+
+One self-contained page (inline SVG, no scripts or CDN):
+
+- headline: flow latency and the critical path split by phase (routing,
+  retrieval, generation) and by kind (LLM, tool, wait, crew, step, gap)
+- flow graph: the steps of the flow laid out by their triggers, each with
+  its mean and p95 duration and share of the critical path, and every
+  transition with its dispatch gap and how many emails took it. Router
+  edges that crewAI cannot infer statically come from the observed runs;
+  static edges never taken are dashed.
+- flame graph of the critical path over all emails:
+  phase > step > task > LLM / tool / wait / crew
+- Gantt chart of the slowest emails: steps, their tasks' LLM, tool and
+  wait spans, the critical path under them, and event loop stalls in red
+- tables of nodes, edges and waits
+"""
+import collections
+import contextlib
+import html
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from intent_not_identified_flow.services.profiler import (
+    PHASES, SEGMENT_KINDS, STEP_PHASES, EmailTimeline, ProfileSummary, summarize,
+)
+
+PHASE_COLORS = {"routing": "#4e79a7", "retrieval": "#f28e2b", "generation": "#59a14f", "other": "#9c9c9c"}
+KIND_COLORS = {"llm": "#e15759", "tool": "#76b7b2", "wait": "#edc948", "crew": "#b07aa1", "step": "#bab0ac",
+               "gap": "#ff9da7"}
+KIND_LABELS = {"llm": "LLM calls", "tool": "tool calls", "wait": "waits (queue, scheduler, batch, locks)",
+               "crew": "agent loop", "step": "step code", "gap": "flow dispatch"}
+
+_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font: 13px sans-serif; margin: 24px; color: #222; }}
+h2 {{ margin-top: 32px; }}
+table {{ border-collapse: collapse; margin: 8px 0; }}
+td, th {{ padding: 3px 10px; border-bottom: 1px solid #ddd; text-align: right; }}
+td:first-child, th:first-child {{ text-align: left; }}
+svg text {{ font: 11px sans-serif; }}
+.note {{ color: #666; }}
+</style></head><body>
+<h1>{title}</h1>
+{body}
+</body></html>
+"""
+
+
+def render_report(timelines: List[EmailTimeline], stalls: List[Tuple[float, float]] = (), flow: Any = None,
+                  slowest: int = 20, title: str = "Intent flow profile") -> str:
+    """The report page for the timelines of finished emails; flow adds the edges of its static structure"""
+    summary = summarize(timelines, stalls)
+    sections = [
+        _headline(summary),
+        "<h2>Flow graph</h2>",
+        "<p class=note>Mean and p95 duration of every step and its share of the critical path; on the "
+        "edges the mean time between a step ending and the next starting, and the emails that took "
+        "the edge. Dashed edges were never taken.</p>",
+        _graph_svg(summary, flow),
+        "<h2>Critical path flame graph</h2>",
+        "<p class=note>Critical path time of all emails: phase, step, task, then what the task "
+        "waited on.</p>",
+        _flame_svg(summary),
+        f"<h2>Slowest {min(slowest, len(timelines))} emails</h2>",
+        "<p class=note>Per email: steps, below them the tasks' LLM, tool and wait spans, and the "
+        "critical path; event loop stalls in red.</p>",
+        _gantt_svg(timelines, stalls, slowest),
+        "<h2>Details</h2>",
+        _tables(summary),
+    ]
+    return _PAGE.format(title=html.escape(title), body="\n".join(sections))
+
+
+def _seconds(value: float) -> str:
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.2f}s"
+
+
+def _headline(summary: ProfileSummary) -> str:
+    emails = max(summary.emails, 1)
+    parts = [f"<p>{summary.emails} emails, flow p50 {_seconds(summary.wall_p50)}, "
+             f"p95 {_seconds(summary.wall_p95)}, critical path {_seconds(summary.critical_total / emails)} per "
+             f"email. Event loop stalls: {summary.stalls} ({_seconds(summary.stall_time)}), "
+             f"{_seconds(summary.stall_on_path / emails)} per email on its critical path.</p>"]
+    if summary.critical_total:
+        phase = max(PHASES, key=summary.phase_share)
+        kinds = collections.Counter()
+        for node in summary.nodes:
+            if node.phase == phase:
+                kinds.update(node.critical_by_kind)
+        kind = kinds.most_common(1)[0][0] if kinds else "llm"
+        parts.append(f"<p><b>Optimize {phase} first</b>: {summary.phase_share(phase):.0%} of the critical "
+                     f"path, mostly {KIND_LABELS[kind]}.</p>")
+    parts.append(_share_bar("Phase", [(phase, summary.by_phase.get(phase, 0.0), PHASE_COLORS[phase])
+                                      for phase in (*PHASES, "other")], summary.critical_total))
+    parts.append(_share_bar("Kind", [(KIND_LABELS[kind], summary.by_kind.get(kind, 0.0), KIND_COLORS[kind])
+                                     for kind in SEGMENT_KINDS], summary.critical_total))
+    return "\n".join(parts)
+
+
+def _share_bar(label: str, parts: List[Tuple[str, float, str]], total: float, width: int = 900) -> str:
+    shapes, x = [], 0.0
+    for name, value, color in parts:
+        if not total or value <= 0:
+            continue
+        w = width * value / total
+        tip = html.escape(f"{name}: {_seconds(value)} ({value / total:.0%})")
+        shapes.append(f'<rect x="{100 + x:.1f}" y="0" width="{w:.1f}" height="22" fill="{color}">'
+                      f'<title>{tip}</title></rect>')
+        if w > 60:
+            shapes.append(f'<text x="{104 + x:.1f}" y="15" fill="#fff">{html.escape(name)} {value / total:.0%}'
+                          f'</text>')
+        x += w
+    return (f'<svg width="{width + 110}" height="26"><text x="0" y="15">{label}</text>'
+            + "".join(shapes) + "</svg><br>")
+
+
+def _static_edges(flow: Any) -> List[Tuple[str, str]]:
+    if flow is None:
+        return []
+    from crewai.flow.visualization import build_flow_structure
+    # Routers make crewAI warn that their edges are not known statically; the observed runs supply them
+    builder_logger = logging.getLogger("crewai.flow.visualization.builder")
+    with _logger_level(builder_logger, logging.ERROR):
+        structure = build_flow_structure(flow)
+    return [(edge["source"], edge["target"]) for edge in structure["edges"]] + [
+        (name, name) for name in structure["nodes"]  # keeps steps that never ran on the graph
+    ]
+
+
+@contextlib.contextmanager
+def _logger_level(logger: logging.Logger, level: int):
+    previous = logger.level
+    logger.setLevel(level)
+    try:
+        yield
+    finally:
+        logger.setLevel(previous)
+
+
+def _layers(names: List[str], edges: List[Tuple[str, str]]) -> Dict[str, int]:
+    """Longest distance from a step without predecessors"""
+    layer = {name: 0 for name in names}
+    for _ in range(len(names)):
+        changed = False
+        for source, target in edges:
+            if source != target and layer[target] < layer[source] + 1 <= len(names):
+                layer[target] = layer[source] + 1
+                changed = True
+        if not changed:
+            break
+    return layer
+
+
+def _graph_svg(summary: ProfileSummary, flow: Any) -> str:
+    nodes = {node.step: node for node in summary.nodes}
+    observed = {(edge.source, edge.target): edge for edge in summary.edges}
+    static = _static_edges(flow)
+    names = list(dict.fromkeys([name for edge in static for name in edge] + list(nodes)))
+    edges = list(dict.fromkeys([edge for edge in static if edge[0] != edge[1]] + list(observed)))
+    if not names:
+        return "<p>No steps recorded.</p>"
+    layer = _layers(names, edges)
+    rows: Dict[int, int] = collections.Counter()
+    position = {}
+    for name in names:
+        position[name] = (30 + layer[name] * 270, 30 + rows[layer[name]] * 120)
+        rows[layer[name]] += 1
+    box_w, box_h = 210, 74
+    width = max(x for x, _ in position.values()) + box_w + 40
+    height = max(y for _, y in position.values()) + box_h + 40
+    hottest = max((node.critical_total for node in nodes.values()), default=0.0) or 1.0
+
+    shapes = ['<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="7" '
+              'markerHeight="7" orient="auto"><path d="M0,0 L10,5 L0,10 z" fill="#555"/></marker></defs>']
+    for source, target in edges:
+        (sx, sy), (tx, ty) = position[source], position[target]
+        x1, y1, x2, y2 = sx + box_w, sy + box_h / 2, tx, ty + box_h / 2
+        edge = observed.get((source, target))
+        if x2 > x1:
+            path = f"M{x1},{y1} C{x1 + 40},{y1} {x2 - 40},{y2} {x2},{y2}"
+        else:
+            # Back or same-layer edge: around below the boxes
+            bottom = max(sy, ty) + box_h + 20
+            path = f"M{sx + box_w / 2},{sy + box_h} C{sx + box_w / 2},{bottom} {tx + box_w / 2},{bottom} " \
+                   f"{tx + box_w / 2},{ty + box_h}"
+        if edge is None:
+            shapes.append(f'<path d="{path}" fill="none" stroke="#999" stroke-dasharray="5,4" '
+                          f'marker-end="url(#arrow)"/>')
+            continue
+        stroke = 1 + 5 * edge.count / max(summary.emails, 1)
+        tip = html.escape(f"{source} -> {target}: {edge.count} emails, gap mean {_seconds(edge.gap_avg)}, "
+                          f"p95 {_seconds(edge.gap_p95)}")
+        shapes.append(f'<path d="{path}" fill="none" stroke="#555" stroke-width="{stroke:.1f}" '
+                      f'marker-end="url(#arrow)"><title>{tip}</title></path>')
+        mx, my = (x1 + x2) / 2, (y1 + y2) / 2 - 6
+        shapes.append(f'<text x="{mx:.0f}" y="{my:.0f}" text-anchor="middle" fill="#333">'
+                      f'{_seconds(edge.gap_avg)} · {edge.count}×</text>')
+    for name in names:
+        x, y = position[name]
+        node = nodes.get(name)
+        color = PHASE_COLORS[STEP_PHASES.get(name, "other")]
+        heat = 0.12 + 0.75 * (node.critical_total / hottest if node else 0.0)
+        lines = [name]
+        if node:
+            share = node.critical_total / summary.critical_total if summary.critical_total else 0.0
+            lines += [f"avg {_seconds(node.wall_avg)} · p95 {_seconds(node.wall_p95)}",
+                      f"critical {share:.0%} · {node.count} runs"]
+        else:
+            lines.append("never ran")
+        shapes.append(f'<rect x="{x}" y="{y}" width="{box_w}" height="{box_h}" rx="6" fill="{color}" '
+                      f'fill-opacity="{heat:.2f}" stroke="{color}"><title>{html.escape(name)}</title></rect>')
+        for index, line in enumerate(lines):
+            weight = ' font-weight="bold"' if index == 0 else ""
+            shapes.append(f'<text x="{x + 8}" y="{y + 20 + index * 18}"{weight}>{html.escape(line[:34])}</text>')
+    return f'<svg width="{width}" height="{height}">' + "".join(shapes) + "</svg>"
+
+
+def _flame_svg(summary: ProfileSummary, width: int = 1200, row: int = 20) -> str:
+    total = sum(summary.flame.values())
+    if not total:
+        return "<p>No critical path recorded.</p>"
+    tree: Dict[str, Any] = {"value": 0.0, "children": {}}
+    for stack, seconds in summary.flame.items():
+        node = tree
+        node["value"] += seconds
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"value": 0.0, "children": {}})
+            node["value"] += seconds
+    shapes, depth = [], [0]
+
+    def draw(children: Dict[str, Any], x: float, level: int, phase: Optional[str]) -> None:
+        depth[0] = max(depth[0], level + 1)
+        for frame, node in sorted(children.items(), key=lambda item: -item[1]["value"]):
+            w = width * node["value"] / total
+            frame_phase = frame if level == 0 else phase
+            kind = frame.split(":")[0]
+            color = KIND_COLORS.get(kind) if not node["children"] else PHASE_COLORS.get(frame_phase, "#9c9c9c")
+            tip = html.escape(f"{frame}: {_seconds(node['value'])} ({node['value'] / total:.1%})")
+            shapes.append(f'<rect x="{x:.1f}" y="{level * row}" width="{max(w - 1, 0.5):.1f}" height="{row - 2}" '
+                          f'fill="{color or "#9c9c9c"}"><title>{tip}</title></rect>')
+            if w > 50:
+                label = frame[:int(w / 6.5)]
+                shapes.append(f'<text x="{x + 3:.1f}" y="{level * row + 13}">{html.escape(label)}</text>')
+            draw(node["children"], x, level + 1, frame_phase)
+            x += w
+
+    draw(tree["children"], 0.0, 0, None)
+    return f'<svg width="{width}" height="{depth[0] * row}">' + "".join(shapes) + "</svg>"
+
+
+def _gantt_svg(timelines: List[EmailTimeline], stalls: List[Tuple[float, float]], slowest: int,
+               width: int = 1000, row: int = 40) -> str:
+    shown = sorted(timelines, key=lambda timeline: timeline.end - timeline.start, reverse=True)[:slowest]
+    if not shown:
+        return "<p>No finished emails.</p>"
+    label_w = 180
+    span = max(timeline.end - timeline.start for timeline in shown) or 1.0
+    scale = width / span
+    shapes = [f'<text x="{label_w}" y="12">0</text>',
+              f'<text x="{label_w + width}" y="12" text-anchor="end">{_seconds(span)}</text>']
+    for index, timeline in enumerate(shown):
+        top = 20 + index * row
+        origin = timeline.start
+
+        def x(at: float) -> float:
+            return label_w + (at - origin) * scale
+
+        shapes.append(f'<text x="0" y="{top + 14}">{html.escape(timeline.email_id[:22])} '
+                      f'{_seconds(timeline.end - timeline.start)}</text>')
+        for started, ended in stalls:
+            if ended > timeline.start and started < timeline.end:
+                shapes.append(f'<rect x="{x(max(started, origin)):.1f}" y="{top}" '
+                              f'width="{max((min(ended, timeline.end) - max(started, origin)) * scale, 1):.1f}" '
+                              f'height="{row - 6}" fill="#d62728" fill-opacity="0.25">'
+                              f'<title>event loop stall {_seconds(ended - started)}</title></rect>')
+        for step in timeline.steps:
+            color = PHASE_COLORS[STEP_PHASES.get(step.stage, "other")]
+            tip = html.escape(f"{step.stage}: {_seconds(step.wall_time)}" + (f" ({step.error})" if step.error else ""))
+            shapes.append(f'<rect x="{x(step.started_at):.1f}" y="{top}" width="{max(step.wall_time * scale, 1):.1f}" '
+                          f'height="12" fill="{color}" stroke="#fff" stroke-width="0.5"><title>{tip}</title></rect>')
+        for task in timeline.tasks:
+            tip = html.escape(f"{task.stage}: {_seconds(task.wall_time)}" + (f" ({task.error})" if task.error else ""))
+            shapes.append(f'<rect x="{x(task.started_at):.1f}" y="{top + 14}" '
+                          f'width="{max(task.wall_time * scale, 1):.1f}" height="10" fill="#ddd"><title>{tip}'
+                          f'</title></rect>')
+            for span_ in task.spans or ():
+                tip = html.escape(f"{task.stage} {span_.kind} {span_.name}: {_seconds(span_.end - span_.start)}")
+                shapes.append(f'<rect x="{x(span_.start):.1f}" y="{top + 15}" '
+                              f'width="{max((span_.end - span_.start) * scale, 1):.1f}" height="8" '
+                              f'fill="{KIND_COLORS.get(span_.kind, "#999")}"><title>{tip}</title></rect>')
+        for segment in timeline.critical_path():
+            tip = html.escape(f"critical: {segment.step} {segment.kind} {segment.name}: {_seconds(segment.duration)}")
+            shapes.append(f'<rect x="{x(segment.start):.1f}" y="{top + 26}" '
+                          f'width="{max(segment.duration * scale, 0.5):.1f}" height="5" '
+                          f'fill="{KIND_COLORS[segment.kind]}"><title>{tip}</title></rect>')
+    legend = " ".join(f'<span style="color:{color}">■</span> {html.escape(label)}'
+                      for label, color in [*((phase, PHASE_COLORS[phase]) for phase in PHASES),
+                                           *((KIND_LABELS[kind], KIND_COLORS[kind]) for kind in SEGMENT_KINDS),
+                                           ("event loop stall", "#d62728")])
+    return (f'<p>{legend}</p><svg width="{label_w + width + 20}" height="{30 + len(shown) * row}">'
+            + "".join(shapes) + "</svg>")
+
+
+def _tables(summary: ProfileSummary) -> str:
+    emails = max(summary.emails, 1)
+    total = summary.critical_total or 1.0
+    kinds = "".join(f"<th>{kind}</th>" for kind in SEGMENT_KINDS)
+    rows = []
+    for node in sorted(summary.nodes, key=lambda node: -node.critical_total):
+        shares = "".join(f"<td>{node.critical_by_kind.get(kind, 0.0) / (node.critical_total or 1.0):.0%}</td>"
+                         for kind in SEGMENT_KINDS)
+        rows.append(f"<tr><td>{html.escape(node.step)}</td><td>{node.phase}</td><td>{node.count}</td>"
+                    f"<td>{_seconds(node.wall_avg)}</td><td>{_seconds(node.wall_p95)}</td>"
+                    f"<td>{_seconds(node.critical_total / emails)}</td><td>{node.critical_total / total:.0%}</td>"
+                    f"{shares}</tr>")
+    parts = [f"<table><tr><th>step</th><th>phase</th><th>runs</th><th>avg</th><th>p95</th>"
+             f"<th>critical / email</th><th>critical share</th>{kinds}</tr>{''.join(rows)}</table>"]
+    rows = [f"<tr><td>{html.escape(edge.source)} → {html.escape(edge.target)}</td><td>{edge.count}</td>"
+            f"<td>{_seconds(edge.gap_avg)}</td><td>{_seconds(edge.gap_p95)}</td></tr>"
+            for edge in sorted(summary.edges, key=lambda edge: -edge.count)]
+    parts.append(f"<table><tr><th>edge</th><th>emails</th><th>gap avg</th><th>gap p95</th></tr>{''.join(rows)}"
+                 f"</table>")
+    for title, values in (("wait on the critical path", summary.waits), ("LLM model", summary.llm_models)):
+        rows = [f"<tr><td>{html.escape(name)}</td><td>{_seconds(seconds / emails)}</td>"
+                f"<td>{seconds / total:.1%}</td></tr>" for name, seconds in values.items()]
+        if rows:
+            parts.append(f"<table><tr><th>{title}</th><th>per email</th><th>critical share</th></tr>"
+                         f"{''.join(rows)}</table>")
+    return "\n".join(parts)
@@ -0,0 +1,433 @@
+"""
+Flow execution profiler: per-email timelines, critical paths and where the time goes
+
+The static flow plot (generate_flow_plot) shows the structure of the flow,
+not where an email spends its time. FlowProfiler is an instrumentation sink
+that asks for the detailed records (StageRecord.spans). From them it keeps
+one timeline per email: the flow, its steps, the crew tasks, and inside
+each task its LLM calls, tool calls and waits. The waits are a free worker
+thread, scheduler admission, agent construction, the analyze_intent batch
+window and the batch call it waits for. While started, it also records
+event loop stalls, i.e. wake-ups of a 10ms timer that come later than
+stall_threshold.
+
+The critical path of an email is the chain of work its end waited for. It
+is walked backwards from the end of the flow:
+
+- the step running at that point, down to the task it waited for
+- the task back to its start, which may lie in an earlier step when the
+  task was started early (parallel mode); the steps it overlapped are
+  then off the path
+- the gap back to the step that triggered the next one (flow dispatch)
+
+Every piece is split into LLM, tool, wait and the remaining crew (agent
+loop) or step time, and every step belongs to a phase: routing, retrieval
+or generation. Aggregated over many emails, that is what
+services/profile_report.py renders as HTML. It shows the flow graph with the
+latency of every node and edge, a flame graph of the critical path, and a
+Gantt chart of the slowest emails.
+
+Enabled through the environment by get_profiler: INTENT_PROFILE is the
+path of the HTML report written by async_batch_kickoff.
+"""
+import collections
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.services.batch_runner import percentile
+from intent_not_identified_flow.services.instrumentation import (
+    EventLoopLagMonitor, Instrumentation, MetricsSink, StageRecord, get_instrumentation,
+)
+
+logger = logging.getLogger(__name__)
+
+# Which optimization area a flow step's time is charged to
+STEP_PHASES = {
+    "intent_not_identified": "routing",
+    "text_analysis_general_info": "routing",
+    "decision_prepare_info": "routing",
+    "route_based_on_decision": "routing",
+    "api_knowledge_base_finding": "retrieval",
+    "creating_answer_general_info": "generation",
+    "drafting_summary_from_answer": "generation",
+    "creating_summary_from_email": "generation",
+    "switching_to_agent_with_materials": "generation",
+}
+PHASES = ("routing", "retrieval", "generation")
+
+# Kinds of critical path segments, in report order
+SEGMENT_KINDS = ("llm", "tool", "wait", "crew", "step", "gap")
+
+# Timestamps of one stage come from different clocks (event bus, perf_counter)
+_EPSILON = 0.002
+_CANCELLED = "CancelledError"
+
+
+class Segment(BaseModel):
+    """One piece of an email's critical path (epoch seconds)"""
+    step: str
+    phase: str
+    kind: str
+    name: str = ""
+    task: Optional[str] = None
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+
+
+class EmailTimeline(BaseModel):
+    """Everything recorded for one email"""
+    email_id: str
+    flow: Optional[StageRecord] = None
+    steps: List[StageRecord] = []
+    tasks: List[StageRecord] = []
+
+    @property
+    def start(self) -> float:
+        if self.flow is not None:
+            return self.flow.started_at
+        return min(record.started_at for record in self.steps + self.tasks)
+
+    @property
+    def end(self) -> float:
+        if self.flow is not None:
+            return self.flow.ended_at
+        return max(record.ended_at for record in self.steps + self.tasks)
+
+    def triggers(self) -> List[Tuple[Optional[StageRecord], StageRecord]]:
+        """(step that triggered it, step) for every step; None for the start method"""
+        steps = sorted(self.steps, key=lambda record: record.started_at)
+        pairs = []
+        for index, step in enumerate(steps):
+            earlier = [other for other in steps[:index] if other.ended_at <= step.started_at + _EPSILON]
+            pairs.append((max(earlier, key=lambda record: record.ended_at) if earlier else None, step))
+        return pairs
+
+    def critical_path(self) -> List[Segment]:
+        """The chain of work the end of the flow waited for, in time order"""
+        steps = [step for step in self.steps if step.error != _CANCELLED]
+        tasks = [task for task in self.tasks if task.error != _CANCELLED]
+        if not steps:
+            return []
+        begin = self.start
+        cursor = self.end
+        segments: List[Segment] = []
+        last_step = None
+        while cursor > begin + _EPSILON:
+            running = [step for step in steps if step.started_at < cursor - _EPSILON <= step.ended_at + _EPSILON]
+            if not running:
+                # Flow dispatch between a step and the next one it triggered
+                # Started strictly before the cursor, so the walk always moves back (steps can take 0s)
+                earlier = [step for step in steps
+                           if step.ended_at <= cursor and step.started_at < cursor - _EPSILON]
+                previous = max(earlier, key=lambda step: step.ended_at) if earlier else None
+                gap_start = previous.ended_at if previous is not None else begin
+                # Charged to the step dispatched next, the time after the last step to the flow
+                owner = last_step or (previous.stage if previous is not None else steps[0].stage)
+                name = f"{previous.stage if previous is not None else 'start'} -> {last_step or 'end'}"
+                segments.append(_segment(owner, "gap", name, None, gap_start, cursor))
+                if previous is None:
+                    break
+                cursor = previous.ended_at
+                last_step = previous.stage
+                continue
+            step = max(running, key=lambda record: record.ended_at)
+            last_step = step.stage
+            awaited = [task for task in tasks if step.started_at < task.ended_at <= cursor + _EPSILON]
+            if not awaited:
+                segments.append(_segment(step.stage, "step", step.stage, None, step.started_at, cursor))
+                cursor = step.started_at
+                continue
+            task = max(awaited, key=lambda record: record.ended_at)
+            segments.append(_segment(step.stage, "step", step.stage, None, min(task.ended_at, cursor), cursor))
+            segments.extend(_task_segments(step.stage, task, max(task.started_at, begin), min(task.ended_at, cursor)))
+            cursor = min(cursor, max(task.started_at, begin))
+            # The task is accounted for; an earlier one in the same step is found on the next round
+            tasks.remove(task)
+        return sorted((segment for segment in segments if segment.duration > 0), key=lambda s: s.start)
+
+
+def _segment(step: str, kind: str, name: str, task: Optional[str], start: float, end: float) -> Segment:
+    return Segment(step=step, phase=STEP_PHASES.get(step, "other"), kind=kind, name=name, task=task,
+                   start=start, end=end)
+
+
+def _task_segments(step: str, task: StageRecord, start: float, end: float) -> List[Segment]:
+    """The part [start, end] of a task: its LLM, tool and wait spans, the rest is crew time"""
+    segments = []
+    cursor = start
+    for span in sorted(task.spans or (), key=lambda span: span.start):
+        span_start, span_end = max(span.start, cursor), min(span.end, end)
+        if span_end <= span_start:
+            continue
+        if span_start > cursor:
+            segments.append(_segment(step, "crew", task.stage, task.stage, cursor, span_start))
+        segments.append(_segment(step, span.kind, span.name, task.stage, span_start, span_end))
+        cursor = span_end
+    if end > cursor:
+        segments.append(_segment(step, "crew", task.stage, task.stage, cursor, end))
+    return segments
+
+
+class NodeProfile(BaseModel):
+    """Aggregate of one flow step over all emails"""
+    step: str
+    phase: str
+    count: int = 0
+    wall_avg: float = 0.0
+    wall_p95: float = 0.0
+    critical_total: float = 0.0
+    critical_by_kind: Dict[str, float] = {}
+
+
+class EdgeProfile(BaseModel):
+    """Aggregate of one transition between flow steps: the dispatch gap"""
+    source: str
+    target: str
+    count: int = 0
+    gap_avg: float = 0.0
+    gap_p95: float = 0.0
+
+
+class ProfileSummary(BaseModel):
+    """Where the emails of a profiled run spent their time"""
+    emails: int
+    wall_p50: float
+    wall_p95: float
+    critical_total: float
+    by_phase: Dict[str, float]
+    by_kind: Dict[str, float]
+    waits: Dict[str, float]
+    llm_models: Dict[str, float]
+    nodes: List[NodeProfile]
+    edges: List[EdgeProfile]
+    flame: Dict[str, float]
+    stalls: int
+    stall_time: float
+    stall_on_path: float
+
+    def phase_share(self, phase: str) -> float:
+        return self.by_phase.get(phase, 0.0) / self.critical_total if self.critical_total else 0.0
+
+
+class FlowProfiler(MetricsSink):
+    """
+    Instrumentation sink keeping the timeline of every email (up to max_emails)
+
+    attach() adds it to an Instrumentation; start() and stop() run the event loop
+    stall monitor on the current loop.
+    """
+
+    wants_spans = True
+
+    def __init__(self, max_emails: int = 10_000, stall_threshold: float = 0.05):
+        self.max_emails = max_emails
+        self.stall_threshold = stall_threshold
+        self.dropped = 0
+        self._timelines: Dict[str, EmailTimeline] = collections.OrderedDict()
+        self._stalls: List[Tuple[float, float]] = []
+        self._monitor: Optional[EventLoopLagMonitor] = None
+        self._lock = threading.Lock()
+
+    def attach(self, instrumentation: Instrumentation = None) -> "FlowProfiler":
+        (instrumentation or get_instrumentation()).add_sink(self)
+        return self
+
+    def detach(self, instrumentation: Instrumentation = None) -> None:
+        (instrumentation or get_instrumentation()).remove_sink(self)
+
+    def start(self) -> None:
+        self._monitor = EventLoopLagMonitor(stall_threshold=self.stall_threshold, on_stall=self._stalled)
+        self._monitor.start()
+
+    async def stop(self) -> None:
+        if self._monitor is not None:
+            await self._monitor.stop()
+            self._monitor = None
+
+    def emit(self, record: StageRecord) -> None:
+        if record.kind == "stall":
+            with self._lock:
+                self._stalls.append((record.started_at, record.ended_at))
+            return
+        if record.email_id is None:
+            # Stages serving several emails (batch calls) have no timeline of their own
+            return
+        with self._lock:
+            timeline = self._timelines.get(record.email_id)
+            if timeline is None:
+                if len(self._timelines) >= self.max_emails:
+                    self.dropped += 1
+                    return
+                timeline = self._timelines[record.email_id] = EmailTimeline(email_id=record.email_id)
+            if record.kind == "flow":
+                timeline.flow = record
+            elif record.kind == "step":
+                timeline.steps.append(record)
+            else:
+                timeline.tasks.append(record)
+
+    def _stalled(self, started: float, ended: float) -> None:
+        with self._lock:
+            self._stalls.append((started, ended))
+
+    def timelines(self) -> List[EmailTimeline]:
+        """Timelines of the emails whose flow has finished"""
+        with self._lock:
+            return [timeline.model_copy() for timeline in self._timelines.values() if timeline.flow is not None]
+
+    def stalls(self) -> List[Tuple[float, float]]:
+        with self._lock:
+            return list(self._stalls)
+
+    def summary(self) -> ProfileSummary:
+        return summarize(self.timelines(), self.stalls())
+
+    def write_jsonl(self, path: str) -> None:
+        """All records and stalls, in the format load_records reads back"""
+        with open(path, "w", encoding="utf-8") as f:
+            for timeline in self.timelines():
+                for record in [timeline.flow, *timeline.steps, *timeline.tasks]:
+                    f.write(record.model_dump_json() + "\n")
+            for started, ended in self.stalls():
+                record = StageRecord(stage="event_loop", kind="stall", started_at=started, wall_time=ended - started)
+                f.write(record.model_dump_json() + "\n")
+
+    def write_report(self, path: str, flow: Any = None, slowest: int = 20) -> None:
+        """HTML report of the run (see services/profile_report.py); flow gives the static graph"""
+        from intent_not_identified_flow.services.profile_report import render_report
+        timelines = self.timelines()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_report(timelines, self.stalls(), flow=flow, slowest=slowest))
+        logger.info("Flow profile of %d emails written to %s", len(timelines), path)
+
+    def close(self) -> None:
+        pass
+
+
+def load_records(paths: Iterable[str], profiler: FlowProfiler = None) -> FlowProfiler:
+    """A profiler holding the records of JSONL files (FlowProfiler.write_jsonl or INTENT_METRICS_JSONL)"""
+    profiler = profiler or FlowProfiler()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    profiler.emit(StageRecord.model_validate(json.loads(line)))
+    return profiler
+
+
+def summarize(timelines: List[EmailTimeline], stalls: List[Tuple[float, float]] = ()) -> ProfileSummary:
+    """Critical paths, node and edge latencies of many emails"""
+    by_phase: Dict[str, float] = collections.Counter()
+    by_kind: Dict[str, float] = collections.Counter()
+    waits: Dict[str, float] = collections.Counter()
+    models: Dict[str, float] = collections.Counter()
+    flame: Dict[str, float] = collections.Counter()
+    node_walls: Dict[str, List[float]] = collections.defaultdict(list)
+    node_critical: Dict[str, Dict[str, float]] = collections.defaultdict(collections.Counter)
+    edge_gaps: Dict[Tuple[str, str], List[float]] = collections.defaultdict(list)
+    walls = []
+    stall_on_path = 0.0
+
+    for timeline in timelines:
+        walls.append(timeline.end - timeline.start)
+        for step in timeline.steps:
+            node_walls[step.stage].append(step.wall_time)
+        for previous, step in timeline.triggers():
+            if previous is not None:
+                edge_gaps[(previous.stage, step.stage)].append(max(0.0, step.started_at - previous.ended_at))
+        for segment in timeline.critical_path():
+            seconds = segment.duration
+            by_phase[segment.phase] += seconds
+            by_kind[segment.kind] += seconds
+            node_critical[segment.step][segment.kind] += seconds
+            if segment.kind == "wait":
+                waits[segment.name] += seconds
+            if segment.kind == "llm":
+                models[segment.name or "-"] += seconds
+            frames = [segment.phase, segment.step]
+            if segment.task:
+                frames.append(segment.task)
+            frames.append(f"{segment.kind}: {segment.name}" if segment.kind in ("llm", "tool", "wait")
+                          else segment.kind)
+            flame[";".join(frames)] += seconds
+            stall_on_path += sum(max(0.0, min(end, segment.end) - max(start, segment.start))
+                                 for start, end in stalls)
+
+    nodes = [
+        NodeProfile(step=step, phase=STEP_PHASES.get(step, "other"), count=len(samples),
+                    wall_avg=sum(samples) / len(samples), wall_p95=percentile(samples, 95),
+                    critical_total=sum(node_critical[step].values()),
+                    critical_by_kind=dict(node_critical[step]))
+        for step, samples in node_walls.items()
+    ]
+    edges = [
+        EdgeProfile(source=source, target=target, count=len(gaps), gap_avg=sum(gaps) / len(gaps),
+                    gap_p95=percentile(gaps, 95))
+        for (source, target), gaps in edge_gaps.items()
+    ]
+    return ProfileSummary(
+        emails=len(timelines),
+        wall_p50=percentile(walls, 50),
+        wall_p95=percentile(walls, 95),
+        critical_total=sum(by_kind.values()),
+        by_phase=dict(by_phase),
+        by_kind=dict(by_kind),
+        waits=dict(waits.most_common()),
+        llm_models=dict(models.most_common()),
+        nodes=nodes,
+        edges=edges,
+        flame=dict(flame),
+        stalls=len(stalls),
+        stall_time=sum(end - start for start, end in stalls),
+        stall_on_path=stall_on_path,
+    )
+
+
+def format_summary(summary: ProfileSummary) -> str:
+    """Plain-text version of the report's headline numbers"""
+    total = summary.critical_total or 1.0
+    emails = max(summary.emails, 1)
+    lines = [
+        f"{summary.emails} emails, flow p50 {summary.wall_p50:.3f}s  p95 {summary.wall_p95:.3f}s, "
+        f"critical path {summary.critical_total / emails:.3f}s per email",
+        "Critical path by phase: " + "  ".join(
+            f"{phase} {summary.by_phase.get(phase, 0.0) / total:.0%}" for phase in PHASES),
+        "Critical path by kind:  " + "  ".join(
+            f"{kind} {summary.by_kind.get(kind, 0.0) / total:.0%}" for kind in SEGMENT_KINDS),
+        f"Event loop stalls: {summary.stalls} ({summary.stall_time:.3f}s), "
+        f"{summary.stall_on_path / emails:.3f}s per email on its critical path",
+    ]
+    if summary.waits:
+        lines.append("Waits on the critical path per email: " + "  ".join(
+            f"{name} {seconds / emails:.3f}s" for name, seconds in list(summary.waits.items())[:6]))
+    return "\n".join(lines)
+
+
+_profiler: Optional[FlowProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Optional[FlowProfiler]:
+    """Process-wide profiler attached to the instrumentation when INTENT_PROFILE is set, else None"""
+    global _profiler
+    if not os.environ.get("INTENT_PROFILE"):
+        return None
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = FlowProfiler().attach()
+    return _profiler
+
+
+def profile_path() -> Optional[str]:
+    """Where the report of the process-wide profiler goes (INTENT_PROFILE)"""
+    return os.environ.get("INTENT_PROFILE") or None
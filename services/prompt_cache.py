@@ -0,0 +1,225 @@
+"""
+Cacheable prompt prefixes: assembly, cache breakpoints and hit statistics
+
+Providers reuse the work done on a prompt prefix they have seen recently.
+Anthropic caches up to explicit breakpoints for 5 minutes, reads cost a
+tenth of the input price, and cached tokens are not prefilled again before
+the first output token. A prefix only matches when it is byte-identical, so
+the task prompts (crews/intent_crew/prompts.py) keep their fixed
+instructions and output format first, then INPUT_MARKER, then the
+per-email inputs.
+
+PromptCacheLLM wraps an agent's LLM. It splits the task message that crewAI
+builds at INPUT_MARKER into two consecutive user messages: the static head,
+marked as a cache breakpoint, and the per-email rest. crewAI already marks
+the end of the system prompt and of the task message. Its Anthropic
+provider turns the markers into cache_control blocks; other providers drop
+them and cache prefixes on their own. Anthropic joins consecutive user
+messages into one turn, so the model reads the same text as before.
+
+Every call is recorded in the process-wide PrefixCacheTracker: size of the
+static prefix, prompt tokens read from and written to the provider's cache
+(from its reported usage), and latency of hits and misses. For one task
+only the prefill differs between a hit and a miss, so the latency
+difference is the time to first token saved.
+Enabled by default in build_llm; INTENT_PROMPT_CACHE=0 sends the task
+message unsplit.
+"""
+import collections
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from crewai.llms.cache import mark_cache_breakpoint
+from crewai.llms.base_llm import BaseLLM
+from pydantic import BaseModel
+
+from intent_not_identified_flow.crews.intent_crew.context_builder import count_tokens
+from intent_not_identified_flow.services.llm_scheduler import DelegatingLLM, prompt_text
+
+# Separates the static part of a task description from the per-email inputs
+INPUT_MARKER = "\n\n--- Input ---\n"
+
+# Provider prices of cache writes and reads, relative to uncached input tokens (Anthropic)
+CACHE_WRITE_PRICE = 1.25
+CACHE_READ_PRICE = 0.1
+
+
+def split_cacheable_prefix(messages: Any) -> Tuple[Any, int]:
+    """
+    Split the first user message at INPUT_MARKER into its static head (a cache breakpoint)
+    and the per-email rest
+
+    Returns:
+        Tuple of (messages to send, tokens up to the end of the static head; 0 when
+        there was nothing to split)
+    """
+    if isinstance(messages, str):
+        return messages, 0
+    for index, message in enumerate(messages):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if not isinstance(content, str) or INPUT_MARKER not in content:
+            return messages, 0
+        head, marker, rest = content.partition(INPUT_MARKER)
+        split = [
+            *messages[:index],
+            mark_cache_breakpoint({"role": "user", "content": head}),
+            {**message, "content": marker.lstrip("\n") + rest},
+            *messages[index + 1:],
+        ]
+        return split, count_tokens(prompt_text(split[:index + 1]))
+    return messages, 0
+
+
+class PrefixCacheSummary(BaseModel):
+    """Prefix cache use of one task's LLM calls"""
+    task: str
+    calls: int
+    hits: int
+    prefix_tokens: int
+    prompt_tokens: int
+    cached_tokens: int
+    cache_write_tokens: int
+    hit_latency: Optional[float] = None
+    miss_latency: Optional[float] = None
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of calls that read a cached prefix"""
+        return self.hits / self.calls if self.calls else 0.0
+
+    @property
+    def token_hit_rate(self) -> float:
+        """Share of prompt tokens read from the cache"""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    @property
+    def input_cost_ratio(self) -> float:
+        """Input cost relative to the same prompts without caching"""
+        if not self.prompt_tokens:
+            return 1.0
+        uncached = self.prompt_tokens - self.cached_tokens - self.cache_write_tokens
+        return (uncached + CACHE_WRITE_PRICE * self.cache_write_tokens
+                + CACHE_READ_PRICE * self.cached_tokens) / self.prompt_tokens
+
+    @property
+    def ttft_saved(self) -> Optional[float]:
+        """Seconds a hit saves against a miss of the same task (mean latencies)"""
+        if self.hit_latency is None or self.miss_latency is None:
+            return None
+        return self.miss_latency - self.hit_latency
+
+
+class PrefixCacheTracker:
+    """Per-task prefix cache hits, tokens and latencies of the LLM calls"""
+
+    def __init__(self):
+        self._calls: Dict[str, Dict[str, Any]] = collections.defaultdict(
+            lambda: {"prefix_tokens": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0,
+                     "hit_latencies": [], "miss_latencies": []}
+        )
+        self._lock = threading.Lock()
+
+    def record(self, task: Optional[str], prefix_tokens: int, prompt_tokens: int, cached_tokens: int,
+               cache_write_tokens: int, seconds: float) -> None:
+        with self._lock:
+            entry = self._calls[task or "-"]
+            entry["prefix_tokens"] += prefix_tokens
+            entry["prompt_tokens"] += prompt_tokens
+            entry["cached_tokens"] += cached_tokens
+            entry["cache_write_tokens"] += cache_write_tokens
+            entry["hit_latencies" if cached_tokens else "miss_latencies"].append(seconds)
+
+    def summary(self) -> List[PrefixCacheSummary]:
+        with self._lock:
+            calls = {task: dict(entry, hit_latencies=list(entry["hit_latencies"]),
+                                miss_latencies=list(entry["miss_latencies"]))
+                     for task, entry in self._calls.items()}
+        summaries = []
+        for task, entry in sorted(calls.items()):
+            hits, misses = entry["hit_latencies"], entry["miss_latencies"]
+            count = len(hits) + len(misses)
+            summaries.append(PrefixCacheSummary(
+                task=task,
+                calls=count,
+                hits=len(hits),
+                prefix_tokens=entry["prefix_tokens"] // count,
+                prompt_tokens=entry["prompt_tokens"],
+                cached_tokens=entry["cached_tokens"],
+                cache_write_tokens=entry["cache_write_tokens"],
+                hit_latency=sum(hits) / len(hits) if hits else None,
+                miss_latency=sum(misses) / len(misses) if misses else None,
+            ))
+        return summaries
+
+    def report(self) -> str:
+        lines = [f"{'task':<24} {'calls':>6} {'prefix':>7} {'hit %':>6} {'tok hit %':>9} {'in cost':>8} "
+                 f"{'hit s':>7} {'miss s':>7} {'ttft saved':>11}"]
+        for s in self.summary():
+            hit = f"{s.hit_latency:>7.3f}" if s.hit_latency is not None else f"{'-':>7}"
+            miss = f"{s.miss_latency:>7.3f}" if s.miss_latency is not None else f"{'-':>7}"
+            saved = f"{s.ttft_saved:>11.3f}" if s.ttft_saved is not None else f"{'-':>11}"
+            lines.append(f"{s.task:<24} {s.calls:>6} {s.prefix_tokens:>7} {s.hit_rate:>6.0%} "
+                         f"{s.token_hit_rate:>9.0%} {s.input_cost_ratio:>8.2f} {hit} {miss} {saved}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+
+
+class PromptCacheLLM(DelegatingLLM):
+    """
+    An agent's LLM whose task message is split into a cacheable static prefix and the per-email rest
+
+    With split off, messages go out as crewAI built them and only the cache use is recorded.
+    """
+
+    tracker: Any
+    split: bool = True
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None):
+        prefix_tokens = 0
+        if self.split:
+            messages, prefix_tokens = split_cacheable_prefix(messages)
+        # The agent owns its LLM for the whole call, so the usage delta is this call's
+        usage_before = self.inner.get_token_usage_summary() if isinstance(self.inner, BaseLLM) else None
+        started = time.perf_counter()
+        with self._forwarded_overrides():
+            response = self.inner.call(messages, tools=tools, callbacks=callbacks,
+                                       available_functions=available_functions, from_task=from_task,
+                                       from_agent=from_agent, response_model=response_model)
+        seconds = time.perf_counter() - started
+        if usage_before is not None:
+            usage = self.inner.get_token_usage_summary().delta_since(usage_before)
+            self.tracker.record(getattr(from_task, "name", None), prefix_tokens, usage.prompt_tokens,
+                                usage.cached_prompt_tokens, usage.cache_creation_tokens, seconds)
+        return response
+
+
+def prefix_cached(llm: BaseLLM, tracker: PrefixCacheTracker = None, split: bool = True) -> PromptCacheLLM:
+    return PromptCacheLLM(model=llm.model, inner=llm, tracker=tracker or get_prefix_cache_tracker(), split=split,
+                          stop=list(llm.stop), stream=llm.stream, is_litellm=llm.is_litellm)
+
+
+def prompt_cache_enabled() -> bool:
+    """Whether task messages are split for prefix caching (INTENT_PROMPT_CACHE, on by default)"""
+    return os.environ.get("INTENT_PROMPT_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+_tracker: Optional[PrefixCacheTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_prefix_cache_tracker() -> PrefixCacheTracker:
+    """Process-wide PrefixCacheTracker"""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = PrefixCacheTracker()
+    return _tracker
@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pydantic import BaseModel
+
+# A run of whitespace; collapsed to one space, so word boundaries stay part of the key
+_WHITESPACE = re.compile(r"\s+")
+
+
+class CacheStats(BaseModel):
+    """Hit/miss counters for a ResultCache"""
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class MemoryTier:
+    """In-memory LRU tier with TTL and entry-count eviction"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str, stats: CacheStats) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if self.ttl is not None and time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, stats: CacheStats, stored_at: float = None) -> None:
+        self._entries[key] = (value, stored_at or time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SQLiteTier:
+    """On-disk tier in a single SQLite file, evicting least recently used entries"""
+
+    def __init__(self, path: str, max_entries: int = 100_000, ttl: Optional[float] = 7 * 24 * 3600.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def get(self, key: str, stats: CacheStats) -> Optional[tuple]:
+        row = self._conn.execute("SELECT value, stored_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if self.ttl is not None and now - row[1] > self.ttl:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            stats.expirations += 1
+            return None
+        self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        return row
+
+    def set(self, key: str, value: str, stats: CacheStats) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, now, now),
+        )
+        overflow = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            stats.evictions += overflow
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM results")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of task results
+
+    Entries are keyed on the task name plus a hash of the normalized task inputs,
+    so interpolated prompts identical up to whitespace are answered without an
+    LLM call. Lookups go to the in-memory LRU tier first, then to the optional
+    SQLite tier; disk hits are promoted to memory.
+
+    get_async/set_async are for the event loop: the memory tier is served
+    inline and only the SQLite tier goes to a worker thread.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 3600.0,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 100_000,
+        disk_ttl: Optional[float] = 7 * 24 * 3600.0,
+        ignored_inputs: Iterable[str] = (),
+    ):
+        """
+        Args:
+            max_entries: Size of the in-memory LRU tier
+            ttl: Seconds an in-memory entry stays valid (None = forever)
+            disk_path: SQLite file for the on-disk tier, disabled when None
+            disk_max_entries: Size of the on-disk tier
+            disk_ttl: Seconds an on-disk entry stays valid (None = forever)
+            ignored_inputs: Input names left out of the key (e.g. "email_sender")
+        """
+        self.memory = MemoryTier(max_entries=max_entries, ttl=ttl)
+        self.disk = SQLiteTier(disk_path, max_entries=disk_max_entries, ttl=disk_ttl) if disk_path else None
+        self.ignored_inputs = frozenset(ignored_inputs)
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+        # SQLite work holds its own lock, so memory hits never wait for the disk
+        self._disk_lock = threading.Lock()
+
+    def make_key(self, task_name: str, inputs: Dict[str, Any]) -> str:
+        """Stable key for a task name and its interpolation inputs"""
+        normalized = {
+            key: self._normalize(value) for key, value in inputs.items() if key not in self.ignored_inputs
+        }
+        payload = json.dumps([task_name, normalized], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, task_name: str, inputs: Dict[str, Any]) -> Optional[str]:
+        """Cached raw output for the task and inputs, or None"""
+        key = self.make_key(task_name, inputs)
+        hit, value = self._memory_get(key)
+        if hit or self.disk is None:
+            return value
+        return self._disk_get(key)
+
+    async def get_async(self, task_name: str, inputs: Dict[str, Any]) -> Optional[str]:
+        """get() without blocking the event loop on the SQLite tier"""
+        key = self.make_key(task_name, inputs)
+        hit, value = self._memory_get(key)
+        if hit or self.disk is None:
+            return value
+        return await asyncio.to_thread(self._disk_get, key)
+
+    def set(self, task_name: str, inputs: Dict[str, Any], raw: str) -> None:
+        """Store the raw output of a task run"""
+        key = self.make_key(task_name, inputs)
+        with self._lock:
+            self.memory.set(key, raw, self._stats)
+        if self.disk is not None:
+            self._disk_set(key, raw)
+
+    async def set_async(self, task_name: str, inputs: Dict[str, Any], raw: str) -> None:
+        """set() without blocking the event loop on the SQLite tier"""
+        key = self.make_key(task_name, inputs)
+        with self._lock:
+            self.memory.set(key, raw, self._stats)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, raw)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.memory.clear()
+        if self.disk is not None:
+            with self._disk_lock:
+                self.disk.clear()
+
+    def _memory_get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """(hit, value) from the memory tier; a miss without a disk tier is counted here"""
+        with self._lock:
+            value = self.memory.get(key, self._stats)
+            if value is not None:
+                self._stats.hits += 1
+                self._stats.memory_hits += 1
+                return True, value
+            if self.disk is None:
+                self._stats.misses += 1
+            return False, None
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        disk_stats = CacheStats()
+        with self._disk_lock:
+            row = self.disk.get(key, disk_stats)
+        with self._lock:
+            self._stats.expirations += disk_stats.expirations
+            if row is None:
+                self._stats.misses += 1
+                return None
+            self.memory.set(key, row[0], self._stats, stored_at=row[1])
+            self._stats.hits += 1
+            self._stats.disk_hits += 1
+            return row[0]
+
+    def _disk_set(self, key: str, raw: str) -> None:
+        disk_stats = CacheStats()
+        with self._disk_lock:
+            self.disk.set(key, raw, disk_stats)
+        with self._lock:
+            self._stats.evictions += disk_stats.evictions
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return self._stats.model_copy()
+
+    @staticmethod
+    def _normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return _WHITESPACE.sub(" ", value).strip()
+        return value
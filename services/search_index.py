@@ -0,0 +1,201 @@
+import json
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from intent_not_identified_flow.services.embeddings import tokenize
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out
+over own same she should so some such than that the their them then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+_HEADING = re.compile(r"^#\s+(.+)$", re.MULTILINE)
+
+
+class Document(BaseModel):
+    """Knowledge base document"""
+    id: str = Field(description="Unique document id")
+    title: str = Field(description="Document title")
+    content: str = Field(description="Document text")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Free-form document metadata")
+
+
+def analyze(text: str) -> List[str]:
+    """Index/query terms: lowercased words without stopwords, with plurals folded"""
+    terms = []
+    for token in tokenize(text):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def load_corpus(path: str) -> List[Document]:
+    """
+    Load documents from a JSONL file or a directory of .jsonl/.md/.txt files
+
+    JSONL lines need "title" and "content" (and optionally "id", "metadata").
+    A Markdown/text file is one document titled by its first "# " heading or
+    by its file name.
+    """
+    files = [path] if os.path.isfile(path) else [
+        os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names)
+    ]
+    documents = []
+    for file_path in sorted(files):
+        if file_path.endswith(".jsonl"):
+            with open(file_path, encoding="utf-8") as f:
+                for line_no, line in enumerate(f):
+                    if line.strip():
+                        record = json.loads(line)
+                        record.setdefault("id", f"{os.path.basename(file_path)}:{line_no}")
+                        documents.append(Document(**record))
+        elif file_path.endswith((".md", ".txt")):
+            with open(file_path, encoding="utf-8") as f:
+                text = f.read()
+            heading = _HEADING.search(text)
+            title = heading.group(1).strip() if heading else os.path.splitext(os.path.basename(file_path))[0]
+            documents.append(Document(id=os.path.relpath(file_path, path), title=title, content=text))
+    return documents
+
+
+class BM25Index:
+    """
+    Inverted index with precomputed BM25 term weights
+
+    Postings are stored CSR-style in flat NumPy arrays: for term t the documents
+    are doc_ids[offsets[t]:offsets[t + 1]] with their final BM25 contribution in
+    the same slice of weights, sorted by descending weight. A query only
+    scatters a few precomputed slices into a score vector and never touches
+    per-document Python objects. Because postings are impact-ordered, very
+    common terms can be cut to their highest-weight documents
+    (max_postings_per_term), which bounds query cost independently of corpus
+    size at the price of approximate scores for documents deep in those lists.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_postings_per_term: Optional[int] = 4096):
+        self.k1 = k1
+        self.b = b
+        self.max_postings_per_term = max_postings_per_term
+        self.documents: List[Document] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def build(self, documents: Iterable[Document]) -> "BM25Index":
+        """(Re)build the index over the documents"""
+        self.documents = list(documents)
+        vocabulary: Dict[str, int] = {}
+        term_column, doc_column, tf_column = array("i"), array("i"), array("f")
+        lengths = np.zeros(len(self.documents), dtype=np.float32)
+        for doc_id, document in enumerate(self.documents):
+            # Title terms are counted twice, a cheap field boost
+            counts = Counter(analyze(f"{document.title} {document.title} {document.content}"))
+            lengths[doc_id] = sum(counts.values())
+            term_column.extend(vocabulary.setdefault(term, len(vocabulary)) for term in counts)
+            doc_column.extend([doc_id] * len(counts))
+            tf_column.extend(counts.values())
+
+        terms = np.frombuffer(term_column, dtype=np.int32)
+        docs = np.frombuffer(doc_column, dtype=np.int32)
+        tfs = np.frombuffer(tf_column, dtype=np.float32)
+        n_docs = max(len(self.documents), 1)
+        avg_length = float(lengths.mean()) if len(lengths) else 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / max(avg_length, 1.0))
+        doc_freq = np.bincount(terms, minlength=len(vocabulary)) if len(terms) else np.zeros(0, dtype=np.int64)
+        idf = np.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        weights = (idf[terms] * tfs * (self.k1 + 1.0) / (tfs + norm[docs])).astype(np.float32)
+
+        # Group by term, highest weight first within each term
+        order = np.lexsort((-weights, terms))
+        self.vocabulary = vocabulary
+        self.offsets = np.concatenate([[0], np.cumsum(doc_freq)]).astype(np.int64)
+        self.doc_ids = docs[order]
+        self.weights = weights[order]
+        return self
+
+    def search(self, query: str, top_k: int = 5, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Rank documents for a query
+
+        Args:
+            query: Free-text query
+            top_k: Maximum number of results
+            min_score: Drop results scoring below this BM25 score
+
+        Returns:
+            List of (document index, score) sorted by descending score
+        """
+        term_ids = {self.vocabulary[t] for t in analyze(query) if t in self.vocabulary}
+        if not term_ids or top_k <= 0:
+            return []
+
+        slices = []
+        for t in term_ids:
+            start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+            if self.max_postings_per_term is not None:
+                end = min(end, start + self.max_postings_per_term)
+            slices.append(slice(start, end))
+
+        if len(slices) == 1:
+            candidates, scores = self.doc_ids[slices[0]], self.weights[slices[0]]
+        else:
+            candidates = np.concatenate([self.doc_ids[s] for s in slices])
+            scores = np.concatenate([self.weights[s] for s in slices])
+            # Sum the contributions of documents matching several terms
+            candidates, inverse = np.unique(candidates, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores).astype(np.float32)
+
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores = candidates[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(candidates[i]), float(scores[i])) for i in order if scores[i] >= min_score]
+
+    def save(self, directory: str) -> None:
+        """Persist the index (index.npz) and its documents (documents.jsonl)"""
+        os.makedirs(directory, exist_ok=True)
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        np.savez(
+            os.path.join(directory, "index.npz"),
+            terms=terms, offsets=self.offsets, doc_ids=self.doc_ids, weights=self.weights,
+            params=np.array([self.k1, self.b, self.max_postings_per_term or 0]),
+        )
+        with open(os.path.join(directory, "documents.jsonl"), "w", encoding="utf-8") as f:
+            for document in self.documents:
+                f.write(document.model_dump_json() + "\n")
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """Load an index saved with save(), without re-tokenizing the corpus"""
+        with np.load(os.path.join(directory, "index.npz")) as data:
+            k1, b, max_postings = data["params"].tolist()
+            index = cls(k1=k1, b=b, max_postings_per_term=int(max_postings) or None)
+            index.vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            index.offsets = data["offsets"]
+            index.doc_ids = data["doc_ids"]
+            index.weights = data["weights"]
+        with open(os.path.join(directory, "documents.jsonl"), encoding="utf-8") as f:
+            index.documents = [Document.model_validate_json(line) for line in f if line.strip()]
+        return index
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "index.npz"))
@@ -0,0 +1,163 @@
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from intent_not_identified_flow.services.embeddings import HashingEmbedder, strip_boilerplate
+
+
+class SemanticCacheStats(BaseModel):
+    """Lookup counters for a SemanticCache"""
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class VectorIndex:
+    """
+    Fixed-capacity brute-force cosine index over L2-normalized vectors
+
+    Vectors live in one preallocated float32 matrix used as a ring buffer, so
+    when the index is full the oldest entry is overwritten.
+    """
+
+    def __init__(self, dim: int, capacity: int = 10_000):
+        self.dim = dim
+        self.capacity = capacity
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._size = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, vector: np.ndarray) -> int:
+        """Store a vector and return its slot"""
+        slot = self._next
+        self._matrix[slot] = vector
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        return slot
+
+    def search(self, vector: np.ndarray, candidates: Optional[List[int]] = None) -> Tuple[int, float]:
+        """Best matching slot and its cosine similarity, (-1, 0.0) when empty"""
+        if candidates is not None:
+            if not candidates:
+                return -1, 0.0
+            slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            scores = self._matrix[slots] @ vector
+            best = int(np.argmax(scores))
+            return int(slots[best]), float(scores[best])
+        if self._size == 0:
+            return -1, 0.0
+        scores = self._matrix[:self._size] @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+
+class LSHIndex:
+    """
+    Random-hyperplane LSH over a VectorIndex
+
+    Each table hashes a vector to the sign pattern of `bits` random projections.
+    A query is scored exactly against the union of its buckets only, which keeps
+    lookups sublinear for large caches at the cost of occasionally missing a
+    neighbour that fell on the other side of a hyperplane in every table.
+    """
+
+    def __init__(self, dim: int, capacity: int = 10_000, tables: int = 8, bits: int = 12, seed: int = 7):
+        self.index = VectorIndex(dim, capacity)
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables, bits, dim)).astype(np.float32)
+        self._powers = 1 << np.arange(bits, dtype=np.int64)
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(tables)]
+        self._slot_keys: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, vector: np.ndarray) -> int:
+        slot = self.index._next
+        old_keys = self._slot_keys.get(slot)
+        if old_keys is not None:
+            for table, key in enumerate(old_keys):
+                self._buckets[table][int(key)].discard(slot)
+        self.index.add(vector)
+        keys = self._keys(vector)
+        for table, key in enumerate(keys):
+            self._buckets[table].setdefault(int(key), set()).add(slot)
+        self._slot_keys[slot] = keys
+        return slot
+
+    def search(self, vector: np.ndarray) -> Tuple[int, float]:
+        candidates: Set[int] = set()
+        for table, key in enumerate(self._keys(vector)):
+            candidates |= self._buckets[table].get(int(key), set())
+        return self.index.search(vector, list(candidates))
+
+    def _keys(self, vector: np.ndarray) -> np.ndarray:
+        bits = (self._planes @ vector) > 0
+        return bits.astype(np.int64) @ self._powers
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache for analyze_intent results
+
+    Emails are embedded after stripping greetings and signatures, so messages
+    that differ only in "Thanks, John" versus "Best, Maria" map to (almost) the
+    same vector. A lookup returns the stored analyzer output of the most
+    similar previous email when its cosine similarity reaches the threshold.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        capacity: int = 10_000,
+        embedder: HashingEmbedder = None,
+        use_ann: bool = False,
+    ):
+        """
+        Args:
+            threshold: Minimum cosine similarity to reuse a previous result
+            capacity: Maximum number of cached emails (oldest are overwritten)
+            embedder: Text embedder, a HashingEmbedder by default
+            use_ann: Use LSH candidate search instead of exact brute force
+        """
+        self.threshold = threshold
+        self.embedder = embedder or HashingEmbedder()
+        self.index = LSHIndex(self.embedder.dim, capacity) if use_ann else VectorIndex(self.embedder.dim, capacity)
+        self._values: Dict[int, str] = {}
+        self._stats = SemanticCacheStats()
+        self._lock = threading.Lock()
+
+    def embed_email(self, subject: str, body: str) -> np.ndarray:
+        return self.embedder.embed(f"{subject}\n{strip_boilerplate(body)}")
+
+    def lookup(self, subject: str, body: str) -> Optional[Tuple[str, float]]:
+        """Cached result and similarity of the nearest previous email, or None below threshold"""
+        vector = self.embed_email(subject, body)
+        with self._lock:
+            slot, similarity = self.index.search(vector)
+            if slot >= 0 and similarity >= self.threshold:
+                self._stats.hits += 1
+                return self._values[slot], similarity
+            self._stats.misses += 1
+            return None
+
+    def add(self, subject: str, body: str, raw: str) -> None:
+        """Remember the analyzer output for an email"""
+        vector = self.embed_email(subject, body)
+        with self._lock:
+            slot = self.index.add(vector)
+            self._values[slot] = raw
+
+    def stats(self) -> SemanticCacheStats:
+        with self._lock:
+            return self._stats.model_copy(update={"entries": len(self.index)})
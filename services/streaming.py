@@ -0,0 +1,186 @@
+"""
+Streaming of task output while the LLM is still generating
+
+A flow run inside streaming_to(sink) gets a StreamEvent for every text chunk
+the LLM produces, per task, followed by the complete task output:
+
+- chunk: next piece of the raw LLM text of a task (including the agent's
+  "Thought:" lines and intermediate tool-use steps; call_id changes with
+  every LLM call of the task)
+- final: the task output, identical to what execute_task_async returns
+- escalated: the output so far was rejected by the model routing's quality
+  checks and the task restarts on a larger model, drop its chunks
+- cancelled / error: the task was abandoned or failed, drop its chunks
+- end: the flow finished, no more events follow
+
+The sink is an asyncio.Queue or a callable (plain or async) and always
+receives events on the event loop that entered streaming_to, whichever
+worker thread produced the chunk. Chunks come from crewAI LLMStreamChunkEvents;
+IntentCrew turns on LLM streaming for the calls made inside streaming_to only,
+so the non-streaming path is unchanged.
+"""
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import itertools
+import logging
+import threading
+from typing import Any, Callable, Iterator, Literal, Optional, Union
+
+from crewai.events import crewai_event_bus
+from crewai.events.types.llm_events import LLMStreamChunkEvent
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+StreamSink = Union[asyncio.Queue, Callable[["StreamEvent"], Any]]
+
+
+class StreamEvent(BaseModel):
+    """One piece of streamed output"""
+    email_id: Optional[str] = None
+    task: str
+    kind: Literal["chunk", "final", "escalated", "cancelled", "error", "end"]
+    text: str = ""
+    call_id: Optional[str] = None
+    sequence: int = 0
+
+
+class StreamChannel:
+    """Delivers events from any thread to a sink on the owning event loop"""
+
+    def __init__(self, sink: StreamSink, email_id: str = None):
+        self.sink = sink
+        self.email_id = email_id
+        self._loop = asyncio.get_running_loop()
+        self._sequence = itertools.count()
+        self._background = set()
+
+    def publish(self, task: str, kind: str, text: str = "", call_id: str = None) -> None:
+        event = StreamEvent(email_id=self.email_id, task=task, kind=kind, text=text, call_id=call_id,
+                            sequence=next(self._sequence))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(event)
+        else:
+            try:
+                self._loop.call_soon_threadsafe(self._deliver, event)
+            except RuntimeError:
+                pass  # the loop is gone, nobody is listening anymore
+
+    def task(self, task_name: str) -> "TaskStream":
+        return TaskStream(self, task_name)
+
+    def _deliver(self, event: StreamEvent) -> None:
+        try:
+            if isinstance(self.sink, asyncio.Queue):
+                self.sink.put_nowait(event)
+                return
+            result = self.sink(event)
+            if inspect.isawaitable(result):
+                pending = asyncio.ensure_future(result)
+                self._background.add(pending)
+                pending.add_done_callback(self._background.discard)
+        except Exception as e:
+            # A failing consumer must not break the flow
+            logger.warning(f"Stream sink failed on {event.kind} event of {event.task}: {e}")
+
+
+class TaskStream:
+    """Events of one task execution; chunks arriving after it is closed are dropped"""
+
+    def __init__(self, channel: StreamChannel, task_name: str):
+        self.channel = channel
+        self.task_name = task_name
+        self.closed = False
+
+    def chunk(self, text: str, call_id: str = None) -> None:
+        if not self.closed and text:
+            self.channel.publish(self.task_name, "chunk", text, call_id)
+
+    def restart(self, reason: str) -> None:
+        """The chunks so far are void, the task runs again (text says why)"""
+        if not self.closed:
+            self.channel.publish(self.task_name, "escalated", reason)
+
+    def close(self, kind: str, text: str = "") -> None:
+        if not self.closed:
+            self.closed = True
+            self.channel.publish(self.task_name, kind, text)
+
+
+_current_channel: contextvars.ContextVar[Optional[StreamChannel]] = contextvars.ContextVar(
+    "intent_stream_channel", default=None
+)
+_current_task_stream: contextvars.ContextVar[Optional[TaskStream]] = contextvars.ContextVar(
+    "intent_task_stream", default=None
+)
+
+
+def current_channel() -> Optional[StreamChannel]:
+    """Channel of the flow being run, None when nobody is streaming"""
+    return _current_channel.get()
+
+
+@contextlib.contextmanager
+def streaming_to(sink: StreamSink, email_id: str = None) -> Iterator[StreamChannel]:
+    """Stream the output of every task executed in the enclosed block to sink; must run on the event loop"""
+    _install_event_handlers()
+    channel = StreamChannel(sink, email_id)
+    token = _current_channel.set(channel)
+    try:
+        yield channel
+    finally:
+        _current_channel.reset(token)
+        channel.publish("flow", "end")
+
+
+@contextlib.contextmanager
+def task_stream(task_name: str) -> Iterator[Optional[TaskStream]]:
+    """
+    Route LLM chunks produced in the enclosed block (and threads started from it) to task_name
+
+    Publishes the closing event when the block exits without one, so a
+    consumer always learns that a task's chunks are complete.
+    """
+    channel = _current_channel.get()
+    if channel is None:
+        yield None
+        return
+    stream = channel.task(task_name)
+    token = _current_task_stream.set(stream)
+    try:
+        yield stream
+    except asyncio.CancelledError:
+        stream.close("cancelled")
+        raise
+    except Exception as e:
+        stream.close("error", str(e))
+        raise
+    finally:
+        _current_task_stream.reset(token)
+        stream.close("cancelled")
+
+
+_handlers_installed = False
+_handlers_lock = threading.Lock()
+
+
+def _install_event_handlers() -> None:
+    global _handlers_installed
+    with _handlers_lock:
+        if _handlers_installed:
+            return
+        _handlers_installed = True
+
+    # crewAI calls stream chunk handlers synchronously in the thread running the
+    # LLM call, so chunks arrive in order and see that thread's context
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _on_chunk(source, event):
+        stream = _current_task_stream.get()
+        if stream is not None and event.tool_call is None:
+            stream.chunk(event.chunk, event.call_id)
@@ -0,0 +1,264 @@
+"""
+Low-overhead structured logging for many concurrent flows
+
+Every record is tagged with the id of the email whose flow logged it and the
+stage (flow step or task) it came from, taken from the instrumentation
+context variables, so interleaved output of concurrent flows can be told
+apart and grepped per email. On the logging thread only what cannot wait is
+done: the level check, sampling and rendering the message from its
+arguments. Records then go into a bounded queue, and a listener thread does
+the formatting (text or JSON lines) and the I/O. A full queue drops records
+(counted) instead of blocking the event loop.
+
+Messages are formatted lazily: hot paths log with %-style arguments, and
+expensive ones (samples of task inputs and outputs) are wrapped in `lazy` or
+`truncated`, so nothing is rendered unless the record is actually emitted.
+
+Sampling keeps records below WARNING for a fixed share of emails, chosen by
+a hash of the email id so a sampled email's log is complete. Warnings and
+errors are always kept.
+
+Configured from the environment (see LogConfig.from_env) by setup_logging,
+which the entry points call through configure_logging:
+INTENT_LOG_LEVEL, INTENT_LOG_FORMAT (text|json), INTENT_LOG_SAMPLE_RATE,
+INTENT_LOG_FILE (stderr when unset), INTENT_LOG_QUEUE_SIZE (0 logs
+synchronously) and INTENT_CREW_VERBOSE (crewAI's own console panels for
+every flow method and task, off by default).
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import zlib
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.services.instrumentation import current_email_id, current_stage
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(email_id)s] %(message)s"
+
+
+class LogConfig(BaseModel):
+    """Verbosity and destination of the logs"""
+    level: str = "INFO"
+    format: str = "text"
+    sample_rate: float = 1.0
+    path: Optional[str] = None
+    queue_size: int = 10000
+    crew_verbose: bool = False
+
+    @classmethod
+    def from_env(cls) -> "LogConfig":
+        env = os.environ
+        return cls(
+            level=env.get("INTENT_LOG_LEVEL", "INFO").upper(),
+            format=env.get("INTENT_LOG_FORMAT", "text").lower(),
+            sample_rate=float(env.get("INTENT_LOG_SAMPLE_RATE", "1.0")),
+            path=env.get("INTENT_LOG_FILE") or None,
+            queue_size=int(env.get("INTENT_LOG_QUEUE_SIZE", "10000")),
+            crew_verbose=env.get("INTENT_CREW_VERBOSE", "").strip().lower() in ("1", "true", "yes", "on"),
+        )
+
+
+class LogStats(BaseModel):
+    """Records handed to the pipeline and what became of them"""
+    emitted: int = 0
+    sampled_out: int = 0
+    dropped: int = 0
+
+
+class lazy:
+    """Message argument rendered only when the record is emitted"""
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable[[], Any]):
+        self.func = func
+
+    def __str__(self) -> str:
+        return str(self.func())
+
+
+def truncated(value: Any, limit: int = 150) -> lazy:
+    """str(value) cut to limit characters, rendered only when the record is emitted"""
+    def render():
+        text = str(value)
+        return text if len(text) <= limit else text[:limit] + "..."
+    return lazy(render)
+
+
+class CorrelationFilter(logging.Filter):
+    """Tags records with the email and stage of the flow that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.email_id = current_email_id() or "-"
+        stage = current_stage()
+        record.stage = stage.record.stage if stage is not None else "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps records below WARNING for sample_rate of the emails; needs CorrelationFilter first"""
+
+    def __init__(self, sample_rate: float, stats: LogStats):
+        super().__init__()
+        self.threshold = int(max(0.0, min(1.0, sample_rate)) * 10000)
+        self.stats = stats
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        email_id = getattr(record, "email_id", "-")
+        if record.levelno >= logging.WARNING or email_id == "-" or self.threshold >= 10000:
+            return True
+        if zlib.crc32(email_id.encode()) % 10000 < self.threshold:
+            return True
+        self.stats.sampled_out += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "email_id": getattr(record, "email_id", "-"),
+            "stage": getattr(record, "stage", "-"),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; never waits for room in the queue"""
+
+    def __init__(self, log_queue: queue.Queue, stats: LogStats):
+        super().__init__(log_queue)
+        self.stats = stats
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the message is rendered here (its arguments may change once the call returns);
+        # timestamps, JSON and the write happen on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks keep every frame alive; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.stats.emitted += 1
+        except queue.Full:
+            self.stats.dropped += 1
+
+
+class _CountingFilter(logging.Filter):
+    def __init__(self, stats: LogStats):
+        super().__init__()
+        self.stats = stats
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        self.stats.emitted += 1
+        return True
+
+
+class LogPipeline:
+    """Root handler, filters and listener thread installed by setup_logging"""
+
+    def __init__(self, config: LogConfig):
+        self.config = config
+        self._stats = LogStats()
+        if config.path:
+            target = logging.FileHandler(config.path, encoding="utf-8")
+        else:
+            target = logging.StreamHandler(sys.stderr)
+        target.setFormatter(JsonFormatter() if config.format == "json"
+                            else logging.Formatter(TEXT_FORMAT, defaults={"email_id": "-", "stage": "-"}))
+        self._target = target
+        self._listener = None
+        if config.queue_size > 0:
+            self.handler = NonBlockingQueueHandler(queue.Queue(config.queue_size), self._stats)
+            self._listener = QueueListener(self.handler.queue, target, respect_handler_level=True)
+        else:
+            # Synchronous: formatting and I/O on the logging thread, e.g. to debug the pipeline itself
+            self.handler = target
+        self.handler.addFilter(CorrelationFilter())
+        if config.sample_rate < 1.0:
+            self.handler.addFilter(SamplingFilter(config.sample_rate, self._stats))
+        if self._listener is None:
+            self.handler.addFilter(_CountingFilter(self._stats))
+
+    def start(self) -> None:
+        if self._listener is not None:
+            self._listener.start()
+
+    def stop(self) -> None:
+        """Write out what is still queued and close the destination"""
+        if self._listener is not None and self._listener._thread is not None:
+            self._listener.stop()
+        self._target.close()
+
+    def stats(self) -> LogStats:
+        return self._stats.model_copy()
+
+
+_pipeline: Optional[LogPipeline] = None
+_config: Optional[LogConfig] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_log_config() -> LogConfig:
+    """The configuration installed by setup_logging, or the one in the environment"""
+    global _config
+    if _config is None:
+        with _pipeline_lock:
+            if _config is None:
+                _config = LogConfig.from_env()
+    return _config
+
+
+def setup_logging(config: LogConfig = None, level: Optional[int] = None) -> LogPipeline:
+    """
+    Install the process-wide logging pipeline on the root logger, replacing one installed
+    before (config from the environment by default; level overrides its level)
+    """
+    global _pipeline, _config
+    config = config or LogConfig.from_env()
+    if level is not None:
+        config = config.model_copy(update={"level": logging.getLevelName(level)})
+    with _pipeline_lock:
+        root = logging.getLogger()
+        if _pipeline is not None:
+            root.removeHandler(_pipeline.handler)
+            _pipeline.stop()
+        _pipeline = LogPipeline(config)
+        _config = config
+        root.addHandler(_pipeline.handler)
+        root.setLevel(config.level)
+        _pipeline.start()
+    return _pipeline
+
+
+def get_log_pipeline() -> Optional[LogPipeline]:
+    """The pipeline installed by setup_logging, None before"""
+    return _pipeline
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    if _pipeline is not None:
+        _pipeline.stop()
@@ -0,0 +1,238 @@
+"""
+Extraction and validation of JSON answers embedded in LLM output
+
+LLM answers wrap the requested JSON in prose, code fences, "Final Answer:"
+prefixes, or put several objects (an example, then the answer) in one reply.
+A greedy regex spanning the first "{" to the last "}" misparses those and
+backtracks on long outputs. Instead, JsonObjectScanner finds balanced
+top-level objects in a single pass. It tracks string and escape state, and
+because it keeps its state between feed() calls it also works on streamed
+chunks. parse_structured then validates candidates against a Pydantic
+schema, applying a few cheap syntax repairs (trailing commas, Python literals,
+smart quotes) before giving up.
+"""
+import ast
+import json
+import re
+from typing import Iterator, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+_TOKENS = re.compile(r'[{}\[\]"\\]')
+# What may follow an opening bracket of a real object/array; "{placeholder}" or "a { b" in prose is skipped
+_OBJECT_START = re.compile(r'\{\s*["\'}]')
+_ARRAY_START = re.compile(r'\[\s*["\'{\[\]\d\-tfnTFN]')
+_WHITESPACE_TAIL = re.compile(r"\s*\Z")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PY_LITERAL = re.compile(r"\b(True|False|None)\b")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_PY_TO_JSON = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"}": "{", "]": "["}
+_DECODER = json.JSONDecoder()
+
+
+class JsonObjectScanner:
+    """
+    Incremental finder of balanced top-level JSON objects (and optionally arrays)
+
+    Brackets inside JSON strings are ignored, quotes outside a candidate are
+    ignored, and a mismatched closing bracket abandons the current candidate.
+    """
+
+    def __init__(self, arrays: bool = False):
+        self._openers = "{[" if arrays else "{"
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._skip = -1
+        self._hold: Optional[int] = None
+
+    @property
+    def pending_text(self) -> Optional[str]:
+        """Text of a candidate that is still open, if any"""
+        return self._buffer if self._start is not None else None
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add text and return the candidates completed by it"""
+        self._buffer += chunk
+        if self._hold is not None:
+            self._pos, self._hold = self._hold, None
+        found = []
+        for match in _TOKENS.finditer(self._buffer, self._pos):
+            i = match.start()
+            if i <= self._skip:
+                continue
+            char = match.group()
+            if self._start is None:
+                if char in self._openers:
+                    if (_OBJECT_START if char == "{" else _ARRAY_START).match(self._buffer, i):
+                        try:
+                            # Fast path: well-formed JSON is delimited by the C decoder in one call
+                            end = _DECODER.raw_decode(self._buffer, i)[1]
+                        except json.JSONDecodeError:
+                            self._start, self._stack = i, [char]
+                        else:
+                            found.append(self._buffer[i:end])
+                            self._skip = end - 1
+                    elif _WHITESPACE_TAIL.match(self._buffer, i + 1):
+                        # Not decidable until more text arrives
+                        self._hold = i
+                        break
+                continue
+            if self._in_string:
+                if char == "\\":
+                    self._skip = i + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack[-1] != _CLOSERS[char]:
+                    self._start, self._stack = None, []
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    found.append(self._buffer[self._start:i + 1])
+                    self._start = None
+        self._compact()
+        return found
+
+    def _compact(self) -> None:
+        # Keep only the open candidate (or an undecided opening bracket), so memory
+        # stays bounded on long streams
+        if self._start is not None:
+            offset = self._start
+        elif self._hold is not None:
+            offset = self._hold
+        else:
+            offset = len(self._buffer)
+        self._buffer = self._buffer[offset:]
+        self._skip -= offset
+        self._pos = len(self._buffer)
+        if self._start is not None:
+            self._start = 0
+        if self._hold is not None:
+            self._hold = 0
+
+
+def iter_json_candidates(text: str, arrays: bool = False) -> Iterator[str]:
+    """
+    Balanced JSON-looking substrings of text, in order
+
+    A stray opening brace in prose would keep a candidate open to the end of
+    the text; scanning then resumes right after it.
+    """
+    offset = 0
+    while offset < len(text):
+        scanner = JsonObjectScanner(arrays=arrays)
+        yield from scanner.feed(text[offset:])
+        pending = scanner.pending_text
+        if pending is None:
+            return
+        offset = len(text) - len(pending) + 1
+
+
+def _loads(candidate: str):
+    """json.loads, then cheap repairs of common LLM syntax slips"""
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    repaired = _TRAILING_COMMA.sub(r"\1", candidate.translate(_SMART_QUOTES))
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError:
+        pass
+    try:
+        # Python dict repr: single quotes, True/False/None
+        return ast.literal_eval(repaired)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    try:
+        return json.loads(_PY_LITERAL.sub(lambda m: _PY_TO_JSON[m.group()], repaired))
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_structured(text: str, schema: Type[T]) -> Tuple[Optional[T], Optional[str]]:
+    """
+    First JSON object in text that validates against schema
+
+    Candidates that are not valid JSON themselves are searched for nested
+    objects, e.g. a JSON answer inside braces of surrounding prose.
+
+    Returns:
+        Tuple of (parsed model, None) or (None, description of the problem)
+    """
+    error = "no JSON object found"
+    pending = list(iter_json_candidates(text or ""))
+    while pending:
+        candidate = pending.pop(0)
+        value = _loads(candidate)
+        if value is None:
+            error = "invalid JSON"
+            pending[:0] = iter_json_candidates(candidate[1:-1])
+            continue
+        if not isinstance(value, dict):
+            continue
+        try:
+            return schema.model_validate(value), None
+        except ValidationError as e:
+            error = f"schema validation failed: {e.errors()[0]['loc']} {e.errors()[0]['msg']}"
+    return None, error
+
+
+def parse_structured_array(text: str, schema: Type[T], count: int,
+                           index_field: str = "item") -> Tuple[List[Optional[T]], Optional[str]]:
+    """
+    Per-item answers of a batch: the first JSON array in text, each element validated on its own
+
+    Elements are placed by their 1-based index_field, or by position when they
+    have none. An element that is missing, out of range, or fails validation
+    leaves None in its place; the other items are still usable.
+
+    Returns:
+        Tuple of (count answers, None) or ([None] * count, description of the problem)
+        when text has no JSON array at all
+    """
+    for candidate in iter_json_candidates(text or "", arrays=True):
+        value = _loads(candidate)
+        if not isinstance(value, list):
+            continue
+        answers: List[Optional[T]] = [None] * count
+        for position, element in enumerate(value):
+            if not isinstance(element, dict):
+                continue
+            index = element.get(index_field, position + 1)
+            if isinstance(index, bool) or not isinstance(index, int) or not 1 <= index <= count:
+                continue
+            if answers[index - 1] is not None:
+                continue
+            try:
+                answers[index - 1] = schema.model_validate(element)
+            except ValidationError:
+                pass
+        return answers, None
+    return [None] * count, "no JSON array found"
+
+
+def repair_prompt(schema: Type[BaseModel], output: str, error: str, max_chars: int = 4000) -> str:
+    """Short re-prompt asking the model to restate its answer as valid JSON for schema"""
+    fields = ", ".join(
+        f"{name} ({getattr(field.annotation, '__name__', str(field.annotation))})"
+        for name, field in schema.model_fields.items()
+    )
+    if len(output) > max_chars:
+        output = output[:max_chars] + " ..."
+    return (
+        f"Your previous answer could not be used ({error}).\n"
+        f"Restate it as a single JSON object with exactly these fields: {fields}.\n"
+        f"Reply with the JSON object only, no other text.\n\n"
+        f"Previous answer:\n{output}"
+    )
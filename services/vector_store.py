@@ -0,0 +1,208 @@
+"""
+Memory-mapped document embedding store for dense knowledge base retrieval
+
+The store is a directory with
+
+- embeddings-<version>.npy: (n_docs, dim) float32 or float16 matrix, opened
+  with mmap so every worker process on the host shares one page-cache copy;
+  float16 halves the footprint but scoring is several times slower, since
+  NumPy has no BLAS kernel for it and each batch is upcast first
+- manifest.json: document ids, content hashes, dtype, embedder dimension and
+  the name of the matrix file they belong to
+
+Build or incrementally update it from a corpus:
+
+    python -m intent_not_identified_flow.services.vector_store build --corpus docs/ --store store/
+"""
+import argparse
+import hashlib
+import json
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from intent_not_identified_flow.services.embeddings import HashingEmbedder
+from intent_not_identified_flow.services.search_index import Document, load_corpus
+
+# Matrix file of stores built before manifests named theirs
+EMBEDDINGS_FILE = "embeddings.npy"
+MANIFEST_FILE = "manifest.json"
+# Superseded matrix files kept for readers that loaded the previous manifest but not yet its matrix
+_KEEP_PREVIOUS = 1
+
+
+def document_text(document: Document) -> str:
+    return f"{document.title}\n{document.content}"
+
+
+def content_hash(document: Document) -> str:
+    return hashlib.sha1(document_text(document).encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked lists of document indexes with reciprocal rank fusion
+
+    Returns:
+        List of (document index, fused score) sorted by descending score
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class EmbeddingStore:
+    """Dense document vectors with batched matrix-vector top-k search"""
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, hashes: Optional[List[str]] = None):
+        self.ids = ids
+        self.matrix = matrix
+        self.hashes = hashes or [""] * len(ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def from_documents(cls, documents: Sequence[Document], embedder: HashingEmbedder,
+                       dtype: str = "float32") -> "EmbeddingStore":
+        """In-memory store, for corpora small enough not to need a prebuilt file"""
+        matrix = embedder.embed_many(document_text(d) for d in documents).astype(dtype)
+        return cls([d.id for d in documents], matrix, [content_hash(d) for d in documents])
+
+    @classmethod
+    def open(cls, directory: str) -> "EmbeddingStore":
+        """Open a built store read-only via memory mapping"""
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        matrix = np.load(os.path.join(directory, manifest.get("embeddings", EMBEDDINGS_FILE)), mmap_mode="r")
+        if matrix.shape[0] != len(manifest["ids"]):
+            raise ValueError(f"Embedding store {directory} is inconsistent: {matrix.shape[0]} rows for "
+                             f"{len(manifest['ids'])} documents")
+        return cls(manifest["ids"], matrix, manifest["hashes"])
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+    def search(self, vector: np.ndarray, top_k: int = 5, batch_size: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k rows by dot product (cosine for normalized vectors)
+
+        The matrix is scored in row batches, so float16 stores are upcast one
+        cache-sized batch at a time and a mapped file is streamed rather than copied.
+
+        Returns:
+            List of (row index, score) sorted by descending score
+        """
+        if len(self.ids) == 0 or top_k <= 0:
+            return []
+        if batch_size is None:
+            batch_size = 2048 if self.matrix.dtype == np.float16 else 65536
+        vector = vector.astype(np.float32)
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, len(self.ids), batch_size):
+            scores = np.asarray(self.matrix[start:start + batch_size], dtype=np.float32) @ vector
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            else:
+                keep = np.arange(len(scores))
+            best_rows = np.concatenate([best_rows, keep + start])
+            best_scores = np.concatenate([best_scores, scores[keep]])
+        order = np.argsort(-best_scores, kind="stable")[:top_k]
+        return [(int(best_rows[i]), float(best_scores[i])) for i in order]
+
+
+def build_store(documents: Iterable[Document], directory: str, embedder: HashingEmbedder = None,
+                dtype: str = "float32", rebuild: bool = False) -> Tuple[int, int]:
+    """
+    Create or incrementally update a store on disk
+
+    Rows of documents whose id and content hash are unchanged are copied from
+    the existing file; only new or edited documents are embedded. The new
+    matrix goes to a file of its own, then the manifest naming it replaces
+    the old one with a single os.replace: a reader sees either the old ids
+    with the old matrix or the new ids with the new one. Processes that
+    already mapped the old matrix keep using it; the previous matrix file is
+    kept for readers that have just read the old manifest, older ones are
+    removed.
+
+    Returns:
+        Tuple of (documents embedded, documents reused)
+    """
+    embedder = embedder or HashingEmbedder()
+    documents = list(documents)
+    os.makedirs(directory, exist_ok=True)
+
+    previous = None
+    if not rebuild and EmbeddingStore.exists(directory):
+        previous = EmbeddingStore.open(directory)
+        if previous.dim != embedder.dim or previous.matrix.dtype != np.dtype(dtype):
+            previous = None
+    previous_rows = {} if previous is None else {
+        (doc_id, digest): row for row, (doc_id, digest) in enumerate(zip(previous.ids, previous.hashes))
+    }
+
+    hashes = [content_hash(d) for d in documents]
+    matrix_file = f"embeddings-{uuid.uuid4().hex[:12]}.npy"
+    matrix_path = os.path.join(directory, matrix_file)
+    matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=dtype, shape=(len(documents), embedder.dim))
+    embedded = reused = 0
+    for row, (document, digest) in enumerate(zip(documents, hashes)):
+        old_row = previous_rows.get((document.id, digest))
+        if old_row is not None:
+            matrix[row] = previous.matrix[old_row]
+            reused += 1
+        else:
+            matrix[row] = embedder.embed(document_text(document))
+            embedded += 1
+    matrix.flush()
+    del matrix
+
+    manifest_tmp = os.path.join(directory, MANIFEST_FILE + ".tmp")
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        json.dump({"ids": [d.id for d in documents], "hashes": hashes, "dim": embedder.dim, "dtype": dtype,
+                   "embeddings": matrix_file}, f)
+    os.replace(manifest_tmp, os.path.join(directory, MANIFEST_FILE))
+    _remove_superseded(directory, matrix_file)
+    return embedded, reused
+
+
+def _remove_superseded(directory: str, current: str) -> None:
+    """Delete matrix files older than the _KEEP_PREVIOUS most recent superseded ones"""
+    superseded = sorted(
+        (name for name in os.listdir(directory)
+         if name != current and name.startswith("embeddings") and name.endswith(".npy")),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True,
+    )
+    for name in superseded[_KEEP_PREVIOUS:]:
+        os.remove(os.path.join(directory, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the knowledge base embedding store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Embed new/changed documents and write the store")
+    build.add_argument("--corpus", required=True, help="JSONL file or directory of documents")
+    build.add_argument("--store", required=True, help="Store directory")
+    build.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    build.add_argument("--dim", type=int, default=1024, help="Embedding dimension")
+    build.add_argument("--rebuild", action="store_true", help="Ignore the existing store and embed everything")
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus)
+    embedded, reused = build_store(documents, args.store, HashingEmbedder(dim=args.dim),
+                                   dtype=args.dtype, rebuild=args.rebuild)
+    print(f"Store {args.store}: {len(documents)} documents ({embedded} embedded, {reused} reused)")
+
+
+if __name__ == "__main__":
+    main()
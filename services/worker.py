@@ -0,0 +1,124 @@
+"""
+Long-running worker processing email jobs from a JobSource
+
+Jobs are pulled only when a flow slot is free (the BatchRunner consumes its
+input lazily), so a worker never holds more jobs than it can run. Every
+outcome is acknowledged to the source and, optionally, appended to a JSONL
+results file. Setting the stop event stops taking new jobs; the flows in
+flight are drained before run() returns.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from intent_not_identified_flow.models.email import EmailContent
+from intent_not_identified_flow.services.batch_runner import BatchItemResult, BatchRunner
+from intent_not_identified_flow.services.job_queue import Job, JobSource
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerStats(BaseModel):
+    """Outcome counters of one worker run"""
+    processed: int = 0
+    failed: int = 0
+    wall_time: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.processed / self.wall_time if self.wall_time else 0.0
+
+
+def result_text(result: Any) -> Any:
+    """JSON-friendly form of a flow result (CrewOutput or StageOutput becomes its raw text)"""
+    if hasattr(result, "raw"):
+        return result.raw
+    if isinstance(result, dict):
+        return {key: result_text(value) for key, value in result.items()}
+    return result
+
+
+def flow_error(item: BatchItemResult) -> Optional[str]:
+    """Why a flow failed: an exception, or the error marker the final step returns instead of raising"""
+    if item.error:
+        return item.error
+    if isinstance(item.result, dict) and "error" in item.result:
+        return str(item.result["error"])
+    if getattr(item.result, "error", None):
+        return str(item.result.error)
+    return None
+
+
+class Worker:
+    """Runs flows for jobs from a source with bounded concurrency"""
+
+    def __init__(self, source: JobSource, flow_factory: Callable[[], Any], concurrency: int = 10,
+                 output: str = None):
+        """
+        Args:
+            source: Where jobs come from and where outcomes are acknowledged
+            flow_factory: Callable returning a fresh flow instance
+            concurrency: Maximum number of flows in flight
+            output: JSONL file every result is appended to (one line per job)
+        """
+        self.source = source
+        self.flow_factory = flow_factory
+        self.concurrency = concurrency
+        self.output = output
+        self.stats = WorkerStats()
+
+    async def run(self, stop: asyncio.Event = None) -> WorkerStats:
+        """Process jobs until the source is exhausted or stop is set, then drain the flows in flight"""
+        stop = stop or asyncio.Event()
+        jobs: Dict[int, Job] = {}
+        indexes = itertools.count()  # the BatchRunner numbers emails in the order they are consumed
+
+        async def emails() -> AsyncIterator[EmailContent]:
+            async for job in self.source.jobs(stop):
+                jobs[next(indexes)] = job
+                yield job.email
+
+        runner = BatchRunner(self.flow_factory, concurrency=self.concurrency)
+        started = time.perf_counter()
+        out = open(self.output, "a", encoding="utf-8") if self.output else None
+        try:
+            async for item in runner.stream(emails()):
+                job = jobs.pop(item.index)
+                error = flow_error(item)
+                if out is not None:
+                    self._write(out, job, item, error)
+                self.stats.processed += 1
+                if error is None:
+                    await self.source.ack(job, result_text(item.result))
+                else:
+                    self.stats.failed += 1
+                    await self.source.nack(job, error)
+        finally:
+            if out is not None:
+                out.close()
+            await self.source.close()
+            self.stats.wall_time = time.perf_counter() - started
+            logger.info(f"Worker finished: {self.stats.processed} jobs ({self.stats.failed} failed) in "
+                        f"{self.stats.wall_time:.1f}s, {self.stats.throughput:.2f} jobs/s")
+        return self.stats
+
+    @staticmethod
+    def _write(out, job: Job, item: BatchItemResult, error: Optional[str]) -> None:
+        record = {
+            "job_id": job.id,
+            "message_id": job.email.message_id,
+            "subject": job.email.subject,
+            "attempts": job.attempts,
+            "ok": error is None,
+            "error": error,
+            "latency": round(item.latency, 3),
+            "result": result_text(item.result),
+        }
+        # One write per line; appends from several processes sharing the file do not interleave
+        out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        out.flush()
@@ -1,16 +1,17 @@
 from crewai.tools import tool
-from intent_not_identified_flow.services.knowledge_api import KnowledgeAPI
+from intent_not_identified_flow.services.knowledge_client import format_results, search_knowledge_base_sync
 
 # Tool creation
 @tool("Mock_knowledgebase_api")
 def Mock_knowledgebase_api(query: str) -> str:
     """Search the knowledge base for relevant information based on the given query.
-    
+
     Args:
         query: The search query string to look for in the knowledge base
-        
+
     Returns:
-        List of search results with relevant information
+        Numbered list of matching knowledge base entries with their titles and content
     """
-    knowledge_api = KnowledgeAPI()
-    return knowledge_api.search(query)
+    # Runs on the shared client's event loop (pooled connections, cache, coalescing),
+    # so the flow's own event loop is never blocked by knowledge base I/O
+    return format_results(search_knowledge_base_sync(query))
@@ -0,0 +1,135 @@
+"""
+Worker service entry point
+
+Process emails from JSONL files or directories:
+
+    python -m intent_not_identified_flow.worker --input inbox/ --follow --output results.jsonl
+
+Share a SQLite queue between any number of worker processes:
+
+    python -m intent_not_identified_flow.worker --queue jobs.db --enqueue --input emails.jsonl
+    python -m intent_not_identified_flow.worker --queue jobs.db --concurrency 20 --output results.jsonl
+
+Use every core of the host with a supervised pool of worker processes:
+
+    python -m intent_not_identified_flow.worker --queue jobs.db --processes 4 --concurrency 20
+
+With --preload the worker processes are forked from a process that has already
+imported crewAI and the crew (warm pool), so they and their replacements
+start in a fraction of the time.
+
+The first SIGINT/SIGTERM stops taking new jobs and drains the flows in
+flight; a second one cancels them (their queue leases are given back).
+With --processes, a signal drains every worker process.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from intent_not_identified_flow import configure_logging
+from intent_not_identified_flow.services.job_queue import JsonlSource, QueueSource, SQLiteJobQueue
+from intent_not_identified_flow.services.process_pool import WARM_MODULES, FlowFactory, ProcessPool
+from intent_not_identified_flow.services.worker import Worker
+
+logger = logging.getLogger(__name__)
+
+
+def _install_signal_handlers(stop: asyncio.Event, main_task: asyncio.Task) -> None:
+    loop = asyncio.get_running_loop()
+
+    def on_signal(signum):
+        if not stop.is_set():
+            logger.info(f"Received {signal.Signals(signum).name}, draining flows in flight (repeat to abort)")
+            stop.set()
+        else:
+            logger.warning("Aborting flows in flight")
+            main_task.cancel()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, on_signal, signum)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+
+
+async def run_worker(args) -> None:
+    if args.queue:
+        queue = SQLiteJobQueue(args.queue, lease=args.lease, max_attempts=args.max_attempts)
+        source = QueueSource(queue, owner=args.owner, wait_for_jobs=not args.exit_when_empty)
+    else:
+        source = JsonlSource(args.input, follow=args.follow)
+    worker = Worker(source, FlowFactory(parallel=args.parallel), concurrency=args.concurrency, output=args.output)
+
+    stop = asyncio.Event()
+    _install_signal_handlers(stop, asyncio.current_task())
+    await worker.run(stop)
+    if args.queue:
+        logger.info(f"Queue: {queue.stats()}")
+
+
+def run_pool(args) -> None:
+    queue = SQLiteJobQueue(args.queue, lease=args.lease, max_attempts=args.max_attempts)
+    # The supervisor only watches the queue and the processes, it never imports crewAI
+    pool = ProcessPool(FlowFactory(parallel=args.parallel), processes=args.processes,
+                       concurrency=args.concurrency, lease=args.lease, max_attempts=args.max_attempts,
+                       output=args.output, quiet=False, preload=WARM_MODULES if args.preload else None)
+
+    def on_signal(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, draining worker processes")
+        pool.stop()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    pool.supervise(queue, until_empty=args.exit_when_empty)
+    logger.info(f"Queue: {queue.stats()}, worker restarts: {pool.stats.restarts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Email worker for IntentNotIdentifiedFlow")
+    parser.add_argument("--input", action="append", default=[], help="JSONL file or directory (repeatable)")
+    parser.add_argument("--follow", action="store_true", help="Keep watching the inputs for new emails")
+    parser.add_argument("--queue", help="SQLite job queue shared by worker processes")
+    parser.add_argument("--enqueue", action="store_true", help="Put the --input emails into the queue and exit")
+    parser.add_argument("--exit-when-empty", action="store_true", help="Stop when the queue has no ready jobs")
+    parser.add_argument("--owner", default=f"{socket.gethostname()}:{os.getpid()}", help="Worker name for leases")
+    parser.add_argument("--lease", type=float, default=120.0, help="Queue lease in seconds, renewed while running")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=10, help="Flows in flight (per process)")
+    parser.add_argument("--processes", type=int, help="Run this many supervised worker processes on the --queue")
+    parser.add_argument("--preload", action="store_true",
+                        help="Fork the --processes from a process with crewAI and the crew already imported")
+    parser.add_argument("--parallel", action="store_true", help="Run the flow in parallel mode")
+    parser.add_argument("--output", help="Append results to this JSONL file")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.enqueue:
+        if not args.queue or not args.input:
+            parser.error("--enqueue needs --queue and --input")
+        source = JsonlSource(args.input)
+
+        async def collect():
+            return [job.email async for job in source.jobs(asyncio.Event())]
+
+        ids = SQLiteJobQueue(args.queue).put(asyncio.run(collect()))
+        logger.info(f"Enqueued {len(ids)} emails into {args.queue}")
+        return
+    if not args.queue and not args.input:
+        parser.error("Give --input files or a --queue")
+    if args.processes:
+        if not args.queue:
+            parser.error("--processes needs a --queue")
+        run_pool(args)
+        return
+
+    try:
+        asyncio.run(run_worker(args))
+    except asyncio.CancelledError:
+        logger.warning("Worker aborted")
+
+
+if __name__ == "__main__":
+    main()